@@ -4,22 +4,32 @@
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
-f=$SCRIPT_DIR/scripts/check_deps.sh && sed -i 's/\r$//' "$f" && chmod +x "$f" && "$f" "python>=3.10 python<3.11 biopython==1.85 numpy scipy mafft gawk 3seq seqkit blast entrez-direct ete3 paml lxml pyqt pip packaging setuptools wheel TreeCluster"
+## One pass over the helper scripts instead of `sed -i` + `chmod` before every call:
+## strip CRLF only from files that have it and make the shell scripts executable
+grep -rlI --include='*.sh' $'\r' "$SCRIPT_DIR/scripts" | xargs -r sed -i 's/\r$//'
+find "$SCRIPT_DIR/scripts" -name '*.sh' ! -name globals.sh ! -name helpers.sh ! -perm -u+x -exec chmod +x {} +
+source "$SCRIPT_DIR/scripts/helpers.sh"
+
+"$SCRIPT_DIR/scripts/check_deps.sh" "python>=3.10 python<3.11 biopython==1.85 numpy scipy mafft gawk 3seq seqkit blast entrez-direct ete3 paml lxml pyqt pip packaging setuptools wheel TreeCluster"
 
 CONFIG="$1"
 GLOBALS="$SCRIPT_DIR/scripts/globals.sh"
-f="$SCRIPT_DIR/scripts/generate_globals.sh" && sed -i 's/\r$//' "$f" && chmod +x "$f" && "$f" "$CONFIG" "$GLOBALS"
+"$SCRIPT_DIR/scripts/generate_globals.sh" "$CONFIG" "$GLOBALS"
 source "$GLOBALS"
 
 source  ~/miniconda3/etc/profile.d/conda.sh
 conda activate codeml_env
 
-for f in \
-  "$SCRIPT_DIR/scripts/prepare_codeml_input.sh"
-do
-  sed -i 's/\r$//' "$f"
-  chmod +x "$f"
-done
+## Optional persistent helper process: Python helpers are forked from one warm interpreter
+## instead of paying interpreter + Bio/ete3/numpy import time on every call
+if [[ "$PY_HELPER_SERVER" == "true" ]]; then
+  export PY_HELPER_SOCKET="${TMPDIR:-/tmp}/codeml_helper_$$.sock"
+  python3 "$SCRIPT_DIR/scripts/helper_cli.py" serve "$PY_HELPER_SOCKET" &
+  PY_HELPER_PID=$!
+  trap 'kill "$PY_HELPER_PID" 2>/dev/null' EXIT
+  for _ in {1..50}; do [[ -S "$PY_HELPER_SOCKET" ]] && break; sleep 0.1; done
+  [[ -S "$PY_HELPER_SOCKET" ]] || echo "!!! Helper server not up yet; Python helpers run locally until it is"
+fi
 
 # ACCESSIONS_FILE="$1"
 # GROUP="$2" # Hepeviridae_6
@@ -31,7 +41,7 @@ echo $CODEML_GET_INPUT
 echo $CODEML_RESULTS_DIR
 # JF915746.1 - Hepeviridae_6
 if [ "$CODEML_GET_INPUT" = "true" ]; then
-  f=$SCRIPT_DIR/scripts/prepare_codeml_input.sh && sed -i 's/\r$//' "$f" && chmod +x "$f" && "$f" "$GLOBALS"
+  "$SCRIPT_DIR/scripts/prepare_codeml_input.sh" "$GLOBALS"
   ## reload globals in case REF_ACC or related paths were updated during input preparation
   source "$GLOBALS"
 fi
@@ -46,11 +56,77 @@ if ! grep -qE '^[0-9]+$' "$FINAL_TREE_FILE_PATH"; then
     sed -i '1i1' "$FINAL_TREE_FILE_PATH"
 fi
 
+## Run codeml in a prepared job folder (codeml.ctl + aln.phy/tree.tre links), or queue it
+## in the spool when CODEML_EXECUTOR=spool so workers on other nodes can pick it up.
+## With CODEML_MULTISTART=true a local job is run from every MULTISTART_OMEGA x MULTISTART_KAPPA
+## start in parallel; starts trailing the leader by MULTISTART_MARGIN lnL are stopped, the best mlc is kept
+SPOOL_PY="$SCRIPT_DIR/scripts/codeml_scripts/spool.py"
+MULTISTART_PY="$SCRIPT_DIR/scripts/codeml_scripts/multistart.py"
+run_codeml_job() {
+  local out_dir="$1"
+  if [[ "$CODEML_EXECUTOR" == "spool" ]]; then
+    python3 "$SPOOL_PY" submit "$SPOOL_DIR" "$out_dir" >> "$SPOOL_MANIFEST"
+  elif [[ "$CODEML_MULTISTART" == "true" ]]; then
+    python3 "$MULTISTART_PY" run "$out_dir" --omega "$MULTISTART_OMEGA" --kappa "$MULTISTART_KAPPA" \
+      --margin "$MULTISTART_MARGIN" || echo "!!! No codeml start finished in $out_dir"
+  else
+    cd "$out_dir"
+    codeml codeml.ctl
+    cd - > /dev/null
+  fi
+  rm -f "$out_dir/aln.phy" "$out_dir/tree.tre" "$out_dir/mlc_link"
+}
+
 if [ "$CODEML_RUN" = "true" ]; then
   CTL_TEMPLATE="$CODEML_INPUT_DIR/codeml_template.ctl"
   mkdir -p "$RESULTS_DIR"
+  if [[ "$CODEML_EXECUTOR" == "spool" ]]; then
+    mkdir -p "$SPOOL_DIR"
+    SPOOL_MANIFEST=$(mktemp)
+  fi
+  if [[ "$CODEML_MONITOR" == "true" ]]; then
+    ## follow a live view with: python3 scripts/codeml_scripts/codeml_monitor.py "$RESULTS_DIR" [SPOOL_DIR]
+    MONITOR_ROOTS=("$RESULTS_DIR")
+    [[ "$CODEML_EXECUTOR" == "spool" ]] && MONITOR_ROOTS+=("$SPOOL_DIR")
+    python3 "$SCRIPT_DIR/scripts/codeml_scripts/codeml_monitor.py" "${MONITOR_ROOTS[@]}" \
+      --json "$CODEML_DIR/progress_${GROUP}.json" --quiet --interval 30 &
+    MONITOR_PID=$!
+  fi
 
-  if [[ "$ANALYSIS" == "site-model" ]]; then
+  if [[ "$ANALYSIS" == "site-model" && "$SITE_MODEL_MODE" == "combined" ]]; then
+    # One codeml run per CDS evaluating M0/M1a/M2a/M7/M8, split into per-model folders afterwards
+    for PHY_FILE in "$CODEML_INPUT_DIR"/${GROUP}_*.phy; do
+      BASENAME="$(basename "$PHY_FILE" .phy)"
+      OUT_DIR="$RESULTS_DIR/$BASENAME/combined"
+      MLC_FILE="$OUT_DIR/mlc"
+
+      if [[ -f "$MLC_FILE" ]]; then
+        echo "Skipping combined run: $MLC_FILE already exists."
+      else
+        echo "Running codeml (NSsites = 0 1 2 7 8) on $BASENAME..."
+        mkdir -p "$OUT_DIR"
+
+        CTL_FILE="$OUT_DIR/codeml.ctl"
+        cp "$CTL_TEMPLATE" "$CTL_FILE"
+
+        # Create short symlinks for codeml to avoid long paths
+        ln -sf "$PHY_FILE" "$OUT_DIR/aln.phy"
+        ln -sf "$FINAL_TREE_FILE_PATH" "$OUT_DIR/tree.tre"
+        ln -sf "$OUT_DIR/mlc" "$OUT_DIR/mlc_link"
+
+        sed -i "s|^[[:space:]]*seqfile.*|seqfile = aln.phy|" "$CTL_FILE"
+        sed -i "s|^[[:space:]]*treefile.*|treefile = tree.tre|" "$CTL_FILE"
+        sed -i "s|^[[:space:]]*outfile.*|outfile = mlc_link|" "$CTL_FILE"
+        sed -i "s|^[[:space:]]*model.*|model = 0|" "$CTL_FILE"
+        sed -i "s|^[[:space:]]*fix_omega.*|fix_omega = 0|" "$CTL_FILE"
+        sed -i "s|^[[:space:]]*omega.*|omega = 1|" "$CTL_FILE"
+        sed -i "s|^[[:space:]]*NSsites.*|NSsites = 0 1 2 7 8|" "$CTL_FILE"
+        grep -qE '^[[:space:]]*ncatG' "$CTL_FILE" || echo "ncatG = 10" >> "$CTL_FILE" ## beta categories for M7/M8
+
+        run_codeml_job "$OUT_DIR"
+      fi
+    done
+  elif [[ "$ANALYSIS" == "site-model" ]]; then
     # Loop through each .phy file in codeml/input
     for PHY_FILE in "$CODEML_INPUT_DIR"/${GROUP}_*.phy; do
       BASENAME="$(basename "$PHY_FILE" .phy)"
@@ -86,10 +162,7 @@ if [ "$CODEML_RUN" = "true" ]; then
         sed -i "s|^[[:space:]]*NSsites.*|NSsites = $NSsites|" "$CTL_FILE"
 
         # Run codeml
-        cd "$OUT_DIR"
-        codeml codeml.ctl
-        rm -f aln.phy tree.tre mlc_link
-        cd - > /dev/null
+        run_codeml_job "$OUT_DIR"
       done
     done
   fi
@@ -135,20 +208,68 @@ if [ "$CODEML_RUN" = "true" ]; then
             sed -i "s|^[[:space:]]*omega.*|omega = 1|" "$CTL_FILE"
         fi
 
-        cd "$OUT_DIR"
-        codeml codeml.ctl
-        rm -f aln.phy tree.tre mlc_link
-        cd - > /dev/null
+        run_codeml_job "$OUT_DIR"
       done
     done
   fi
+
+  if [[ "$CODEML_EXECUTOR" == "spool" ]]; then
+    echo "Queued $(wc -l < "$SPOOL_MANIFEST") codeml job(s) in $SPOOL_DIR"
+    WORKER_PIDS=()
+    for ((w = 0; w < SPOOL_LOCAL_WORKERS; w++)); do
+      python3 "$SPOOL_PY" worker "$SPOOL_DIR" --exit-when-empty --poll 2 &
+      WORKER_PIDS+=("$!")
+    done
+    python3 "$SPOOL_PY" collect "$SPOOL_DIR" "$SPOOL_MANIFEST" || echo "!!! Some spooled codeml jobs failed"
+    (( ${#WORKER_PIDS[@]} > 0 )) && wait "${WORKER_PIDS[@]}"
+    rm -f "$SPOOL_MANIFEST"
+  fi
+
+  if [[ -n "${MONITOR_PID:-}" ]]; then
+    kill "$MONITOR_PID" 2>/dev/null
+    wait "$MONITOR_PID" 2>/dev/null
+  fi
+
+  if [[ "$ANALYSIS" == "site-model" && "$SITE_MODEL_MODE" == "combined" ]]; then
+    for MLC_FILE in "$RESULTS_DIR"/${GROUP}_*/combined/mlc; do
+      [[ -f "$MLC_FILE" ]] || continue
+      pyhelper codeml-output split "$MLC_FILE" "$(dirname "$(dirname "$MLC_FILE")")"
+    done
+  fi
 fi
 
 echo "*************************** ANALYZING RESULTS ***************************"
 
 if [ "$CODEML_ANALYSIS" = "true" ]; then
   SUMMARY_FILE="$RESULTS_DIR/summary_${ANALYSIS}_${GROUP}.tsv"
-  echo -e "CDS\tLRT\tp-value\tSelectedSites" > "$SUMMARY_FILE"
+  ## SelectedSites in alignment codons, SelectedSitesRef in codons of the reference CDS
+  if [[ "$ANALYSIS" == "site-model" && "$SITE_MODEL_MODE" == "combined" ]]; then
+    echo -e "CDS\tLRT\tp-value\tSelectedSites\tSelectedSitesRef\tLRT_M7_M8\tp-value_M7_M8\tSelectedSites_M8\tSelectedSitesRef_M8" > "$SUMMARY_FILE"
+  else
+    echo -e "CDS\tLRT\tp-value\tSelectedSites\tSelectedSitesRef" > "$SUMMARY_FILE"
+  fi
+
+  ## prints "LRT<TAB>p-value" for a nested pair of mlc files, nothing if a lnL is missing
+  lrt_test() {
+    local null_mlc="$1" alt_mlc="$2" df="$3"
+    local lnL0 lnL1 lrt
+    lnL0=$(grep -m1 "lnL" "$null_mlc" | awk '{print $(NF-1)}')
+    lnL1=$(grep -m1 "lnL" "$alt_mlc" | awk '{print $(NF-1)}')
+    [[ -z "$lnL0" || -z "$lnL1" ]] && return 1
+    lrt=$(echo "scale=5; 2 * ($lnL1 - $lnL0)" | bc)
+    echo -e "$lrt\t$(pyhelper chi2-sf "$lrt" "$df")"
+  }
+
+  ## prints "alignment<TAB>reference" BEB sites of the alternative model when the LRT is significant
+  selected_sites() {
+    local alt_mlc="$1" pvalue="$2"
+    if [[ -n "$pvalue" ]] && (( $(echo "$pvalue < 0.05" | bc -l) )); then
+      ## BEB sites are numbered by codon of the .phy; the codon map translates them when masked codons were dropped
+      pyhelper codeml-output selected "$alt_mlc" --codon-map "$CODEML_INPUT_DIR/$CDS_NAME.codons.tsv" --min-prob 0.8
+    else
+      echo -e "\t"
+    fi
+  }
 
   # ---------------------- SITE MODEL ANALYSIS ----------------------
   if [[ "$ANALYSIS" == "site-model" ]]; then
@@ -162,23 +283,26 @@ if [ "$CODEML_ANALYSIS" = "true" ]; then
         continue
       fi
 
-      lnL1=$(grep -m1 "lnL" "$M1A_MLC" | awk '{print $(NF-1)}')
-      lnL2=$(grep -m1 "lnL" "$M2A_MLC" | awk '{print $(NF-1)}')
-
-      if [[ -z "$lnL1" || -z "$lnL2" ]]; then
+      if ! M1M2=$(lrt_test "$M1A_MLC" "$M2A_MLC" 2); then
         echo "Could not extract log-likelihoods for $CDS_NAME"
         continue
       fi
+      echo "M1a vs M2a: $M1M2"
+      SELECTED=$(selected_sites "$M2A_MLC" "${M1M2#*$'\t'}")
 
-      LRT=$(echo "scale=5; 2 * ($lnL2 - $lnL1)" | bc)
-      PVALUE=$(python3 -c "from scipy.stats import chi2; print(round(chi2.sf($LRT, 2), 6))")
-
-      echo "$lnL1"
-      echo "$lnL2"
-      echo "$LRT"
-      echo "$PVALUE"
-
-      echo -e "$CDS_NAME\t$LRT\t$PVALUE\t" >> "$SUMMARY_FILE"
+      if [[ "$SITE_MODEL_MODE" == "combined" ]]; then
+        if [[ -f "${CDS_DIR}/M7/mlc" && -f "${CDS_DIR}/M8/mlc" ]] && M7M8=$(lrt_test "${CDS_DIR}/M7/mlc" "${CDS_DIR}/M8/mlc" 2); then
+          echo "M7 vs M8: $M7M8"
+          SELECTED_M8=$(selected_sites "${CDS_DIR}/M8/mlc" "${M7M8#*$'\t'}")
+        else
+          echo "Could not extract M7/M8 log-likelihoods for $CDS_NAME"
+          M7M8=$'\t'
+          SELECTED_M8=$'\t'
+        fi
+        echo -e "$CDS_NAME\t$M1M2\t$SELECTED\t$M7M8\t$SELECTED_M8" >> "$SUMMARY_FILE"
+      else
+        echo -e "$CDS_NAME\t$M1M2\t$SELECTED" >> "$SUMMARY_FILE"
+      fi
     done
   fi
 
@@ -203,24 +327,19 @@ if [ "$CODEML_ANALYSIS" = "true" ]; then
       fi
 
       LRT=$(echo "scale=5; 2 * ($lnL2 - $lnL1)" | bc)
-      PVALUE=$(python3 -c "from scipy.stats import chi2; print(round(chi2.sf($LRT, 1), 6))")
-
-      SELECTED=""
-      if (( $(echo "$PVALUE < 0.05" | bc -l) )); then
-        SELECTED=$(awk '/Bayes Empirical Bayes/,/^$/ {
-          if ($0 ~ /^[ ]*[0-9]+/ && $(NF) ~ /\*/) {
-            pos=$1; aa=$2; prob=$(NF-1)
-            if (prob > 0.8) {
-              printf "%s(%s,%.3f);", pos, aa, prob
-            }
-          }
-        }' "$POS_MLC")
-      fi
+      PVALUE=$(pyhelper chi2-sf "$LRT" 1)
+
+      SELECTED=$(selected_sites "$POS_MLC" "$PVALUE")
 
       echo -e "$CDS_NAME\t$LRT\t$PVALUE\t$SELECTED" >> "$SUMMARY_FILE"
     done
   fi
   echo "Summary saved to $SUMMARY_FILE"
+
+  ## make the run queryable next to all earlier runs
+  pyhelper results-db load "$RESULTS_DB" "$RESULTS_DIR" --group "$GROUP" --analysis "$ANALYSIS" --config "$CONFIG" \
+    --codon-maps "$CODEML_INPUT_DIR" \
+    || echo "Could not load results into $RESULTS_DB"
 fi
 
 
@@ -15,6 +15,19 @@ if [ -z "${CONDA_PREFIX:-}" ]; then
   echo "Note: no conda environment active (CONDA_PREFIX unset). Checking current interpreter anyway." >&2
 fi
 
+## A passing check is cached per environment. The key covers the env path, the requested
+## specs and the mtimes of conda-meta/ and site-packages/, which change on every conda or
+## pip (un)install, so the `conda list` / `pip list` calls only run after the env changed.
+CACHE_FILE=""
+if [ -n "${CONDA_PREFIX:-}" ] && [ -d "$CONDA_PREFIX/conda-meta" ]; then
+  ENV_STAMP=$(stat -c %Y "$CONDA_PREFIX/conda-meta" "$CONDA_PREFIX"/lib/python*/site-packages 2>/dev/null | tr '\n' ' ')
+  CACHE_KEY=$(printf '%s|%s|%s' "$CONDA_PREFIX" "$ENV_STAMP" "$REQ_SPECS" | cksum | cut -d' ' -f1)
+  CACHE_FILE="${XDG_CACHE_HOME:-$HOME/.cache}/codeml_pipeline/deps_ok_${CACHE_KEY}"
+  if [ -f "$CACHE_FILE" ]; then
+    exit 0
+  fi
+fi
+
 RESULT="$(
   REQ_SPECS="$REQ_SPECS" python - <<'PY'
 import os, sys, json, re, subprocess
@@ -96,6 +109,9 @@ PY
 status=$(printf '%s\n' "$RESULT" | head -n1)
 if [ "$status" = "OK" ]; then
   ## all dependencies satisfied
+  if [ -n "$CACHE_FILE" ]; then
+    mkdir -p "$(dirname "$CACHE_FILE")" && : > "$CACHE_FILE"
+  fi
   exit 0
 else
   echo "Dependency check failed:" >&2
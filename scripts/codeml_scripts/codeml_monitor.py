@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+codeml_monitor.py
+
+Live progress of codeml jobs. Follows the files codeml writes while it runs -
+the ``rub`` iteration log and the growing ``mlc`` - in every job folder under the
+given roots (CODEML_RESULTS_DIR and/or a spool folder), and reports for each job
+its state, current iteration, lnL trajectory and an ETA.
+
+States:
+  queued     job folder or spool bundle where codeml has not written an mlc yet
+  running    codeml is iterating (or reading its input)
+  finishing  optimisation is done, codeml is writing BEB/NEB results
+  stalled    running, but lnL gained less than --stall-tol over the last
+             --stall-iters iterations
+  failed     neither rub nor mlc has changed for --stall-seconds and the mlc
+             has no "Time used": codeml died or hangs
+  done       mlc ends with "Time used"
+
+A multistart.py job is shown as its starts while they run and as the job
+folder once multistart.tsv is written.
+
+The ETA assumes a job needs as many iterations as the finished jobs of the same
+model (median), or 3 x the number of parameters when none has finished yet, at
+the job's own average speed.
+
+Usage examples:
+  python3 codeml_monitor.py codeml/output/Astroviridae_43            # live terminal view
+  python3 codeml_monitor.py codeml/output/Astroviridae_43 /shared/spool --json progress.json --quiet
+  python3 codeml_monitor.py codeml/output/Astroviridae_43 --once --json -
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from codeml_output import LNL_LINE, MODEL_HEADER, parse_rub_line, parse_time_used
+
+## trajectory points kept in the JSON snapshot
+TRAJECTORY_POINTS = 20
+
+
+class FileTail:
+    """Returns the lines appended to a file since the last call; notices truncation and replacement."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.inode = None
+        self.partial = ""
+        self.mtime = None
+
+    def read(self):
+        """Returns (restarted, new complete lines)."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False, []
+        restarted = False
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            restarted = self.inode is not None
+            self.inode, self.offset, self.partial = st.st_ino, 0, ""
+        self.mtime = st.st_mtime
+        if st.st_size == self.offset:
+            return restarted, []
+        with open(self.path, errors="replace") as f:
+            f.seek(self.offset)
+            chunk = f.read()
+            self.offset = f.tell()
+        lines = (self.partial + chunk).split("\n")
+        self.partial = lines.pop()
+        return restarted, lines
+
+
+class Job:
+    def __init__(self, name, folder, progress_dir, started=None, model=None):
+        self.name = name
+        self.folder = folder
+        self.model = model or os.path.basename(folder)
+        self.started = started
+        self.rub = FileTail(os.path.join(progress_dir, "rub"))
+        self.mlc = FileTail(os.path.join(progress_dir, "mlc"))
+        self.trajectory = []  ## (iteration, lnL) of the current optimisation round
+        self.n_params = None
+        self.optimised = False
+        self.done = False
+        self.seconds = None
+
+    def move_progress(self, progress_dir):
+        """Spool jobs change folders between states; keep following them."""
+        for tail, name in ((self.rub, "rub"), (self.mlc, "mlc")):
+            tail.path = os.path.join(progress_dir, name)
+
+    def update(self):
+        restarted, lines = self.rub.read()
+        if restarted:
+            self.trajectory = []
+        for line in lines:
+            parsed = parse_rub_line(line)
+            if not parsed:
+                continue
+            iteration, lnl, n_params = parsed
+            if self.trajectory and iteration <= self.trajectory[-1][0]:
+                self.trajectory = []  ## codeml started a new round (next model or pass)
+                self.optimised = False
+            self.trajectory.append((iteration, lnl))
+            self.n_params = n_params
+
+        restarted, lines = self.mlc.read()
+        if restarted:
+            self.optimised = self.done = False  ## codeml was started again in this folder
+            self.seconds = None
+        for line in lines:
+            if MODEL_HEADER.match(line):
+                self.optimised = False
+                continue
+            if LNL_LINE.match(line):
+                self.optimised = True
+                continue
+            seconds = parse_time_used(line)
+            if seconds is not None:
+                self.done = True
+                self.seconds = seconds
+
+    @property
+    def iteration(self):
+        return self.trajectory[-1][0] if self.trajectory else None
+
+    def gain(self, last_n):
+        """lnL gained over the last ``last_n`` iterations (None if fewer were run)."""
+        if len(self.trajectory) <= last_n:
+            return None
+        return self.trajectory[-1][1] - self.trajectory[-1 - last_n][1]
+
+    def idle_seconds(self, now):
+        """Seconds since codeml last wrote rub or mlc (None while neither exists)."""
+        mtimes = [mtime for mtime in (self.rub.mtime, self.mlc.mtime) if mtime is not None]
+        return now - max(mtimes) if mtimes else None
+
+    def state(self, now, stall_iters, stall_tol, stall_seconds):
+        if self.done:
+            return "done"
+        idle = self.idle_seconds(now)
+        if idle is None:
+            return "queued"
+        if idle > stall_seconds:
+            return "failed"
+        if self.optimised:
+            return "finishing"
+        gain = self.gain(stall_iters)
+        if gain is not None and gain < stall_tol:
+            return "stalled"
+        return "running"
+
+
+class Monitor:
+    def __init__(self, roots, stall_iters=50, stall_tol=0.01, stall_seconds=900):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.stall_iters = stall_iters
+        self.stall_tol = stall_tol
+        self.stall_seconds = stall_seconds
+        self.jobs = {}  ## job folder -> Job
+
+    def discover(self):
+        """Find job folders; spool bundles replace the (not yet collected) destination folder."""
+        found = {}
+        for root in self.roots:
+            if os.path.isdir(os.path.join(root, "pending")) and os.path.isdir(os.path.join(root, "running")):
+                ## finished bundles keep their output in result/ until collected
+                for state, progress in (("pending", "progress"), ("running", "progress"), ("done", "result")):
+                    state_dir = os.path.join(root, state)
+                    for job_id in sorted(os.listdir(state_dir)):
+                        bundle = os.path.join(state_dir, job_id)
+                        try:
+                            with open(os.path.join(bundle, "job.json")) as f:
+                                dest = json.load(f)["dest"]
+                            started = os.path.getmtime(os.path.join(bundle, "claim.json")) if state == "running" else None
+                        except (OSError, ValueError, KeyError):
+                            continue  ## bundle moved while we looked
+                        found[dest] = (os.path.join(bundle, progress), started)
+                continue
+            for folder, dirs, files in os.walk(root):
+                if "codeml.ctl" not in files or folder in found:
+                    continue
+                parent = os.path.dirname(folder)
+                if "starts" in dirs and "multistart.tsv" not in files:
+                    continue  ## multistart.py is running: follow its starts instead
+                if os.path.basename(parent) == "starts" and os.path.isfile(
+                        os.path.join(os.path.dirname(parent), "multistart.tsv")):
+                    continue  ## kept starts of a finished multistart job
+                found[folder] = (folder, os.path.getmtime(os.path.join(folder, "codeml.ctl")))
+
+        for folder, (progress_dir, started) in found.items():
+            job = self.jobs.get(folder)
+            if job is None:
+                parent = os.path.dirname(folder)
+                if os.path.basename(parent) == "starts":  ## multistart.py: <CDS>/<Model>/starts/<start>
+                    job_dir = os.path.dirname(parent)
+                    name = os.path.join(os.path.basename(os.path.dirname(job_dir)), os.path.basename(job_dir),
+                                        os.path.basename(folder))
+                    self.jobs[folder] = Job(name, folder, progress_dir, started, model=os.path.basename(job_dir))
+                else:
+                    name = os.path.join(os.path.basename(parent), os.path.basename(folder))
+                    self.jobs[folder] = Job(name, folder, progress_dir, started)
+            else:
+                job.move_progress(progress_dir)
+                job.started = started or job.started
+        for folder in list(self.jobs):
+            if folder not in found:
+                del self.jobs[folder]
+
+    def expected_iterations(self):
+        per_model = {}
+        for job in self.jobs.values():
+            if job.done and job.iteration is not None:
+                per_model.setdefault(job.model, []).append(job.iteration)
+        return {model: statistics.median(its) for model, its in per_model.items()}
+
+    def snapshot(self):
+        self.discover()
+        now = time.time()
+        for job in self.jobs.values():
+            job.update()
+        expected = self.expected_iterations()
+
+        jobs = []
+        counts = {}
+        for folder, job in sorted(self.jobs.items(), key=lambda kv: kv[1].name):
+            state = job.state(now, self.stall_iters, self.stall_tol, self.stall_seconds)
+            counts[state] = counts.get(state, 0) + 1
+            elapsed = job.seconds if job.done else (now - job.started if job.started and job.trajectory else None)
+            eta = None
+            if state in ("running", "stalled") and job.iteration and elapsed:
+                target = expected.get(job.model) or (3 * job.n_params if job.n_params else None)
+                if target and target > job.iteration:
+                    eta = (target - job.iteration) * elapsed / job.iteration
+            jobs.append({
+                "name": job.name,
+                "folder": folder,
+                "model": job.model,
+                "state": state,
+                "iteration": job.iteration,
+                "lnL": job.trajectory[-1][1] if job.trajectory else None,
+                "gain_last_iters": job.gain(self.stall_iters),
+                "trajectory": job.trajectory[-TRAJECTORY_POINTS:],
+                "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+            })
+        return {"time": now, "roots": self.roots, "counts": counts, "jobs": jobs}
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def render(snapshot, show_all=False):
+    counts = snapshot["counts"]
+    lines = [
+        time.strftime("%H:%M:%S", time.localtime(snapshot["time"])) + "  "
+        + "  ".join(f"{state}: {counts.get(state, 0)}"
+                    for state in ("running", "stalled", "finishing", "queued", "failed", "done")),
+        "",
+        f"{'job':<50} {'state':<10} {'iter':>6} {'lnL':>16} {'gain':>10} {'elapsed':>9} {'ETA':>9}",
+    ]
+    for job in snapshot["jobs"]:
+        if job["state"] in ("done", "queued") and not show_all:
+            continue
+        lnl = f"{job['lnL']:.4f}" if job["lnL"] is not None else "-"
+        gain = f"{job['gain_last_iters']:.3f}" if job["gain_last_iters"] is not None else "-"
+        flag = f"  <- {job['state']}" if job["state"] in ("stalled", "failed") else ""
+        lines.append(
+            f"{job['name'][-50:]:<50} {job['state']:<10} {job['iteration'] if job['iteration'] is not None else '-':>6} "
+            f"{lnl:>16} {gain:>10} {format_seconds(job['elapsed_seconds']):>9} {format_seconds(job['eta_seconds']):>9}{flag}"
+        )
+    return "\n".join(lines)
+
+
+def write_json(path, data):
+    if path == "-":
+        json.dump(data, sys.stdout, indent=1)
+        print()
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)  ## readers never see a half written snapshot
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Follow the progress of running and queued codeml jobs")
+    parser.add_argument("roots", nargs="+", help="CODEML_RESULTS_DIR folders and/or spool folders")
+    parser.add_argument("--interval", type=float, default=10.0, help="Seconds between refreshes (default: 10)")
+    parser.add_argument("--json", help="Write a JSON snapshot here on every refresh ('-' for stdout)")
+    parser.add_argument("--once", action="store_true", help="Take one snapshot and exit")
+    parser.add_argument("--quiet", action="store_true", help="No terminal view (JSON snapshots only)")
+    parser.add_argument("--all", action="store_true", help="Also list queued and finished jobs")
+    parser.add_argument("--stall-iters", type=int, default=50, help="Iterations over which lnL must improve (default: 50)")
+    parser.add_argument("--stall-tol", type=float, default=0.01, help="Minimum lnL gain over --stall-iters (default: 0.01)")
+    parser.add_argument("--stall-seconds", type=float, default=900,
+                        help="Report a job as failed when neither rub nor mlc changed for this long (default: 900)")
+    parser.add_argument("--until-done", action="store_true", help="Exit once every job is done or failed")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    monitor = Monitor(args.roots, args.stall_iters, args.stall_tol, args.stall_seconds)
+    live = sys.stdout.isatty() and not args.once
+    while True:
+        snapshot = monitor.snapshot()
+        if args.json:
+            write_json(args.json, snapshot)
+        if not args.quiet and args.json != "-":
+            if live:
+                sys.stdout.write("\033[H\033[2J")  ## clear the screen
+            print(render(snapshot, args.all), flush=True)
+        if args.once:
+            break
+        if args.until_done and snapshot["jobs"] and set(snapshot["counts"]) <= {"done", "failed"}:
+            break
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+codeml_output.py
+
+Helpers for reading codeml output files.
+
+When codeml is run with several site models in one job (e.g. ``NSsites = 0 1 2 7 8``)
+all models are written one after the other into a single ``mlc``. The ``split``
+command cuts that file into one ``mlc`` per model, laid out exactly like the
+separate-run results (``<CDS>/M1a/mlc``, ``<CDS>/M2a/mlc``, ...), so the
+summary step can read them the same way.
+
+It also holds the small readers shared by the other codeml helpers (lnL, BEB
+sites, run time, the rub iteration log), the chi-square tail probability
+used for the LRTs and the way they start codeml in a job folder.
+
+The ``selected`` command prints the BEB sites above a probability cut-off for
+the summary TSV. codeml numbers sites by codon in the ``.phy``; with the codon
+map written by fasta_to_phylip.py (``<CDS>.codons.tsv``, needed when fully
+masked codons were dropped) they are reported as codons of the alignment and
+of the reference CDS instead.
+
+Usage examples:
+  python3 codeml_output.py split combined/mlc results/<CDS>
+  python3 codeml_output.py selected results/<CDS>/Positive/mlc --codon-map codeml/input/<CDS>.codons.tsv
+"""
+import argparse
+import math
+import os
+import re
+import subprocess
+
+## NSsites value -> model folder name used in RESULTS_DIR
+NSSITES_MODELS = {
+    0: "M0",
+    1: "M1a",
+    2: "M2a",
+    3: "M3",
+    7: "M7",
+    8: "M8",
+}
+
+## "Model 2: PositiveSelection (3 categories)" - one per NSsites model in a multi-model mlc
+MODEL_HEADER = re.compile(r"^Model\s+(\d+):")
+## "lnL(ntime:  2  np: 10):  -7794.208066      +0.000000"
+LNL_LINE = re.compile(r"^lnL\(ntime:\s*\d+\s+np:\s*(\d+)\):\s*(-?\d+(?:\.\d+)?)")
+## BEB rows: "  1062 I 0.969*" (branch-site) or "    18 T      0.573         1.354 +- 0.780" (site models)
+_BEB_ROW = re.compile(r"^\s*(\d+)\s+(\S)\s+([01]\.\d+)(\**)")
+## "ns =  25  ls = 4403" - sequences and codons in the analysed alignment
+_DATA_SIZE = re.compile(r"^ns\s*=\s*(\d+)\s+ls\s*=\s*(\d+)")
+## rub iteration log: "  170  3.6274  27305.983689  x:  0.34514 ..." (iteration, step, -lnL, parameters)
+_RUB_LINE = re.compile(r"^\s*(\d+)\s+\S+\s+(-?\d+\.\d+)\s+x:")
+## "Time used: 52:30" / "Time used:  1:02:03"
+TIME_USED = re.compile(r"^Time used:\s*([\d:.]+)")
+
+
+def split_nssites_mlc(mlc_path, out_root):
+    """
+    Split a multi-NSsites mlc into ``<out_root>/<model>/mlc`` files.
+    The shared preamble (data summary, codon usage) is copied into every part.
+    Returns a dict of model name -> written path.
+    """
+    with open(mlc_path) as f:
+        lines = f.readlines()
+
+    preamble = []
+    sections = []  ## list of (nssites, lines)
+    for line in lines:
+        m = MODEL_HEADER.match(line)
+        if m:
+            sections.append((int(m.group(1)), [line]))
+        elif sections:
+            sections[-1][1].append(line)
+        else:
+            preamble.append(line)
+
+    if not sections:
+        raise ValueError(f"No 'Model N:' sections found in {mlc_path} (not a multi-NSsites run?)")
+
+    written = {}
+    for nssites, body in sections:
+        model = NSSITES_MODELS.get(nssites, f"NSsites{nssites}")
+        out_dir = os.path.join(out_root, model)
+        os.makedirs(out_dir, exist_ok=True)
+        out_path = os.path.join(out_dir, "mlc")
+        tmp_path = out_path + ".tmp"
+        with open(tmp_path, "w") as out:
+            out.writelines(preamble)
+            out.writelines(body)
+        os.replace(tmp_path, out_path)  ## never leave a half written mlc behind
+        written[model] = out_path
+    return written
+
+
+def read_lnl(mlc_path):
+    """Return (lnL, np) of the first likelihood line in an mlc, or (None, None)."""
+    with open(mlc_path) as f:
+        for line in f:
+            m = LNL_LINE.match(line)
+            if m:
+                return float(m.group(2)), int(m.group(1))
+    return None, None
+
+
+def read_data_size(mlc_path):
+    """Return (number of sequences, number of codons) of an mlc, or (None, None)."""
+    with open(mlc_path) as f:
+        for line in f:
+            m = _DATA_SIZE.match(line)
+            if m:
+                return int(m.group(1)), int(m.group(2))
+    return None, None
+
+
+def read_beb_sites(mlc_path):
+    """
+    Return the Bayes Empirical Bayes sites of an mlc as (position, aa, probability, stars),
+    positions as reported by codeml (codon columns of the analysed alignment).
+    """
+    sites = []
+    in_beb = False
+    with open(mlc_path) as f:
+        for line in f:
+            if line.startswith("Bayes Empirical Bayes"):
+                in_beb = True
+                continue
+            if not in_beb:
+                continue
+            if line.startswith("The grid") or line.startswith("sum of density") or line.startswith("Time used"):
+                break
+            m = _BEB_ROW.match(line)
+            if m:
+                sites.append((int(m.group(1)), m.group(2), float(m.group(3)), m.group(4)))
+    return sites
+
+
+def read_codon_map(map_path):
+    """codeml site -> (alignment codon, reference CDS codon or None) from a fasta_to_phylip.py codon map."""
+    codon_map = {}
+    with open(map_path) as f:
+        next(f, None)  ## header
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) != 3:
+                continue
+            codon_map[int(parts[0])] = (int(parts[1]), int(parts[2]) if parts[2] else None)
+    return codon_map
+
+
+def map_sites(sites, codon_map=None):
+    """
+    BEB sites as (alignment codon, reference codon, aa, probability, stars). Without a
+    codon map the .phy holds every alignment codon, so positions stay as codeml wrote them.
+    """
+    mapped = []
+    for pos, aa, prob, stars in sites:
+        aln_pos, ref_pos = codon_map.get(pos, (None, None)) if codon_map is not None else (pos, None)
+        mapped.append((aln_pos, ref_pos, aa, prob, stars))
+    return mapped
+
+
+def format_sites(mapped, min_prob, reference=False):
+    """'pos(aa,prob);' for every mapped site above ``min_prob``; '-' for sites without that coordinate."""
+    out = []
+    for aln_pos, ref_pos, aa, prob, stars in mapped:
+        if prob > min_prob:
+            pos = ref_pos if reference else aln_pos
+            out.append(f"{'-' if pos is None else pos}({aa},{prob:.3f});")
+    return "".join(out)
+
+
+def parse_rub_line(line):
+    """Return (iteration, lnL, number of parameters) for a rub iteration line, else None."""
+    m = _RUB_LINE.match(line)
+    if not m:
+        return None
+    return int(m.group(1)), -float(m.group(2)), len(line.split("x:", 1)[1].split())
+
+
+def read_rub(rub_path):
+    """
+    lnL trajectory of the current optimisation round in a rub file as a list of
+    (iteration, lnL). codeml restarts the iteration count for every round/model,
+    so only the last round is returned.
+    """
+    trajectory = []
+    with open(rub_path) as f:
+        for line in f:
+            parsed = parse_rub_line(line)
+            if not parsed:
+                continue
+            if trajectory and parsed[0] <= trajectory[-1][0]:
+                trajectory = []
+            trajectory.append(parsed[:2])
+    return trajectory
+
+
+def parse_time_used(line):
+    """Seconds of a "Time used: h:mm:ss" line, or None for any other line."""
+    m = TIME_USED.match(line)
+    if not m:
+        return None
+    seconds = 0.0
+    for part in m.group(1).split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def read_time_used(mlc_path):
+    """Seconds from codeml's final "Time used" line, or None."""
+    seconds = None
+    with open(mlc_path) as f:
+        for line in f:
+            seconds = parse_time_used(line) if line.startswith("Time used") else seconds
+    return seconds
+
+
+def start_codeml(folder, codeml="codeml"):
+    """Start ``codeml codeml.ctl`` in ``folder``, output to ``folder``/codeml.log. Returns (process, open log)."""
+    log = open(os.path.join(folder, "codeml.log"), "w")
+    try:
+        ## codeml waits for <Enter> on some errors; never let it block on stdin
+        proc = subprocess.Popen([codeml, "codeml.ctl"], cwd=folder,
+                                stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+    except BaseException:
+        log.close()
+        raise
+    return proc, log
+
+
+def chi2_sf(x, df):
+    """Chi-square survival function (closed form for df 1 and 2, scipy otherwise)."""
+    if x <= 0:
+        return 1.0
+    if df == 1:
+        return math.erfc(math.sqrt(x / 2.0))
+    if df == 2:
+        return math.exp(-x / 2.0)
+    from scipy.stats import chi2
+    return float(chi2.sf(x, df))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Helpers for codeml output files")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_split = sub.add_parser("split", help="Split a multi-NSsites mlc into per-model mlc files")
+    p_split.add_argument("mlc", help="mlc written by a run with several NSsites values")
+    p_split.add_argument("out_root", help="CDS results folder; parts go to <out_root>/<model>/mlc")
+
+    p_selected = sub.add_parser("selected", help="Print BEB sites above a probability as alignment<TAB>reference positions")
+    p_selected.add_argument("mlc", help="mlc of the alternative model")
+    p_selected.add_argument("--codon-map", help="<CDS>.codons.tsv written next to the .phy by fasta_to_phylip.py")
+    p_selected.add_argument("--min-prob", type=float, default=0.8, help="Posterior probability cut-off (default: 0.8)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "split":
+        written = split_nssites_mlc(args.mlc, args.out_root)
+        for model, path in written.items():
+            print(f"{model}\t{path}")
+    elif args.command == "selected":
+        codon_map = read_codon_map(args.codon_map) if args.codon_map and os.path.isfile(args.codon_map) else None
+        mapped = map_sites(read_beb_sites(args.mlc), codon_map)
+        reference = format_sites(mapped, args.min_prob, reference=True) if codon_map else ""
+        print(f"{format_sites(mapped, args.min_prob)}\t{reference}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+multistart.py
+
+Runs one codeml job from several starting values at the same time and keeps the
+best fit. Branch-site Positive and M2a often end in a local optimum that depends
+on the initial omega; a few starts in parallel cost about the wall time of one.
+
+Every start gets its own folder ``<job>/starts/w<omega>_k<kappa>`` with a copy of
+the job's codeml.ctl (only ``omega``/``kappa`` changed; a fixed omega or kappa is
+left alone) and links to aln.phy/tree.tre. While they run, each start's ``rub``
+iteration log is followed. A start is stopped when, after ``--min-iterations``
+iterations, its lnL trails another start by more than ``--margin`` log-likelihood
+units at the same iteration of the same optimisation round. When all starts have
+ended, the output files of the finished start with the highest lnL are moved into
+the job folder (mlc, rst, rub, ...), together with its codeml.ctl, so the job
+folder looks like a single run. Every start is listed in ``multistart.tsv``.
+
+Starts are compared by the first lnL of their mlc, so only single-model jobs are
+run from several starts. A ctl listing several NSsites values (SITE_MODEL_MODE
+combined) would be ranked by its M0 fit; such a job runs once, unchanged.
+
+Usage examples:
+  python3 multistart.py run RESULTS_DIR/<CDS>/Positive --omega 0.2,1,3 --kappa 2
+  python3 multistart.py run RESULTS_DIR/<CDS>/M2a --omega 0.5,1,2,4 --kappa 1,3 --margin 10
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from codeml_monitor import FileTail
+from codeml_output import parse_rub_line, read_lnl, start_codeml
+
+STARTS_DIR = "starts"
+SUMMARY_FILE = "multistart.tsv"
+
+
+def ctl_values(ctl_path):
+    """``name -> value`` of the ``name = value`` lines of a control file (comments dropped)."""
+    values = {}
+    with open(ctl_path) as f:
+        for line in f:
+            key, sep, value = line.split("*", 1)[0].partition("=")
+            if sep:
+                values[key.strip()] = value.strip()
+    return values
+
+
+def write_start_ctl(ctl_path, out_path, settings):
+    """Copy a control file with ``settings`` replaced (or appended) and the output written to ``mlc``."""
+    settings = dict(settings, outfile="mlc")
+    done = set()
+    with open(ctl_path) as src, open(out_path, "w") as dst:
+        for line in src:
+            key = line.split("*", 1)[0].partition("=")[0].strip()
+            if "=" in line and key in settings:
+                line = f"{key} = {settings[key]}\n"
+                done.add(key)
+            dst.write(line)
+        for key in settings:
+            if key not in done:
+                dst.write(f"{key} = {settings[key]}\n")
+
+
+def nssites_values(values):
+    return values.get("NSsites", "0").split()
+
+
+def start_grid(ctl_path, omegas, kappas):
+    """Starting values to try; a fixed omega or kappa is not varied, a multi-model ctl gets one start."""
+    values = ctl_values(ctl_path)
+    if len(nssites_values(values)) > 1:
+        return [{}]
+    if values.get("fix_omega", "0") == "1":
+        omegas = [None]
+    if values.get("fix_kappa", "0") == "1":
+        kappas = [None]
+    grid = []
+    for omega in omegas:
+        for kappa in kappas:
+            settings = {}
+            if omega is not None:
+                settings["omega"] = omega
+            if kappa is not None:
+                settings["kappa"] = kappa
+            grid.append(settings)
+    return grid
+
+
+def start_label(settings):
+    return "_".join(f"{key[0]}{value}" for key, value in (("w", settings.get("omega")), ("k", settings.get("kappa")))
+                    if value is not None) or "default"
+
+
+class Start:
+    """One codeml process and its lnL trajectory, per optimisation round."""
+
+    def __init__(self, folder, settings):
+        self.folder = folder
+        self.label = os.path.basename(folder)
+        self.settings = settings
+        self.rub = FileTail(os.path.join(folder, "rub"))
+        self.rounds = [[]]  ## (iteration, lnL) per optimisation round; codeml restarts the count per round
+        self.proc = None
+        self.log = None
+        self.state = "running"
+        self.started = None
+        self.seconds = None
+        self.lnl = None
+
+    def launch(self, codeml):
+        self.started = time.time()
+        self.proc, self.log = start_codeml(self.folder, codeml)
+
+    def update(self):
+        _, lines = self.rub.read()
+        for line in lines:
+            parsed = parse_rub_line(line)
+            if not parsed:
+                continue
+            iteration, lnl, _ = parsed
+            if self.rounds[-1] and iteration <= self.rounds[-1][-1][0]:
+                self.rounds.append([])
+            self.rounds[-1].append((iteration, lnl))
+
+    @property
+    def position(self):
+        """(round, iteration, lnL) of the last rub line, or None before the first one."""
+        if not self.rounds[-1]:
+            return None
+        iteration, lnl = self.rounds[-1][-1]
+        return len(self.rounds) - 1, iteration, lnl
+
+    def lnl_at(self, round_index, iteration):
+        """
+        lnL this start had reached by ``iteration`` of ``round_index``; None if it has not got
+        there yet. A round that is over counts with its final lnL.
+        """
+        if round_index >= len(self.rounds):
+            return None
+        trajectory = self.rounds[round_index]
+        ongoing = round_index == len(self.rounds) - 1 and self.state == "running"
+        if not trajectory or (ongoing and trajectory[-1][0] < iteration):
+            return None
+        reached = None
+        for it, lnl in trajectory:
+            if it > iteration:
+                break
+            reached = lnl
+        return reached
+
+    def finish(self, state):
+        self.state = state
+        self.seconds = None if self.started is None else time.time() - self.started
+        if self.log is not None:
+            self.log.close()
+        if state == "finished":
+            self.lnl, _ = read_lnl(os.path.join(self.folder, "mlc"))
+            if self.lnl is None:
+                self.state = "failed"
+
+    def stop(self):
+        if self.proc is None:  ## never launched (an earlier start failed to start)
+            self.finish("failed")
+            return
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.finish("stopped")
+
+
+def trailing_by(start, others):
+    """How far ``start`` trails the best other start at its own round and iteration (None if not comparable)."""
+    position = start.position
+    if position is None:
+        return None
+    round_index, iteration, lnl = position
+    ahead = [other.lnl_at(round_index, iteration) for other in others if other is not start]
+    ahead = [value for value in ahead if value is not None]
+    return max(ahead) - lnl if ahead else None
+
+
+def prepare_starts(job_dir, grid):
+    starts_dir = os.path.join(job_dir, STARTS_DIR)
+    shutil.rmtree(starts_dir, ignore_errors=True)
+    starts = []
+    for settings in grid:
+        folder = os.path.join(starts_dir, start_label(settings))
+        os.makedirs(folder)
+        for name in ("aln.phy", "tree.tre"):
+            os.symlink(os.path.realpath(os.path.join(job_dir, name)), os.path.join(folder, name))
+        write_start_ctl(os.path.join(job_dir, "codeml.ctl"), os.path.join(folder, "codeml.ctl"), settings)
+        starts.append(Start(folder, settings))
+    return starts
+
+
+def run_starts(starts, codeml="codeml", margin=5.0, min_iterations=20, poll=5.0):
+    for start in starts:
+        start.launch(codeml)
+    while any(start.state == "running" for start in starts):
+        time.sleep(poll)
+        for start in starts:
+            if start.state != "running":
+                continue
+            start.update()
+            if start.proc.poll() is not None:
+                start.update()
+                start.finish("finished" if start.proc.returncode == 0 else "failed")
+        for start in starts:
+            alive = [s for s in starts if s.state in ("running", "finished")]
+            if start.state != "running" or len(alive) <= 1:
+                continue  ## never stop the last start standing
+            position = start.position
+            if position is None or position[1] < min_iterations:
+                continue
+            gap = trailing_by(start, alive)
+            if gap is not None and gap > margin:
+                print(f"[multistart] stopping {start.label}: lnL {position[2]:.3f} trails by {gap:.3f} "
+                      f"at iteration {position[1]}", file=sys.stderr)
+                start.stop()
+    return starts
+
+
+def keep_best(job_dir, starts):
+    """Move the best finished start's output into the job folder. Returns that start, or None."""
+    finished = [start for start in starts if start.state == "finished"]
+    if not finished:
+        return None
+    best = max(finished, key=lambda start: start.lnl)
+    for name in os.listdir(best.folder):
+        if name in ("aln.phy", "tree.tre"):
+            continue
+        target = os.path.join(job_dir, name)
+        if os.path.islink(target):
+            os.remove(target)  ## replace a link itself, never the file it points to
+        shutil.move(os.path.join(best.folder, name), target)
+    return best
+
+
+def write_summary(path, starts, best):
+    with open(path, "w") as out:
+        out.write("start\tomega\tkappa\tstate\tround\titeration\tlnL\tseconds\tbest\n")
+        for start in starts:
+            position = start.position or ("", "", None)
+            lnl = start.lnl if start.lnl is not None else position[2]
+            out.write("\t".join(str(v) for v in (
+                start.label, start.settings.get("omega", ""), start.settings.get("kappa", ""), start.state,
+                position[0], position[1], "" if lnl is None else f"{lnl:.6f}",
+                "" if start.seconds is None else f"{start.seconds:.1f}", "yes" if start is best else "",
+            )) + "\n")
+
+
+def run_job(job_dir, omegas, kappas, codeml="codeml", margin=5.0, min_iterations=20, poll=5.0, keep_starts=False):
+    job_dir = os.path.abspath(job_dir)
+    ctl_path = os.path.join(job_dir, "codeml.ctl")
+    grid = start_grid(ctl_path, omegas, kappas)
+    if len(nssites_values(ctl_values(ctl_path))) > 1:
+        print(f"[multistart] {job_dir}: several NSsites models in one run; starts cannot be ranked per model, "
+              "running a single start", file=sys.stderr)
+    starts = prepare_starts(job_dir, grid)
+    print(f"[multistart] {job_dir}: {len(starts)} start(s): {', '.join(s.label for s in starts)}", file=sys.stderr)
+    try:
+        run_starts(starts, codeml, margin, min_iterations, poll)
+    except BaseException:
+        for start in starts:
+            if start.state == "running":
+                start.stop()
+        raise
+    best = keep_best(job_dir, starts)
+    write_summary(os.path.join(job_dir, SUMMARY_FILE), starts, best)
+    if not keep_starts:
+        shutil.rmtree(os.path.join(job_dir, STARTS_DIR), ignore_errors=True)
+    if best is None:
+        print(f"[multistart] {job_dir}: no start finished", file=sys.stderr)
+    else:
+        print(f"[multistart] {job_dir}: best start {best.label} (lnL {best.lnl:.6f})", file=sys.stderr)
+    return best
+
+
+def parse_values(text):
+    return [value.strip() for value in text.split(",") if value.strip()]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run codeml from several starting values in parallel, keep the best")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_run = sub.add_parser("run", help="Run a prepared codeml job folder (codeml.ctl, aln.phy, tree.tre)")
+    p_run.add_argument("job_dir", help="Job folder; the best start's output ends up here")
+    p_run.add_argument("--omega", type=parse_values, default=["1"], help="Comma separated initial omegas (default: 1)")
+    p_run.add_argument("--kappa", type=parse_values, default=["2"], help="Comma separated initial kappas (default: 2)")
+    p_run.add_argument("--margin", type=float, default=5.0,
+                       help="Stop a start trailing another by more than this lnL (default: 5)")
+    p_run.add_argument("--min-iterations", type=int, default=20,
+                       help="Iterations a start runs before it can be stopped (default: 20)")
+    p_run.add_argument("--poll", type=float, default=5.0, help="Seconds between progress checks (default: 5)")
+    p_run.add_argument("--codeml", default="codeml", help="codeml executable")
+    p_run.add_argument("--keep-starts", action="store_true", help="Keep the starts/ folders")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "run":
+        best = run_job(args.job_dir, args.omega, args.kappa, args.codeml, args.margin, args.min_iterations,
+                       args.poll, args.keep_starts)
+        sys.exit(0 if best else 1)
+
+
+if __name__ == "__main__":
+    main()
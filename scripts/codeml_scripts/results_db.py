@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+results_db.py
+
+Collects codeml results from many pipeline runs into one SQLite database, so
+questions across groups and runs become a query instead of a walk over
+``summary_<ANALYSIS>_<GROUP>.tsv`` files in timestamped folders.
+
+A run is one CODEML_RESULTS_DIR (``<GROUP>_<REF_ACC>_<CDS>/<Model>/mlc``). Loading
+the same folder again replaces its rows, so re-running the pipeline is safe.
+
+Tables:
+  runs    one row per results folder (group, analysis, config hash, load time)
+  models  one row per CDS and model (lnL, np, tree size, codons, codeml seconds)
+  tests   one row per CDS and likelihood ratio test (LRT, df, p-value, selected sites)
+  sites   BEB sites of the alternative models, with their alignment and reference CDS codon
+  results view joining tests with their run
+
+Usage examples:
+  python3 results_db.py load results.sqlite output/codeml/output/Astroviridae_43 --config config.yaml --codon-maps output/codeml/input
+  python3 results_db.py query results.sqlite --test M1a_M2a --max-p 0.05
+  python3 results_db.py query results.sqlite --sql "SELECT group_name, COUNT(*) FROM results GROUP BY 1"
+"""
+import argparse
+import glob
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from codeml_output import (chi2_sf, format_sites, map_sites, read_beb_sites, read_codon_map, read_data_size,
+                           read_lnl, read_time_used)
+
+## (test name, null model, alternative model, degrees of freedom) per analysis
+TESTS = {
+    "site-model": [("M1a_M2a", "M1a", "M2a", 2), ("M7_M8", "M7", "M8", 2)],
+    "branch-site": [("Null_Positive", "Null", "Positive", 1)],
+}
+
+## same cut-offs as the summary TSV
+SELECT_MAX_P = 0.05
+SELECT_MIN_PROB = 0.8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      INTEGER PRIMARY KEY,
+    results_dir TEXT UNIQUE NOT NULL,
+    group_name  TEXT NOT NULL,
+    analysis    TEXT NOT NULL,
+    config_hash TEXT,
+    loaded_at   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS models (
+    run_id    INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    cds       TEXT NOT NULL,
+    ref_acc   TEXT,
+    cds_id    TEXT,
+    model     TEXT NOT NULL,
+    lnl       REAL,
+    np        INTEGER,
+    tree_size INTEGER,
+    codons    INTEGER,
+    seconds   REAL,
+    PRIMARY KEY (run_id, cds, model)
+);
+CREATE TABLE IF NOT EXISTS tests (
+    run_id         INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    cds            TEXT NOT NULL,
+    ref_acc        TEXT,
+    cds_id         TEXT,
+    test           TEXT NOT NULL,
+    lrt            REAL,
+    df             INTEGER,
+    pvalue         REAL,
+    selected_sites TEXT,
+    PRIMARY KEY (run_id, cds, test)
+);
+CREATE TABLE IF NOT EXISTS sites (
+    run_id      INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    cds         TEXT NOT NULL,
+    model       TEXT NOT NULL,
+    position    INTEGER NOT NULL,
+    aa          TEXT,
+    probability REAL,
+    signif      TEXT,
+    aln_position INTEGER,
+    ref_position INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_runs_group ON runs(group_name);
+CREATE INDEX IF NOT EXISTS idx_models_cds ON models(cds_id);
+CREATE INDEX IF NOT EXISTS idx_tests_pvalue ON tests(test, pvalue);
+CREATE INDEX IF NOT EXISTS idx_tests_cds ON tests(cds_id);
+CREATE INDEX IF NOT EXISTS idx_sites_cds ON sites(run_id, cds);
+CREATE VIEW IF NOT EXISTS results AS
+    SELECT r.group_name, r.analysis, r.results_dir, r.config_hash, t.cds, t.ref_acc, t.cds_id,
+           t.test, t.lrt, t.df, t.pvalue, t.selected_sites
+    FROM tests t JOIN runs r USING (run_id);
+"""
+
+## "<REF_ACC>_<CDS_ID>" where the reference accession ends in a version (KY581700.1, NC_045512.2)
+_REF_CDS = re.compile(r"^(.+?\.\d+)_(.+)$")
+
+
+def connect(db_path):
+    """Open (and create if needed) a results database."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    ## databases created before the codon map columns existed
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(sites)")}
+    for column in ("aln_position", "ref_position"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE sites ADD COLUMN {column} INTEGER")
+    return conn
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def infer_group_and_analysis(results_dir):
+    """Read GROUP and ANALYSIS from summary_<ANALYSIS>_<GROUP>.tsv, falling back to the model folders."""
+    for summary in sorted(glob.glob(os.path.join(results_dir, "summary_*.tsv"))):
+        name = os.path.basename(summary)[len("summary_"):-len(".tsv")]
+        for analysis in TESTS:
+            if name.startswith(analysis + "_"):
+                return name[len(analysis) + 1:], analysis
+    analysis = "branch-site" if glob.glob(os.path.join(results_dir, "*", "Positive")) else "site-model"
+    return os.path.basename(os.path.normpath(results_dir)), analysis
+
+
+def split_cds_name(cds, group):
+    """'<GROUP>_<REF_ACC>_<CDS_ID>' -> (REF_ACC, CDS_ID); (None, rest) when it does not parse."""
+    rest = cds[len(group) + 1:] if cds.startswith(group + "_") else cds
+    m = _REF_CDS.match(rest)
+    if m:
+        return m.group(1), m.group(2)
+    return None, rest
+
+
+def load_run(conn, results_dir, group=None, analysis=None, config_path=None, codon_maps_dir=None):
+    """
+    Load one results folder, replacing earlier rows for it. Returns the number of CDS loaded.
+    ``codon_maps_dir`` holds the ``<CDS>.codons.tsv`` maps written next to the .phy files.
+    """
+    results_dir = os.path.abspath(results_dir)
+    found_group, found_analysis = infer_group_and_analysis(results_dir)
+    group = group or found_group
+    analysis = analysis or found_analysis
+    config_hash = file_hash(config_path) if config_path else None
+
+    with conn:  ## one transaction per run
+        conn.execute("DELETE FROM runs WHERE results_dir = ?", (results_dir,))
+        run_id = conn.execute(
+            "INSERT INTO runs (results_dir, group_name, analysis, config_hash, loaded_at) VALUES (?, ?, ?, ?, ?)",
+            (results_dir, group, analysis, config_hash, time.strftime("%Y-%m-%d %H:%M:%S")),
+        ).lastrowid
+
+        n_cds = 0
+        for cds_dir in sorted(glob.glob(os.path.join(results_dir, f"{group}_*", ""))):
+            cds = os.path.basename(os.path.dirname(cds_dir))
+            ref_acc, cds_id = split_cds_name(cds, group)
+            map_path = os.path.join(codon_maps_dir, f"{cds}.codons.tsv") if codon_maps_dir else None
+            codon_map = read_codon_map(map_path) if map_path and os.path.isfile(map_path) else None
+            lnl = {}
+            for mlc in sorted(glob.glob(os.path.join(cds_dir, "*", "mlc"))):
+                model = os.path.basename(os.path.dirname(mlc))
+                if model == "combined":
+                    continue  ## already split into the per-model folders
+                lnl[model], n_params = read_lnl(mlc)
+                tree_size, codons = read_data_size(mlc)
+                conn.execute(
+                    "INSERT INTO models VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, cds, ref_acc, cds_id, model, lnl[model], n_params, tree_size, codons,
+                     read_time_used(mlc)),
+                )
+
+            for test, null_model, alt_model, df in TESTS[analysis]:
+                if lnl.get(null_model) is None or lnl.get(alt_model) is None:
+                    continue
+                ## as in the summary TSV: not clamped, a negative LRT (alternative fit worse) gets p = 1
+                lrt = round(2 * (lnl[alt_model] - lnl[null_model]), 6)
+                pvalue = chi2_sf(lrt, df)
+                sites = read_beb_sites(os.path.join(cds_dir, alt_model, "mlc"))
+                mapped = map_sites(sites, codon_map)
+                conn.executemany(
+                    "INSERT INTO sites VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(run_id, cds, alt_model, pos, aa, prob, stars, aln_pos, ref_pos)
+                     for (pos, aa, prob, stars), (aln_pos, ref_pos, *_) in zip(sites, mapped)],
+                )
+                conn.execute(
+                    "INSERT INTO tests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, cds, ref_acc, cds_id, test, lrt, df, pvalue,
+                     format_sites(mapped, SELECT_MIN_PROB) if pvalue < SELECT_MAX_P else ""),
+                )
+            if lnl:
+                n_cds += 1
+    return n_cds
+
+
+def query(conn, group=None, test=None, cds=None, max_p=None):
+    """Rows of the ``results`` view matching the filters, as (column names, rows)."""
+    where, params = [], []
+    if group:
+        where.append("group_name = ?")
+        params.append(group)
+    if test:
+        where.append("test = ?")
+        params.append(test)
+    if cds:
+        where.append("(cds_id = ? OR cds = ?)")
+        params += [cds, cds]
+    if max_p is not None:
+        where.append("pvalue <= ?")
+        params.append(max_p)
+    sql = "SELECT * FROM results"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY pvalue"
+    return run_sql(conn, sql, params)
+
+
+def run_sql(conn, sql, params=()):
+    cur = conn.execute(sql, params)
+    return [d[0] for d in cur.description or []], cur.fetchall()
+
+
+def print_tsv(columns, rows):
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join("" if v is None else str(v) for v in row))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load and query codeml results in a SQLite database")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_load = sub.add_parser("load", help="Load one or more CODEML_RESULTS_DIR folders")
+    p_load.add_argument("db", help="SQLite database (created if missing)")
+    p_load.add_argument("results_dirs", nargs="+", help="Folders holding <GROUP>_<REF_ACC>_<CDS>/<Model>/mlc")
+    p_load.add_argument("--group", help="Group name (default: from the summary file name or folder)")
+    p_load.add_argument("--analysis", choices=sorted(TESTS), help="Analysis type (default: detected)")
+    p_load.add_argument("--config", help="Config file of the run; its hash is stored with the run")
+    p_load.add_argument("--codon-maps", help="Folder with the <CDS>.codons.tsv maps (CODEML_INPUT_DIR)")
+
+    p_query = sub.add_parser("query", help="Print matching tests as TSV")
+    p_query.add_argument("db", help="SQLite database")
+    p_query.add_argument("--group", help="Only this group")
+    p_query.add_argument("--test", help="Only this test (M1a_M2a, M7_M8, Null_Positive)")
+    p_query.add_argument("--cds", help="Only this CDS (protein id or full CDS folder name)")
+    p_query.add_argument("--max-p", type=float, help="Only tests with p-value <= this")
+    p_query.add_argument("--sql", help="Run this SQL instead of the filters above")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "load":
+        conn = connect(args.db)
+        for results_dir in args.results_dirs:
+            if not os.path.isdir(results_dir):
+                print(f"Skipping {results_dir} — not a folder", file=sys.stderr)
+                continue
+            n_cds = load_run(conn, results_dir, args.group, args.analysis, args.config, args.codon_maps)
+            print(f"Loaded {n_cds} CDS from {results_dir} into {args.db}")
+        conn.close()
+    elif args.command == "query":
+        if not os.path.exists(args.db):
+            sys.exit(f"No results database at {args.db}")
+        conn = connect(args.db)
+        if args.sql:
+            print_tsv(*run_sql(conn, args.sql))
+        else:
+            print_tsv(*query(conn, args.group, args.test, args.cds, args.max_p))
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+spool.py
+
+Filesystem spool queue for running codeml jobs on several machines that share a
+filesystem. Every job is a self-contained bundle folder (codeml.ctl, aln.phy,
+tree.tre and job.json) that moves between state folders with atomic renames:
+
+  SPOOL_DIR/
+  ├── tmp/        # bundles being written by ``submit``
+  ├── pending/    # ready to be claimed
+  ├── running/    # claimed by a worker; ``heartbeat`` is touched while codeml runs
+  ├── done/       # finished bundles, results under ``result/``
+  └── failed/     # codeml failed or the job ran out of attempts
+
+Only one process can win ``rename(pending/<id>, running/<id>)``, so claiming needs
+no lock server. A claim whose heartbeat is older than ``--stale`` seconds (worker
+died, node rebooted) is moved back to ``pending/`` by any worker or collector.
+Workers run codeml in a node-local scratch copy, so a worker that lost its claim
+can never write into a bundle that someone else is running.
+
+Usage examples:
+  # pipeline side
+  python3 spool.py submit /shared/spool RESULTS_DIR/<CDS>/M2a >> jobs.txt
+  python3 spool.py collect /shared/spool jobs.txt
+  # on any node
+  python3 spool.py worker /shared/spool
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from codeml_output import start_codeml
+
+STATES = ("tmp", "pending", "running", "done", "failed")
+
+## bundle files that are not copied back, so RESULTS_DIR looks exactly like a local run
+## (codeml.log stays in the bundle; failed bundles are kept for inspection)
+NOT_COLLECTED = {"codeml.ctl", "aln.phy", "tree.tre", "job.json", "codeml.log"}
+## per-claim bookkeeping inside running/<id>
+CLAIM_FILE = "claim.json"
+HEARTBEAT_FILE = "heartbeat"
+## codeml's intermediate files, mirrored into running/<id>/progress/ on every heartbeat
+## so codeml_monitor.py can follow jobs that run in node-local scratch
+PROGRESS_DIR = "progress"
+PROGRESS_FILES = ("rub", "mlc")
+
+
+def init_spool(spool_dir):
+    for state in STATES:
+        os.makedirs(os.path.join(spool_dir, state), exist_ok=True)
+
+
+def job_path(spool_dir, state, job_id):
+    return os.path.join(spool_dir, state, job_id)
+
+
+def find_job(spool_dir, job_id):
+    """Return the state folder currently holding ``job_id`` (None if unknown)."""
+    for state in ("pending", "running", "done", "failed"):
+        if os.path.isdir(job_path(spool_dir, state, job_id)):
+            return state
+    return None
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def make_job_id(dest):
+    """Stable id for a destination folder, readable in ``ls`` output."""
+    dest = os.path.abspath(dest)
+    digest = hashlib.sha1(dest.encode()).hexdigest()[:10]
+    cds, model = os.path.basename(os.path.dirname(dest)), os.path.basename(dest)
+    return f"{cds}__{model}__{digest}"
+
+
+# ---------- Submit ---------- #
+
+def submit(spool_dir, out_dir, max_attempts=3):
+    """
+    Bundle a prepared codeml job folder (codeml.ctl plus the aln.phy/tree.tre
+    links) into ``pending/``. Resubmitting a job that is queued or running is a
+    no-op; a failed or uncollected finished bundle is dropped and the job queued
+    again with fresh attempts. Returns the job id.
+    """
+    init_spool(spool_dir)
+    out_dir = os.path.abspath(out_dir)
+    job_id = make_job_id(out_dir)
+    state = find_job(spool_dir, job_id)
+    if state in ("pending", "running"):
+        return job_id
+    if state in ("done", "failed"):
+        ## move it out of the state folders first, so nobody sees a half removed bundle
+        old = os.path.join(spool_dir, "tmp", f"{job_id}.{os.getpid()}.old")
+        try:
+            os.rename(job_path(spool_dir, state, job_id), old)
+            shutil.rmtree(old, ignore_errors=True)
+            print(f"[spool] resubmitting {job_id} (was {state})", file=sys.stderr)
+        except OSError:
+            pass  ## another submit or collect got there first
+
+    staging = tempfile.mkdtemp(prefix=f"{job_id}.", dir=os.path.join(spool_dir, "tmp"))
+    ## copy through the symlinks so the bundle does not depend on the submitting node
+    shutil.copyfile(os.path.join(out_dir, "aln.phy"), os.path.join(staging, "aln.phy"))
+    shutil.copyfile(os.path.join(out_dir, "tree.tre"), os.path.join(staging, "tree.tre"))
+    with open(os.path.join(out_dir, "codeml.ctl")) as src, \
+            open(os.path.join(staging, "codeml.ctl"), "w") as dst:
+        for line in src:
+            if line.strip().startswith("outfile"):
+                line = "outfile = mlc\n"
+            dst.write(line)
+    write_json(os.path.join(staging, "job.json"), {
+        "id": job_id,
+        "dest": out_dir,
+        "submitted_by": socket.gethostname(),
+        "submitted_at": time.time(),
+        "attempts": 0,
+        "max_attempts": max_attempts,
+    })
+    try:
+        os.rename(staging, job_path(spool_dir, "pending", job_id))
+    except OSError:
+        ## lost a race against an identical submit
+        shutil.rmtree(staging, ignore_errors=True)
+    return job_id
+
+
+# ---------- Stale claims ---------- #
+
+def claim_age(job_dir):
+    """Seconds since the claim in ``job_dir`` last showed signs of life."""
+    for name in (HEARTBEAT_FILE, CLAIM_FILE):
+        try:
+            return time.time() - os.path.getmtime(os.path.join(job_dir, name))
+        except OSError:
+            continue
+    ## claimed a moment ago: the rename into running/ bumped the folder's ctime
+    try:
+        st = os.stat(job_dir)
+    except OSError:
+        return 0.0
+    return time.time() - max(st.st_mtime, st.st_ctime)
+
+
+def reclaim_stale(spool_dir, stale_seconds):
+    """Move claims without a recent heartbeat back to ``pending/`` (or ``failed/``)."""
+    reclaimed = []
+    running_dir = os.path.join(spool_dir, "running")
+    for job_id in sorted(os.listdir(running_dir)):
+        src = os.path.join(running_dir, job_id)
+        if claim_age(src) < stale_seconds:
+            continue
+        if not os.path.isfile(os.path.join(src, "job.json")):
+            ## no bundle, only leftovers (e.g. progress/ of a job that was published); never requeue it
+            shutil.rmtree(src, ignore_errors=True)
+            continue
+        try:
+            job = read_json(os.path.join(src, "job.json"))
+        except (OSError, ValueError):
+            job = {}
+        target = "pending"
+        if job.get("attempts", 0) >= job.get("max_attempts", 3):
+            target = "failed"
+        try:
+            os.rename(src, job_path(spool_dir, target, job_id))
+        except OSError:
+            continue  ## the worker finished or another process reclaimed it first
+        dst = job_path(spool_dir, target, job_id)
+        for name in (CLAIM_FILE, HEARTBEAT_FILE):
+            try:
+                os.remove(os.path.join(dst, name))
+            except OSError:
+                pass
+        shutil.rmtree(os.path.join(dst, PROGRESS_DIR), ignore_errors=True)
+        print(f"[spool] stale claim on {job_id} -> {target}", file=sys.stderr)
+        reclaimed.append(job_id)
+    return reclaimed
+
+
+# ---------- Worker ---------- #
+
+class Heartbeat(threading.Thread):
+    """
+    Touch ``running/<id>/heartbeat`` every ``interval`` seconds until stopped, and
+    copy the progress files of ``mirror_from`` (the scratch folder) next to it.
+    With a claim ``token`` it stops for good once ``claim.json`` no longer holds
+    that token, so a reclaimed job's new owner is never written over.
+    """
+
+    def __init__(self, path, interval, mirror_from=None, token=None):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.mirror_from = mirror_from
+        self.token = token
+        self.stopped = threading.Event()
+
+    def mirror(self):
+        progress_dir = os.path.join(os.path.dirname(self.path), PROGRESS_DIR)
+        try:
+            os.mkdir(progress_dir)  ## never recreates the claim folder once the job has moved on
+        except FileExistsError:
+            pass
+        for name in PROGRESS_FILES:
+            src = os.path.join(self.mirror_from, name)
+            if os.path.isfile(src):
+                shutil.copyfile(src, os.path.join(progress_dir, name + ".tmp"))
+                os.replace(os.path.join(progress_dir, name + ".tmp"), os.path.join(progress_dir, name))
+
+    def beat(self):
+        if self.token and not still_owner(os.path.dirname(self.path), self.token):
+            self.stop()
+            return
+        try:
+            with open(self.path, "a"):
+                os.utime(self.path, None)
+            if self.mirror_from:
+                self.mirror()
+        except OSError:
+            pass  ## claim was taken away; the worker notices when it tries to finish
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.beat()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def claim_next(spool_dir, worker_id):
+    """Atomically claim one pending job. Returns (job_id, running path, claim token) or (None, None, None)."""
+    pending_dir = os.path.join(spool_dir, "pending")
+    for job_id in sorted(os.listdir(pending_dir)):
+        dst = job_path(spool_dir, "running", job_id)
+        try:
+            os.rename(os.path.join(pending_dir, job_id), dst)
+        except OSError:
+            continue  ## someone else got it
+        try:
+            open(os.path.join(dst, HEARTBEAT_FILE), "a").close()
+            token = f"{worker_id}:{uuid.uuid4().hex}"  ## one per claim, so a re-claim by the same worker differs too
+            write_json(os.path.join(dst, CLAIM_FILE), {"worker": worker_id, "token": token, "claimed_at": time.time()})
+            job = read_json(os.path.join(dst, "job.json"))
+            job["attempts"] = job.get("attempts", 0) + 1
+            write_json(os.path.join(dst, "job.json"), job)
+        except OSError:
+            continue  ## reclaimed before the claim was recorded
+        return job_id, dst, token
+    return None, None, None
+
+
+def still_owner(claim_dir, token):
+    try:
+        return read_json(os.path.join(claim_dir, CLAIM_FILE)).get("token") == token
+    except (OSError, ValueError):
+        return False
+
+
+def run_job(spool_dir, job_id, claim_dir, worker_id, token, codeml="codeml",
+            heartbeat_interval=30, scratch_root=None):
+    """Run codeml for a claimed bundle in local scratch and publish the result."""
+    scratch = tempfile.mkdtemp(prefix=f"codeml_{job_id}.", dir=scratch_root)
+    heartbeat = Heartbeat(os.path.join(claim_dir, HEARTBEAT_FILE), heartbeat_interval, mirror_from=scratch,
+                          token=token)
+    heartbeat.start()
+    try:
+        for name in ("codeml.ctl", "aln.phy", "tree.tre"):
+            shutil.copyfile(os.path.join(claim_dir, name), os.path.join(scratch, name))
+        started = time.time()
+        proc, log = start_codeml(scratch, codeml)
+        with log:
+            rc = proc.wait()
+        elapsed = time.time() - started
+    finally:
+        heartbeat.stop()
+        heartbeat.join()  ## a beat in progress must not write into the claim after it is published
+
+    if not still_owner(claim_dir, token):
+        print(f"[spool] lost claim on {job_id}; discarding local result", file=sys.stderr)
+        shutil.rmtree(scratch, ignore_errors=True)
+        return None
+
+    result_dir = os.path.join(claim_dir, "result")
+    shutil.rmtree(result_dir, ignore_errors=True)
+    os.makedirs(result_dir)
+    for name in os.listdir(scratch):
+        if name in ("aln.phy", "tree.tre"):
+            continue
+        shutil.move(os.path.join(scratch, name), os.path.join(result_dir, name))
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    ok = rc == 0 and os.path.isfile(os.path.join(result_dir, "mlc"))
+    write_json(os.path.join(claim_dir, "status.json"), {
+        "worker": worker_id, "returncode": rc, "seconds": round(elapsed, 1), "finished_at": time.time(),
+    })
+    target = "done" if ok else "failed"
+    try:
+        os.rename(claim_dir, job_path(spool_dir, target, job_id))
+    except OSError:
+        print(f"[spool] could not publish {job_id} (claim moved away)", file=sys.stderr)
+        return None
+    print(f"[spool] {worker_id}: {job_id} -> {target} ({elapsed:.0f}s)", file=sys.stderr)
+    return target
+
+
+def worker(spool_dir, codeml="codeml", poll=5.0, heartbeat_interval=30, stale=300,
+           exit_when_empty=False, max_jobs=None, scratch_root=None):
+    init_spool(spool_dir)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    done = 0
+    print(f"[spool] worker {worker_id} watching {spool_dir}", file=sys.stderr)
+    while max_jobs is None or done < max_jobs:
+        reclaim_stale(spool_dir, stale)
+        job_id, claim_dir, token = claim_next(spool_dir, worker_id)
+        if job_id is None:
+            if exit_when_empty and not os.listdir(os.path.join(spool_dir, "running")):
+                break
+            time.sleep(poll)
+            continue
+        run_job(spool_dir, job_id, claim_dir, worker_id, token, codeml, heartbeat_interval, scratch_root)
+        done += 1
+    return done
+
+
+# ---------- Collect ---------- #
+
+def collect(spool_dir, job_ids, poll=10.0, stale=300, wait=True):
+    """
+    Copy finished results back into each job's destination folder (the same
+    RESULTS_DIR layout a local run produces) and drop the bundle.
+    Returns the list of job ids that failed.
+    """
+    init_spool(spool_dir)
+    remaining = list(dict.fromkeys(job_ids))
+    failed = []
+    while remaining:
+        reclaim_stale(spool_dir, stale)
+        still = []
+        for job_id in remaining:
+            state = find_job(spool_dir, job_id)
+            if state in ("done", "failed"):
+                bundle = job_path(spool_dir, state, job_id)
+                job = read_json(os.path.join(bundle, "job.json"))
+                result_dir = os.path.join(bundle, "result")
+                if state == "done":
+                    os.makedirs(job["dest"], exist_ok=True)
+                    for name in os.listdir(result_dir):
+                        if name not in NOT_COLLECTED:
+                            shutil.copy2(os.path.join(result_dir, name), os.path.join(job["dest"], name))
+                    shutil.rmtree(bundle, ignore_errors=True)
+                    print(f"[spool] collected {job_id} -> {job['dest']}", file=sys.stderr)
+                else:
+                    print(f"!!! codeml job failed: {job_id} (bundle kept at {bundle})", file=sys.stderr)
+                    failed.append(job_id)
+            elif state is None:
+                print(f"!!! unknown spool job {job_id}", file=sys.stderr)
+                failed.append(job_id)
+            else:
+                still.append(job_id)
+        remaining = still
+        if remaining:
+            if not wait:
+                break
+            print(f"[spool] waiting for {len(remaining)} job(s)...", file=sys.stderr)
+            time.sleep(poll)
+    return failed
+
+
+# ---------- CLI ---------- #
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Filesystem spool queue for codeml jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_submit = sub.add_parser("submit", help="Bundle prepared codeml job folder(s); prints job ids")
+    p_submit.add_argument("spool_dir")
+    p_submit.add_argument("out_dirs", nargs="+", help="Folders holding codeml.ctl, aln.phy and tree.tre")
+    p_submit.add_argument("--max-attempts", type=int, default=3, help="Claims before a job is failed (default: 3)")
+
+    p_worker = sub.add_parser("worker", help="Claim and run jobs until stopped")
+    p_worker.add_argument("spool_dir")
+    p_worker.add_argument("--codeml", default="codeml", help="codeml executable (default: codeml)")
+    p_worker.add_argument("--poll", type=float, default=5.0, help="Seconds between queue scans (default: 5)")
+    p_worker.add_argument("--heartbeat", type=float, default=30.0, help="Heartbeat interval in seconds (default: 30)")
+    p_worker.add_argument("--stale", type=float, default=300.0, help="Reclaim claims silent for this long (default: 300)")
+    p_worker.add_argument("--exit-when-empty", action="store_true", help="Exit once nothing is pending or running")
+    p_worker.add_argument("--max-jobs", type=int, default=None, help="Exit after this many jobs")
+    p_worker.add_argument("--scratch", default=None, help="Node-local folder for running codeml (default: $TMPDIR)")
+
+    p_collect = sub.add_parser("collect", help="Wait for jobs and copy results into their destinations")
+    p_collect.add_argument("spool_dir")
+    p_collect.add_argument("manifest", help="File with one job id per line (output of submit)")
+    p_collect.add_argument("--poll", type=float, default=10.0, help="Seconds between checks (default: 10)")
+    p_collect.add_argument("--stale", type=float, default=300.0, help="Reclaim claims silent for this long (default: 300)")
+    p_collect.add_argument("--no-wait", action="store_true", help="Collect what is finished and return")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "submit":
+        for out_dir in args.out_dirs:
+            print(submit(args.spool_dir, out_dir, args.max_attempts))
+    elif args.command == "worker":
+        worker(args.spool_dir, args.codeml, args.poll, args.heartbeat, args.stale,
+               args.exit_when_empty, args.max_jobs, args.scratch)
+    elif args.command == "collect":
+        with open(args.manifest) as f:
+            job_ids = [line.strip() for line in f if line.strip()]
+        failed = collect(args.spool_dir, job_ids, args.poll, args.stale, wait=not args.no_wait)
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -88,6 +88,24 @@ if (( VARS[PV_DIM] > 400 )); then
   VARS[PV_DIM]=400
 fi
 
+# === Default 3SEQ window prefilter ===
+## windows below these counts are not written, so 3SEQ never runs on them (see sliding_window.py); 0 = off
+VARS[RECOMB_MIN_INFORMATIVE]="${VARS[RECOMB_MIN_INFORMATIVE]:-0}"
+VARS[RECOMB_MIN_HAPLOTYPES]="${VARS[RECOMB_MIN_HAPLOTYPES]:-0}"
+VARS[RECOMB_MERGE_LOW_SIGNAL]="${VARS[RECOMB_MERGE_LOW_SIGNAL]:-true}"
+
+# === Validate RECOMB_MASK_SPAN ===
+## breakpoints: mask the recombinant segment between the 3SEQ breakpoints; window: the whole 3SEQ window
+VARS[RECOMB_MASK_SPAN]="${VARS[RECOMB_MASK_SPAN]:-breakpoints}"
+if [[ "${VARS[RECOMB_MASK_SPAN]}" != "breakpoints" && "${VARS[RECOMB_MASK_SPAN]}" != "window" ]]; then
+  echo "!!! RECOMB_MASK_SPAN '${VARS[RECOMB_MASK_SPAN]}' is invalid — resetting to 'breakpoints'"
+  VARS[RECOMB_MASK_SPAN]="breakpoints"
+fi
+
+# === Default DROP_MASKED_CODONS ===
+## true: fasta_to_phylip.py leaves out codon columns that are N/gap in every sequence (see <CDS>.codons.tsv)
+VARS[DROP_MASKED_CODONS]="${VARS[DROP_MASKED_CODONS]:-true}"
+
 # === Default MAX_TREE_LEAVES ===
 VARS[MAX_TREE_LEAVES]="${VARS[MAX_TREE_LEAVES]:-150}"
 
@@ -97,6 +115,78 @@ if [[ "${VARS[ANALYSIS]}" != "site-model" && "${VARS[ANALYSIS]}" != "branch-site
   VARS[ANALYSIS]="site-model"
 fi
 
+# === Default ORTHOLOG_CACHE_DIR ===
+## reciprocal BLAST tables keyed by both proteomes + EVALUE (see find_orthologs.sh); may be shared between outputs
+VARS[ORTHOLOG_CACHE_DIR]="${VARS[ORTHOLOG_CACHE_DIR]:-${VARS[PREFETCH_DIR]}/ortholog_pairs}"
+if [[ "${VARS[ORTHOLOG_CACHE_DIR]}" != /* ]]; then
+  VARS[ORTHOLOG_CACHE_DIR]="${CONFIG_DIR}/${VARS[ORTHOLOG_CACHE_DIR]}"
+fi
+
+# === Validate COMPRESSION ===
+## gzip/zstd: prefetch caches, per-CDS FASTAs and 3SEQ logs are stored compressed (.gz/.zst);
+## every stage reads plain and compressed files alike, so existing caches stay usable
+VARS[COMPRESSION]="${VARS[COMPRESSION]:-none}"
+if [[ "${VARS[COMPRESSION]}" != "none" && "${VARS[COMPRESSION]}" != "gzip" && "${VARS[COMPRESSION]}" != "zstd" ]]; then
+  echo "!!! COMPRESSION '${VARS[COMPRESSION]}' is invalid — resetting to 'none'"
+  VARS[COMPRESSION]="none"
+fi
+
+# === Default ALIGN_DEDUP ===
+## true: align_codons.py aligns one copy of each distinct protein and expands the rows back;
+## faster, but the MAFFT alignment can differ from one of all sequences, so it stays opt-in
+VARS[ALIGN_DEDUP]="${VARS[ALIGN_DEDUP]:-false}"
+
+# === Default PY_HELPER_SERVER ===
+## true: serve the Python helpers from one persistent, pre-imported process
+VARS[PY_HELPER_SERVER]="${VARS[PY_HELPER_SERVER]:-false}"
+
+# === Validate SITE_MODEL_MODE ===
+## separate: one codeml run per model (M1a, M2a)
+## combined: a single run per CDS with NSsites = 0 1 2 7 8, split into per-model mlc files
+VARS[SITE_MODEL_MODE]="${VARS[SITE_MODEL_MODE]:-separate}"
+if [[ "${VARS[SITE_MODEL_MODE]}" != "separate" && "${VARS[SITE_MODEL_MODE]}" != "combined" ]]; then
+  echo "!!! SITE_MODEL_MODE '${VARS[SITE_MODEL_MODE]}' is invalid — resetting to 'separate'"
+  VARS[SITE_MODEL_MODE]="separate"
+fi
+
+# === Validate CODEML_EXECUTOR ===
+## local: run codeml inside this process; spool: queue job bundles in SPOOL_DIR for workers
+VARS[CODEML_EXECUTOR]="${VARS[CODEML_EXECUTOR]:-local}"
+if [[ "${VARS[CODEML_EXECUTOR]}" != "local" && "${VARS[CODEML_EXECUTOR]}" != "spool" ]]; then
+  echo "!!! CODEML_EXECUTOR '${VARS[CODEML_EXECUTOR]}' is invalid — resetting to 'local'"
+  VARS[CODEML_EXECUTOR]="local"
+fi
+VARS[SPOOL_DIR]="${VARS[SPOOL_DIR]:-${VARS[CODEML_DIR]}/spool}"
+if [[ "${VARS[SPOOL_DIR]}" != /* ]]; then
+  VARS[SPOOL_DIR]="${CONFIG_DIR}/${VARS[SPOOL_DIR]}"
+fi
+VARS[SPOOL_LOCAL_WORKERS]="${VARS[SPOOL_LOCAL_WORKERS]:-2}"
+
+# === Default CODEML_MULTISTART ===
+## true: every local codeml job runs from each MULTISTART_OMEGA x MULTISTART_KAPPA start in parallel
+## (see scripts/codeml_scripts/multistart.py); starts trailing the best by MULTISTART_MARGIN lnL are stopped
+VARS[CODEML_MULTISTART]="${VARS[CODEML_MULTISTART]:-false}"
+VARS[MULTISTART_OMEGA]="${VARS[MULTISTART_OMEGA]:-0.2,1,3}"
+VARS[MULTISTART_KAPPA]="${VARS[MULTISTART_KAPPA]:-2}"
+VARS[MULTISTART_MARGIN]="${VARS[MULTISTART_MARGIN]:-5}"
+if [[ "${VARS[CODEML_MULTISTART]}" == "true" && "${VARS[CODEML_EXECUTOR]}" == "spool" ]]; then
+  echo "<-> CODEML_MULTISTART applies to local runs only; spooled jobs run a single start"
+fi
+if [[ "${VARS[CODEML_MULTISTART]}" == "true" && "${VARS[SITE_MODEL_MODE]:-separate}" == "combined" ]]; then
+  echo "<-> CODEML_MULTISTART: combined site-model runs hold several models and run a single start"
+fi
+
+# === Default CODEML_MONITOR ===
+## true: codeml_monitor.py writes JSON progress snapshots while codeml runs
+VARS[CODEML_MONITOR]="${VARS[CODEML_MONITOR]:-false}"
+
+# === Default RESULTS_DB ===
+## SQLite database every run's codeml results are loaded into (see scripts/codeml_scripts/results_db.py)
+VARS[RESULTS_DB]="${VARS[RESULTS_DB]:-${VARS[CODEML_DIR]}/results.sqlite}"
+if [[ "${VARS[RESULTS_DB]}" != /* ]]; then
+  VARS[RESULTS_DB]="${CONFIG_DIR}/${VARS[RESULTS_DB]}"
+fi
+
 # ---- Default variables ----
 VARS[RESULTS_DIR]="${VARS[PROCESSED_DIR]}/results_${VARS[REF_ACC]}_${VARS[GROUP]}"
 VARS[MASKING_OUTPUT_DIR]="${VARS[RESULTS_DIR]}/masked_alignments"
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+helper_cli.py
+
+Single entry point for the pipeline's Python helpers. Each subcommand runs one of
+the helper scripts exactly as ``python3 <script> args...`` would, but the script is
+only loaded when its subcommand is picked, so nothing heavy is imported up front.
+
+With ``serve`` the helpers are served by a persistent process that imports the
+heavy libraries (Bio, numpy, scipy, ete3) once and forks a child per request.
+Callers pass their stdin/stdout/stderr over the socket, so output, exit codes and
+the working directory behave like a normal run. When ``PY_HELPER_SOCKET`` is set
+(or ``--socket`` is given) requests go to the server; if it cannot be reached the
+helper simply runs in this process.
+
+Usage examples:
+  python3 helper_cli.py align-codons in.fasta out.fasta --dedup
+  python3 helper_cli.py chi2-sf 9.73 2
+  python3 helper_cli.py serve /tmp/codeml_helper.sock &
+  PY_HELPER_SOCKET=/tmp/codeml_helper.sock python3 helper_cli.py fasta-to-phylip in.fasta out.phy
+"""
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import traceback
+
+HELPERS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+## subcommand -> helper script (relative to scripts/)
+COMMANDS = {
+    "align-codons": "phylip_scripts/align_codons.py",
+    "fasta-to-phylip": "phylip_scripts/fasta_to_phylip.py",
+    "mask-alignment": "phylip_scripts/mask_alignment.py",
+    "mask-recomb-regions": "phylip_scripts/mask_recomb_regions.py",
+    "recomb-mask": "phylip_scripts/recomb_mask.py",
+    "sliding-window": "phylip_scripts/sliding_window.py",
+    "latest-diverged-group": "tree_scripts/find_latest_diverged_group.py",
+    "mark-foreground": "tree_scripts/mark_foreground.py",
+    "prune-leaves-by-name": "tree_scripts/prune_leaves_by_name.py",
+    "prune-random-leaves": "tree_scripts/prune_random_leaves.py",
+    "codeml-output": "codeml_scripts/codeml_output.py",
+    "results-db": "codeml_scripts/results_db.py",
+    "codeml-monitor": "codeml_scripts/codeml_monitor.py",
+    "reconcile-samples": "reconcile_samples.py",
+    "accession-file": "../generate_accessions/get_accession_file.py",
+}
+
+## imported once by ``serve`` so forked requests start warm
+DEFAULT_PRELOAD = [
+    "Bio.SeqIO", "Bio.Seq", "Bio.SeqRecord", "Bio.Align.substitution_matrices",
+    "numpy", "scipy.stats", "ete3", "pandas",
+]
+
+_HEADER = struct.Struct("!I")
+
+
+def cmd_chi2_sf(args):
+    if len(args) != 2:
+        sys.exit("Usage: helper_cli.py chi2-sf LRT DF")
+    sys.path.insert(0, os.path.join(HELPERS_DIR, "codeml_scripts"))
+    from codeml_output import chi2_sf
+    ## fixed notation: the pipeline compares p-values with bc, which cannot read 5e-06
+    print(f"{chi2_sf(float(args[0]), int(args[1])):.6f}")
+    return 0
+
+
+BUILTINS = {
+    "chi2-sf": cmd_chi2_sf,
+}
+
+
+def usage():
+    names = sorted(list(COMMANDS) + list(BUILTINS) + ["serve"])
+    return "Usage: helper_cli.py [--socket PATH] <command> [args...]\nCommands:\n  " + "\n  ".join(names)
+
+
+def run_command(argv):
+    """Run one subcommand in this process and return its exit code."""
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 1
+    name, args = argv[0], argv[1:]
+    try:
+        if name in BUILTINS:
+            return BUILTINS[name](args) or 0
+        if name not in COMMANDS:
+            print(f"Unknown command '{name}'\n{usage()}", file=sys.stderr)
+            return 1
+        import runpy
+        script = os.path.normpath(os.path.join(HELPERS_DIR, COMMANDS[name]))
+        saved_argv, saved_path = sys.argv, list(sys.path)
+        sys.argv = [script] + list(args)
+        sys.path.insert(0, os.path.dirname(script))  ## as if started with ``python3 script``
+        try:
+            runpy.run_path(script, run_name="__main__")
+        finally:
+            sys.argv, sys.path[:] = saved_argv, saved_path
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+
+
+# ---------- Persistent helper process ---------- #
+
+def _recv_exact(conn, n):
+    buf = b""
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("helper client went away")
+        buf += chunk
+    return buf
+
+
+def _handle_request(conn):
+    """Forked child: adopt the client's stdio, cwd and environment, run, report the exit code."""
+    header, fds, _, _ = socket.recv_fds(conn, _HEADER.size, 3)
+    (size,) = _HEADER.unpack(header)
+    request = json.loads(_recv_exact(conn, size))
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)  ## helpers wait on their own subprocesses
+    code = 1
+    try:
+        code = run_command(request["argv"])
+    except BaseException:
+        traceback.print_exc()  ## what an uncaught error would print in a normal run
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        conn.sendall(_HEADER.pack(code & 0xFF))
+        conn.close()
+
+
+def serve(socket_path, preload=None):
+    for module in DEFAULT_PRELOAD if preload is None else preload:
+        try:
+            __import__(module)
+        except Exception as e:
+            print(f"[helper] could not preload {module}: {e}", file=sys.stderr)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(16)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  ## reap finished children automatically
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"[helper] serving on {socket_path} (pid {os.getpid()})", file=sys.stderr)
+    try:
+        while True:
+            conn, _ = server.accept()
+            if os.fork() == 0:
+                server.close()
+                try:
+                    _handle_request(conn)
+                finally:
+                    os._exit(0)
+            conn.close()
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def run_remote(socket_path, argv):
+    """Send a request to the helper process. Returns the exit code, or None if unreachable."""
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(socket_path)
+    except OSError:
+        return None
+    body = json.dumps({"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}).encode()
+    with conn:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socket.send_fds(conn, [_HEADER.pack(len(body))], [0, 1, 2])
+        conn.sendall(body)
+        (code,) = _HEADER.unpack(_recv_exact(conn, _HEADER.size))
+    return code
+
+
+def main():
+    argv = sys.argv[1:]
+    socket_path = os.environ.get("PY_HELPER_SOCKET", "")
+    if argv[:1] == ["--socket"]:
+        if len(argv) < 2:
+            sys.exit(usage())
+        socket_path, argv = argv[1], argv[2:]
+
+    if argv[:1] == ["serve"]:
+        if len(argv) < 2:
+            sys.exit("Usage: helper_cli.py serve SOCKET [module ...]")
+        serve(argv[1], argv[2:] or None)
+        return
+
+    if socket_path:
+        code = run_remote(socket_path, argv)
+        if code is not None:
+            sys.exit(code)
+    sys.exit(run_command(argv))
+
+
+if __name__ == "__main__":
+    main()
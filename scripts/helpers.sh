@@ -0,0 +1,95 @@
+#!/usr/bin/env bash
+# Shared shell helpers. Source from pipeline scripts:
+#   source "$SCRIPT_DIR/../helpers.sh"
+
+HELPERS_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+## Run a Python helper through helper_cli.py, e.g. `pyhelper align-codons in.fasta out.fasta`.
+## Uses the persistent helper process when PY_HELPER_SOCKET points to a running one.
+pyhelper() {
+  python3 "$HELPERS_DIR/helper_cli.py" "$@"
+}
+
+## ---------- Compressed storage ----------
+## COMPRESSION (none | gzip | zstd) decides how prefetch caches and per-CDS FASTAs are stored:
+## <name>.fasta, <name>.fasta.gz or <name>.fasta.zst. Readers accept all three.
+
+## Suffix of stored files for the configured compression ("" for none).
+compress_suffix() {
+  case "${COMPRESSION:-none}" in
+    gzip) echo ".gz" ;;
+    zstd) echo ".zst" ;;
+    *)    echo "" ;;
+  esac
+}
+
+## stdin -> stdout, compressed as configured.
+compress_stream() {
+  case "${COMPRESSION:-none}" in
+    gzip) gzip -c ;;
+    zstd) zstd -q -c ;;
+    *)    cat ;;
+  esac
+}
+
+## Print files decompressed; the format is taken from the first bytes, not the name.
+read_any() {
+  local f magic
+  for f in "$@"; do
+    magic=$(od -An -tx1 -N4 "$f" | tr -d ' \n')
+    case "$magic" in
+      1f8b*)    gzip -cd "$f" ;;
+      28b52ffd) zstd -q -dc "$f" ;;
+      *)        cat "$f" ;;
+    esac
+  done
+}
+
+## Compress a finished file in place (FILE -> FILE.gz / FILE.zst) and print the new path.
+compress_file() {
+  local f="$1" out
+  out="${f}$(compress_suffix)"
+  if [[ "$out" != "$f" ]]; then
+    compress_stream < "$f" > "${out}.tmp" && mv "${out}.tmp" "$out" && rm -f "$f"
+  fi
+  echo "$out"
+}
+
+## Existing copy of BASE (configured form first, then plain, .gz, .zst); the configured name if none exists.
+stored_path() {
+  local base="$1" suffix
+  for suffix in "$(compress_suffix)" "" ".gz" ".zst"; do
+    if [[ -s "${base}${suffix}" ]]; then
+      echo "${base}${suffix}"
+      return
+    fi
+  done
+  echo "${base}$(compress_suffix)"
+}
+
+## File name without directory, .gz/.zst and .fasta: globals/X_Y.fasta.gz -> X_Y
+fasta_base() {
+  local name
+  name=$(basename "$1")
+  name="${name%.gz}"
+  name="${name%.zst}"
+  echo "${name%.fasta}"
+}
+
+## Cached efetch download into PREFETCH_DIR, e.g. `prefetch_fasta "$acc" fasta_cds_na "$PREFETCH_DIR/${acc}_cds_na.fasta"`.
+## Reuses a plain or compressed copy if there is one, else fetches and stores it as configured.
+## Prints the path of the cached file.
+prefetch_fasta() {
+  local acc="$1" format="$2" path
+  path=$(stored_path "$3")
+  if [[ ! -s "$path" ]]; then
+    efetch -db nucleotide -id "$acc" -format "$format" > "${path}.part"
+    if [[ -s "${path}.part" ]]; then
+      compress_stream < "${path}.part" > "${path}.tmp" && mv "${path}.tmp" "$path"
+    else
+      : > "$path"  ## nothing fetched: left empty, so the next run asks again
+    fi
+    rm -f "${path}.part"
+  fi
+  echo "$path"
+}
@@ -1,8 +1,10 @@
 from Bio import SeqIO, Seq
 from Bio.SeqRecord import SeqRecord
+import argparse
 import subprocess
 import os
-import sys
+
+from compressed_io import open_text
 
 
 def translate_sequences(nuc_records):
@@ -23,6 +25,34 @@ def translate_sequences(nuc_records):
         prot_records.append(prot_record)
     return prot_records
 
+def collapse_identical_proteins(prot_records):
+    """
+    Keep one representative per distinct protein sequence.
+    Returns the representatives (first occurrence, input order) and a dict
+    mapping every record id to the id of its representative.
+    """
+    rep_by_seq = {}
+    rep_of = {}
+    unique_records = []
+    for record in prot_records:
+        seq = str(record.seq)
+        if seq not in rep_by_seq:
+            rep_by_seq[seq] = record.id
+            unique_records.append(record)
+        rep_of[record.id] = rep_by_seq[seq]
+    return unique_records, rep_of
+
+def expand_alignment(aligned_unique_records, prot_records, rep_of):
+    """
+    Give every original record the aligned row of its representative, in the
+    original input order. Identical copies always get identical rows. The
+    alignment itself can differ from a MAFFT run on all sequences: copies weigh
+    in the guide tree and in the strategy --auto picks.
+    """
+    aligned_by_id = {record.id: record.seq for record in aligned_unique_records}
+    return [SeqRecord(aligned_by_id[rep_of[record.id]], id=record.id, description="")
+            for record in prot_records]
+
 def run_mafft(input_fasta, output_fasta):
     """
     Run MAFFT alignment on the input FASTA file and write the alignment to output_fasta.
@@ -54,30 +84,50 @@ def back_translate(aligned_prot_records, orig_nuc_dict):
                                                description="Codon alignment"))
     return aligned_nuc_records
 
-def main():
-    if len(sys.argv) != 3:
-        print("Usage: python3 fasta_to_phylip.py inputfasta output.fasta")
-        sys.exit(1)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Codon alignment: translate, align proteins with MAFFT, back-translate")
+    parser.add_argument("input_fasta", help="In-frame CDS nucleotide FASTA (plain, gzip or zstd)")
+    parser.add_argument("output_fasta", help="Codon-aligned FASTA output (.gz/.zst to compress)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Align only one copy of each distinct protein and expand the rows back afterwards "
+                             "(faster; MAFFT may align the distinct proteins differently than with all copies)")
+    return parser.parse_args()
 
-    input_fasta = sys.argv[1]
-    output_aligned_fasta = sys.argv[2]
+def main():
+    args = parse_args()
+    input_fasta = args.input_fasta
+    output_aligned_fasta = args.output_fasta
     
-    nuc_records = list(SeqIO.parse(input_fasta, "fasta"))
+    with open_text(input_fasta) as f:
+        nuc_records = list(SeqIO.parse(f, "fasta"))
     orig_nuc_dict = {record.id: record for record in nuc_records}
 
     prot_records = translate_sequences(nuc_records)
-    temp_prot_fasta = "temp_prot.fasta"
-    SeqIO.write(prot_records, temp_prot_fasta, "fasta")
+    to_align = prot_records
+    if args.dedup:
+        to_align, rep_of = collapse_identical_proteins(prot_records)
+        print(f"Aligning {len(to_align)} distinct protein(s) out of {len(prot_records)} sequences")
 
-    aligned_prot_fasta = "aligned_prot.fasta"
-    run_mafft(temp_prot_fasta, aligned_prot_fasta)
-    aligned_prot_records = list(SeqIO.parse(aligned_prot_fasta, "fasta"))
+    if len(to_align) == 1:
+        ## nothing to align (MAFFT needs at least two sequences)
+        aligned_prot_records = to_align
+    else:
+        temp_prot_fasta = "temp_prot.fasta"
+        SeqIO.write(to_align, temp_prot_fasta, "fasta")
 
-    aligned_nuc_records = back_translate(aligned_prot_records, orig_nuc_dict)
-    SeqIO.write(aligned_nuc_records, output_aligned_fasta, "fasta") ## final output
+        aligned_prot_fasta = "aligned_prot.fasta"
+        run_mafft(temp_prot_fasta, aligned_prot_fasta)
+        aligned_prot_records = list(SeqIO.parse(aligned_prot_fasta, "fasta"))
 
-    os.remove(temp_prot_fasta)
-    os.remove(aligned_prot_fasta)
+        os.remove(temp_prot_fasta)
+        os.remove(aligned_prot_fasta)
+
+    if args.dedup:
+        aligned_prot_records = expand_alignment(aligned_prot_records, prot_records, rep_of)
+
+    aligned_nuc_records = back_translate(aligned_prot_records, orig_nuc_dict)
+    with open_text(output_aligned_fasta, "w") as out:
+        SeqIO.write(aligned_nuc_records, out, "fasta") ## final output
 
 if __name__ == "__main__":
     main()
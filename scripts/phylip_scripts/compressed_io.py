@@ -0,0 +1,168 @@
+"""
+compressed_io.py
+
+gzip/zstd aware file handles for the FASTA stages, so prefetch caches and the
+per-CDS intermediates in processed/ can be stored compressed.
+
+Reading detects the format from the file's first bytes, so compressed and plain
+inputs are interchangeable whatever their name. The file is opened once and its
+first bytes are peeked at, so pipes and /dev/stdin work too. Writing compresses according to
+the output name: ``.gz`` -> gzip, ``.zst`` -> zstd, anything else stays plain.
+
+zstd uses the ``zstandard`` package when installed and the ``zstd`` command
+otherwise.
+
+Usage:
+  from compressed_io import open_text
+  with open_text("globals/QHD43416.1.fasta.zst") as f:
+      records = list(SeqIO.parse(f, "fasta"))
+"""
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import threading
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+## COMPRESSION config value -> suffix added to the stored file names
+SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+GZIP_LEVEL = 6  ## same as the gzip command's default
+ZSTD_LEVEL = 3  ## same as the zstd command's default
+
+
+def sniff_compression(stream):
+    """'gzip', 'zstd' or 'none' from the next bytes of a buffered binary stream, without consuming them."""
+    head = stream.peek(4)[:4]
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head == ZSTD_MAGIC:
+        return "zstd"
+    return "none"
+
+
+def detect_compression(path):
+    """'gzip', 'zstd' or 'none' from the first bytes of an existing file."""
+    with open(path, "rb") as f:
+        return sniff_compression(f)
+
+
+def compression_for_name(path):
+    """Compression implied by an output file name."""
+    for compression, suffix in SUFFIXES.items():
+        if suffix and path.endswith(suffix):
+            return compression
+    return "none"
+
+
+def stored_path(path, exists=os.path.isfile):
+    """
+    The stored copy of ``path`` - itself, ``.gz`` or ``.zst`` (see SUFFIXES) - for
+    which ``exists`` is true, or None. ``exists`` may be e.g. a lookup in a directory index.
+    """
+    for suffix in SUFFIXES.values():
+        if exists(path + suffix):
+            return path + suffix
+    return None
+
+
+class _OwningTextIO(io.TextIOWrapper):
+    """Text wrapper that also closes the underlying file (GzipFile leaves a passed-in file open)."""
+
+    def __init__(self, buffer, owned):
+        super().__init__(buffer)
+        self._owned = owned
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            self._owned.close()
+
+
+class _ZstdProcess(io.TextIOWrapper):
+    """
+    Text handle on a ``zstd`` child process; closing waits for it and checks its exit code.
+    Reading feeds the already opened (peeked) input to zstd from a thread.
+    """
+
+    def __init__(self, target, mode):
+        if mode == "r":
+            self._source = target
+            self._proc = subprocess.Popen(["zstd", "-q", "-d", "-c"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self._feeder = threading.Thread(target=self._feed, daemon=True)
+            self._feeder.start()
+            super().__init__(self._proc.stdout)
+        else:
+            self._source = None
+            self._proc = subprocess.Popen(["zstd", "-q", "-f", f"-{ZSTD_LEVEL}", "-o", target],
+                                          stdin=subprocess.PIPE)
+            super().__init__(self._proc.stdin)
+
+    def _feed(self):
+        try:
+            shutil.copyfileobj(self._source, self._proc.stdin)
+        except (BrokenPipeError, ValueError):
+            pass  ## reader closed early
+        finally:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        if self._source is not None:
+            self._proc.kill()  ## no-op when zstd already exited; stops it if the reader closed early
+            self._feeder.join()
+            self._source.close()
+            self._proc.wait()
+            return
+        if self._proc.wait() != 0:
+            raise OSError(f"zstd exited with status {self._proc.returncode}")
+
+
+def _open_zstd(target, mode, name):
+    """``target`` is a path for writing, a peeked binary stream for reading."""
+    try:
+        import zstandard
+    except ImportError:
+        if not shutil.which("zstd"):
+            raise RuntimeError(f"{name}: zstd compression needs the 'zstandard' package or the 'zstd' command")
+        return _ZstdProcess(target, mode)
+    return zstandard.open(target, mode + "t", cctx=zstandard.ZstdCompressor(level=ZSTD_LEVEL))
+
+
+def open_text(path, mode="r"):
+    """
+    Open ``path`` as text. ``"r"`` decompresses gzip/zstd transparently, ``"w"``
+    compresses according to the name (see ``compression_for_name``).
+    """
+    if mode not in ("r", "w"):
+        raise ValueError(f"mode must be 'r' or 'w', not {mode!r}")
+    if mode == "w":
+        compression = compression_for_name(path)
+        if compression == "gzip":
+            return gzip.open(path, "wt", compresslevel=GZIP_LEVEL)
+        if compression == "zstd":
+            return _open_zstd(path, "w", path)
+        return open(path, "w")
+
+    stream = open(path, "rb")  ## opened once: a pipe cannot be sniffed and reopened
+    try:
+        compression = sniff_compression(stream)
+        if compression == "gzip":
+            return _OwningTextIO(gzip.GzipFile(fileobj=stream, mode="rb"), stream)
+        if compression == "zstd":
+            return _open_zstd(stream, "r", path)
+        return io.TextIOWrapper(stream)
+    except BaseException:
+        stream.close()
+        raise
@@ -1,16 +1,23 @@
 #!/usr/bin/env python3
+import argparse
+import os
 import sys
 
+from compressed_io import open_text
+
+## a codon column is dropped only if no sequence has a single base in it (codeml reads such a column as all missing)
+MISSING_CHARS = set("Nn-?")
+
 def parse_fasta(filename):
     """
-    Parses a FASTA file and returns a dictionary with sequence identifiers as keys 
-    and sequences as values.
+    Parses a FASTA file (plain, gzip or zstd) and returns a dictionary with sequence
+    identifiers as keys and sequences as values.
     """
     sequences = {}
     current_header = None
     current_seq = []
     
-    with open(filename, "r") as f:
+    with open_text(filename) as f:
         for line in f:
             line = line.strip()
             if not line:
@@ -29,15 +36,48 @@ def parse_fasta(filename):
             sequences[current_header] = "".join(current_seq)
     return sequences
 
+def masked_codon_columns(sequences, length):
+    """0-based codon indexes where every sequence is masked or gapped (NNN, ---, N-N, ...)."""
+    masked = []
+    for codon in range(length // 3):
+        start = codon * 3
+        if all(set(seq[start:start + 3]) <= MISSING_CHARS for seq in sequences.values()):
+            masked.append(codon)
+    return masked
+
+def write_codon_map(path, kept_codons, ref_seq=None):
+    """
+    Sidecar of the .phy: codeml site (1-based codon in the .phy) -> codon in the
+    alignment FASTA and codon in the reference CDS (empty where the reference has a gap).
+    """
+    ref_codons = {}
+    if ref_seq is not None:
+        n = 0
+        for codon in range(len(ref_seq) // 3):
+            if set(ref_seq[codon * 3:codon * 3 + 3]) != {"-"}:
+                n += 1
+                ref_codons[codon] = n
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as out:
+        out.write("site\talignment_codon\tref_codon\n")
+        for site, codon in enumerate(kept_codons, start=1):
+            out.write(f"{site}\t{codon + 1}\t{ref_codons.get(codon, '')}\n")
+    os.replace(tmp_path, path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert an aligned FASTA to PHYLIP for codeml")
+    parser.add_argument("input_fasta", help="Aligned FASTA (plain, .gz or .zst)")
+    parser.add_argument("output_phylip", help="PHYLIP output path")
+    parser.add_argument("--drop-masked-codons", action="store_true",
+                        help="Leave out codon columns that are N or gap in every sequence")
+    parser.add_argument("--codon-map", help="Write the site -> alignment/reference codon map to this TSV")
+    parser.add_argument("--ref", help="Reference sequence id, for the reference CDS column of the codon map")
+    return parser.parse_args()
+
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python3 fasta_to_phylip.py inputfasta output.phy")
-        sys.exit(1)
-    
-    input_fasta = sys.argv[1]
-    output_phylip = sys.argv[2]
-    
-    sequences = parse_fasta(input_fasta)
+    args = parse_args()
+
+    sequences = parse_fasta(args.input_fasta)
     
     if not sequences:
         print("Error: No sequences found in the FASTA file.")
@@ -51,8 +91,31 @@ def main():
     
     seq_length = lengths.pop()
     num_sequences = len(sequences)
+
+    if (args.drop_masked_codons or args.codon_map) and seq_length % 3:
+        print(f"Error: Alignment length {seq_length} is not a multiple of 3; codon columns cannot be mapped.")
+        sys.exit(1)
+
+    ref_seq = sequences.get(args.ref) if args.ref else None
+    if args.ref and ref_seq is None:
+        print(f"Warning: reference {args.ref} not in {args.input_fasta}; codon map has no reference column")
+
+    n_codons = seq_length // 3
+    dropped = set(masked_codon_columns(sequences, seq_length)) if args.drop_masked_codons else set()
+    kept_codons = [codon for codon in range(n_codons) if codon not in dropped]
+    if dropped:
+        if not kept_codons:
+            print("Error: Every codon column is masked; nothing left for codeml.")
+            sys.exit(1)
+        sequences = {header: "".join(seq[c * 3:c * 3 + 3] for c in kept_codons) for header, seq in sequences.items()}
+        seq_length = len(kept_codons) * 3
+        print(f"Dropped {len(dropped)} of {n_codons} codon columns masked in every sequence")
+
+    if args.codon_map:
+        write_codon_map(args.codon_map, kept_codons, ref_seq)
+        print(f"Codon map saved to: {args.codon_map}")
     
-    with open(output_phylip, "w") as out:
+    with open(args.output_phylip, "w") as out:
         # Write the header: number of sequences and sequence length
         out.write(f"{num_sequences} {seq_length}\n")
         for header, seq in sequences.items():
@@ -1,6 +1,9 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+source "$SCRIPT_DIR/../helpers.sh"
+
 
 # process_target.sh
 # f=find_orthologs.sh && sed -i 's/\r$//' "$f" && chmod +x "$f" && ./"$f" AB740222.1 "" AB740220.1
@@ -39,6 +42,11 @@ MAX_JOBS=4     # adjust to your cores
 EVALUE=1e-3
 PIDENT=30
 
+## raw reciprocal BLAST tables per (ref proteome, target proteome, EVALUE); PIDENT is applied
+## after reading them, so a new threshold never needs a new search
+ORTHOLOG_CACHE_DIR="${ORTHOLOG_CACHE_DIR:-$PREFETCH_DIR/ortholog_pairs}"
+mkdir -p "$ORTHOLOG_CACHE_DIR"
+
 ### 1) PREPARE REFERENCE & GLOBAL FASTAs ###
 
 if [[ -n "$ref_cds_id" ]]; then
@@ -49,11 +57,8 @@ fi
 
 # 1) Retrieve the raw AA FASTA so we can grab the real header
 raw_aa="${refdir}/ref_proteins_raw.fasta"
-prefetch_aa="$PREFETCH_DIR/${ref_acc}_cds_aa.fasta"
-if [[ ! -s "$prefetch_aa" ]]; then
-  efetch -db nucleotide -id "$ref_acc" -format fasta_cds_aa > "$prefetch_aa"
-fi
-cp "$prefetch_aa" "$raw_aa"
+prefetch_aa=$(prefetch_fasta "$ref_acc" fasta_cds_aa "$PREFETCH_DIR/${ref_acc}_cds_aa.fasta")
+read_any "$prefetch_aa" > "$raw_aa"
 
 headers_list="${refdir}/headers_list.txt"  # or whatever file you want
 
@@ -74,6 +79,8 @@ sed -E 's/^>.*\[protein_id=([^]]+)\].*/>'"$ref_acc"'|\1/' \
 "$raw_aa" \
 > "${refdir}/ref_proteins.fasta"
 rm -f "$raw_aa"
+## the whole reference proteome is searched and cached, so the hits serve any REF_CDS_ID
+cp "${refdir}/ref_proteins.fasta" "${refdir}/ref_proteome.fasta"
 
 if [[ -n "$ref_cds_id" ]]; then
 	# 4) Extract just the one block (with our new simple header) 
@@ -87,11 +94,8 @@ fi
 
 # repeat *exactly* the same pattern for the nucleotide CDS:
 raw_na="${refdir}/ref_cds_raw.fasta"
-prefetch_na="$PREFETCH_DIR/${ref_acc}_cds_na.fasta"
-if [[ ! -s "$prefetch_na" ]]; then
-  efetch -db nucleotide -id "$ref_acc" -format fasta_cds_na > "$prefetch_na"
-fi
-cp "$prefetch_na" "$raw_na"
+prefetch_na=$(prefetch_fasta "$ref_acc" fasta_cds_na "$PREFETCH_DIR/${ref_acc}_cds_na.fasta")
+read_any "$prefetch_na" > "$raw_na"
 
 # (we already have ORIGINAL_HEADER, so no need to recalc)
 sed -E 's/^>.*\[protein_id=([^]]+)\].*/>'"$ref_acc"'|\1/' \
@@ -108,18 +112,15 @@ if [[ -n "$ref_cds_id" ]]; then
 	mv "${refdir}/ref_cds.tmp" "${refdir}/ref_cds.fasta"
 fi
 
-echo "find_orthologs.sh | [REF] building reference BLAST DB…"
-makeblastdb -in "${refdir}/ref_proteins.fasta" -dbtype prot \
-            -out "${refdir}/ref_prot_db"
-
 echo "find_orthologs.sh | [REF] preparing global FASTAs for each ref CDS…"
 # iterate over each header in ref_cds.fasta:
 grep '^>' "${refdir}/ref_cds.fasta" | sed 's/^>//' \
 | while IFS= read -r qid; do
   # sanitize filename
   file="${refdir}/globals/${qid//|/_}.fasta"
-  # empty or overwrite
+  # empty or overwrite (and drop copies stored with another COMPRESSION)
   : > "$file"
+  rm -f "${file}.gz" "${file}.zst"
   # append the reference sequence block
   # sed -e '$a\' "${refdir}/ref_cds.fasta" | \
   # awk -v id=">${qid}" '
@@ -156,22 +157,36 @@ for tgt in "${targets[@]}"; do
     prot_out="${refdir}/reciprocal_pairs/${tgt}/${tgt}_proteins.fasta"
     cds_out="${refdir}/reciprocal_pairs/${tgt}/${tgt}_cds.fasta"
 
-    prot_cache="$PREFETCH_DIR/${tgt}_cds_aa.fasta"
-    cds_cache="$PREFETCH_DIR/${tgt}_cds_na.fasta"
+    prot_cache=$(prefetch_fasta "$tgt" fasta_cds_aa "$PREFETCH_DIR/${tgt}_cds_aa.fasta")
+    cds_cache=$(prefetch_fasta "$tgt" fasta_cds_na "$PREFETCH_DIR/${tgt}_cds_na.fasta")
 
-    [[ -s "$prot_cache" ]] || efetch -db nucleotide -id "$tgt" -format fasta_cds_aa > "$prot_cache"
-    [[ -s "$cds_cache" ]] || efetch -db nucleotide -id "$tgt" -format fasta_cds_na > "$cds_cache"
-
-    sed -E 's/^>.*\[protein_id=([^]]+)\].*/>'"$tgt"'|\1/' "$prot_cache" > "$prot_out"
-    sed -E 's/^>.*\[protein_id=([^]]+)\].*/>'"$tgt"'|\1/' "$cds_cache" > "$cds_out"
+    read_any "$prot_cache" | sed -E 's/^>.*\[protein_id=([^]]+)\].*/>'"$tgt"'|\1/' > "$prot_out"
+    read_any "$cds_cache" | sed -E 's/^>.*\[protein_id=([^]]+)\].*/>'"$tgt"'|\1/' > "$cds_out"
   ) &
   while (( $(jobs -rp|wc -l) >= 1 )); do sleep 1; done
 done
 wait
 
+## cache key: both full proteomes + EVALUE; hits are cut down to REF_CDS_ID after reading them
+ref_hash=$(sha1sum < "${refdir}/ref_proteome.fasta" | cut -c1-40)
+declare -A pair_cache
+uncached=()
+for tgt in "${targets[@]}"; do
+  tgt_hash=$(sha1sum < "${refdir}/reciprocal_pairs/${tgt}/${tgt}_proteins.fasta" | cut -c1-40)
+  pair_cache[$tgt]="${ORTHOLOG_CACHE_DIR}/$(echo "$ref_hash $tgt_hash $EVALUE" | sha1sum | cut -c1-40)"
+  [[ -f "${pair_cache[$tgt]}/pair.txt" ]] || uncached+=("$tgt")
+done
+echo "find_orthologs.sh | [ALL] $(( ${#targets[@]} - ${#uncached[@]} )) of ${#targets[@]} target(s) found in the pair cache"
+
+if (( ${#uncached[@]} > 0 )); then
+  echo "find_orthologs.sh | [REF] building reference BLAST DB…"
+  makeblastdb -in "${refdir}/ref_proteome.fasta" -dbtype prot \
+              -out "${refdir}/ref_prot_db"
+fi
+
 ### 3) BUILD BLAST DBs FOR ALL TARGETS IN PARALLEL ###
 echo "find_orthologs.sh | [ALL] Stage 3: building target BLAST DBs…"
-for tgt in "${targets[@]}"; do
+for tgt in "${uncached[@]}"; do
   (
     makeblastdb -in "${refdir}/reciprocal_pairs/${tgt}/${tgt}_proteins.fasta" \
                 -dbtype prot \
@@ -186,21 +201,44 @@ echo "find_orthologs.sh | [ALL] Stage 4: reciprocal‐BLAST + append to globals
 for tgt in "${targets[@]}"; do
   (
     work="${refdir}/reciprocal_pairs"
-
-    # --- Reciprocal BLASTp (as before) ---
-    blastp -num_threads 1 \
-      -query "${work}/${tgt}/${tgt}_proteins.fasta" \
-      -db "${refdir}/ref_prot_db" \
-      -evalue "$EVALUE" \
-      -outfmt "6 qseqid sseqid pident evalue bitscore" \
-      > "${work}/${tgt}/ref_vs_${tgt}.blast"
-
-    blastp -num_threads 1 \
-      -query "${refdir}/ref_proteins.fasta" \
-      -db "${work}/${tgt}/${tgt}_prot_db" \
-      -evalue "$EVALUE" \
-      -outfmt "6 qseqid sseqid pident evalue bitscore" \
-      > "${work}/${tgt}/${tgt}_vs_ref.blast"
+    cache="${pair_cache[$tgt]}"
+
+    if [[ -f "${cache}/pair.txt" ]]; then
+      echo "find_orthologs.sh | [${tgt}] reusing cached BLAST hits"
+      cp "${cache}/tgt_vs_ref.blast" "${work}/${tgt}/ref_vs_${tgt}.blast"
+      cp "${cache}/ref_vs_tgt.blast" "${work}/${tgt}/${tgt}_vs_ref.blast"
+    else
+      # --- Reciprocal BLASTp (as before) ---
+      blastp -num_threads 1 \
+        -query "${work}/${tgt}/${tgt}_proteins.fasta" \
+        -db "${refdir}/ref_prot_db" \
+        -evalue "$EVALUE" \
+        -outfmt "6 qseqid sseqid pident evalue bitscore" \
+        > "${work}/${tgt}/ref_vs_${tgt}.blast"
+
+      blastp -num_threads 1 \
+        -query "${refdir}/ref_proteome.fasta" \
+        -db "${work}/${tgt}/${tgt}_prot_db" \
+        -evalue "$EVALUE" \
+        -outfmt "6 qseqid sseqid pident evalue bitscore" \
+        > "${work}/${tgt}/${tgt}_vs_ref.blast"
+
+      ## publish with one rename so concurrent runs never read a half written entry
+      staging=$(mktemp -d "${ORTHOLOG_CACHE_DIR}/.tmp.XXXXXX")
+      cp "${work}/${tgt}/ref_vs_${tgt}.blast" "${staging}/tgt_vs_ref.blast"
+      cp "${work}/${tgt}/${tgt}_vs_ref.blast" "${staging}/ref_vs_tgt.blast"
+      printf "ref\t%s\ntarget\t%s\nevalue\t%s\n" "$ref_acc" "$tgt" "$EVALUE" > "${staging}/pair.txt"
+      mv -T "$staging" "$cache" 2>/dev/null || rm -rf "$staging"
+    fi
+
+    ## only the chosen reference protein takes part in the reciprocal best hits
+    if [[ -n "$ref_cds_id" ]]; then
+      ref_id="${ref_acc}|${ref_cds_id}"
+      awk -v id="$ref_id" '$2 == id' "${work}/${tgt}/ref_vs_${tgt}.blast" > "${work}/${tgt}/ref_vs_${tgt}.blast.tmp"
+      awk -v id="$ref_id" '$1 == id' "${work}/${tgt}/${tgt}_vs_ref.blast" > "${work}/${tgt}/${tgt}_vs_ref.blast.tmp"
+      mv "${work}/${tgt}/ref_vs_${tgt}.blast.tmp" "${work}/${tgt}/ref_vs_${tgt}.blast"
+      mv "${work}/${tgt}/${tgt}_vs_ref.blast.tmp" "${work}/${tgt}/${tgt}_vs_ref.blast"
+    fi
 
     # --- pick best and find true 1:1 reciprocals ---
     sort -k1,1 -k4,4g -k5,5nr "${work}/${tgt}/ref_vs_${tgt}.blast" \
@@ -214,10 +252,13 @@ for tgt in "${targets[@]}"; do
     ' "${work}/${tgt}/best2.tsv" "${work}/${tgt}/best1.tsv" \
       > "${work}/${tgt}_reciprocal_pairs.tsv"
 
-    # --- append each target CDS to the correct global FASTA ---
-
+    # --- stage each target CDS for the correct global FASTA ---
+    ## parallel jobs must not append to the same global file at once; the staged
+    ## records are appended one target at a time below
+    staged="${work}/${tgt}_globals"
+    mkdir -p "$staged"
     while IFS=$'\t' read -r tgt_id ref_id; do
-      global="${refdir}/globals/${ref_id//|/_}.fasta"
+      global="${staged}/${ref_id//|/_}.fasta"
 		{
 		  awk -v id="$tgt_id" '
 			BEGIN {
@@ -268,4 +309,18 @@ for tgt in "${targets[@]}"; do
 done
 wait
 
-rm -f "${refdir}/ref_prot_db".*
+for tgt in "${targets[@]}"; do
+  staged="${refdir}/reciprocal_pairs/${tgt}_globals"
+  [[ -d "$staged" ]] || continue
+  for piece in "$staged"/*.fasta; do
+    [[ -f "$piece" ]] && cat "$piece" >> "${refdir}/globals/$(basename "$piece")"
+  done
+  rm -rf "$staged"
+done
+
+## globals are complete: store them as configured (no-op for COMPRESSION=none)
+for global in "${refdir}/globals/"*.fasta; do
+  [[ -f "$global" ]] && compress_file "$global" > /dev/null
+done
+
+rm -f "${refdir}/ref_prot_db".* "${refdir}/ref_proteome.fasta"
@@ -5,6 +5,9 @@
 # Dependencies: Entrez Direct (edirect: efetch, xtract), awk, grep
 set -euo pipefail
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+source "$SCRIPT_DIR/../helpers.sh"
+
 ACCESSIONS_FILE="$1"
 ACCESSION_COL_INDEX="$2"
 PREFETCH_DIR="$3"
@@ -21,22 +24,15 @@ best_acc=""
 while IFS=$'\t' read -ra FIELDS; do
     acc="${FIELDS[$ACCESSION_COL_INDEX]}"
 
-    cds_file="$PREFETCH_DIR/${acc}_cds_na.fasta"
-    genome_file="$PREFETCH_DIR/${acc}.fasta"
-
-    # Retrieve sequences if not already cached
-    if [[ ! -s "$cds_file" ]]; then
-        efetch -db nucleotide -id "$acc" -format fasta_cds_na > "$cds_file"
-    fi
-    if [[ ! -s "$genome_file" ]]; then
-        efetch -db nucleotide -id "$acc" -format fasta > "$genome_file"
-    fi
+    # Retrieve sequences if not already cached (plain or compressed)
+    cds_file=$(prefetch_fasta "$acc" fasta_cds_na "$PREFETCH_DIR/${acc}_cds_na.fasta")
+    genome_file=$(prefetch_fasta "$acc" fasta "$PREFETCH_DIR/${acc}.fasta")
 
     # 1) count CDS entries from cached file
-    cds_count=$(grep -c '^>' "$cds_file")
+    cds_count=$(read_any "$cds_file" | grep -c '^>')
 
     # 2) compute total genome length
-    seq_len=$(awk '/^>/ {next} {total+=length($0)} END {print total}' "$genome_file")
+    seq_len=$(read_any "$genome_file" | awk '/^>/ {next} {total+=length($0)} END {print total}')
 
     # 3) compare/update best
     if (( cds_count > max_cds )) || { (( cds_count == max_cds )) && (( seq_len > best_len )); }; then
@@ -29,12 +29,20 @@ import argparse
 from collections import Counter
 from Bio import SeqIO
 from Bio.Seq import Seq
-from Bio.Align import substitution_matrices
-blosum62 = substitution_matrices.load("BLOSUM62")
 
-# Precompute BLOSUM62 score range
-_BLOSUM_SCORES = list(blosum62.values())
-MIN_BLOSUM, MAX_BLOSUM = min(_BLOSUM_SCORES), max(_BLOSUM_SCORES)
+from compressed_io import open_text
+
+_BLOSUM62 = None
+
+def load_blosum62():
+    """Load BLOSUM62 and its score range on first use (only the BLOSUM metric needs it)."""
+    global _BLOSUM62
+    if _BLOSUM62 is None:
+        from Bio.Align import substitution_matrices
+        matrix = substitution_matrices.load("BLOSUM62")
+        scores = list(matrix.values())
+        _BLOSUM62 = (matrix, min(scores), max(scores))
+    return _BLOSUM62
 
 
 def parse_args():
@@ -67,7 +75,7 @@ def parse_args():
     )
     parser.add_argument(
         "--o", default=None,
-        help="Output FASTA where poorly aligned codons are masked as 'NNN'"
+        help="Output FASTA where poorly aligned codons are masked as 'NNN' (.gz/.zst to compress)"
     )
     parser.add_argument(
         "--gff-out", default=None,
@@ -77,7 +85,8 @@ def parse_args():
 
 
 def load_alignment(path):
-    records = list(SeqIO.parse(path, "fasta"))
+    with open_text(path) as f:
+        records = list(SeqIO.parse(f, "fasta"))
     if not records:
         raise ValueError("No sequences found in input file.")
     length = len(records[0].seq)
@@ -146,6 +155,7 @@ def compute_aa_identity(records, length):
     return identities
 
 def compute_blosum62_identity(records, length):
+    blosum62, MIN_BLOSUM, MAX_BLOSUM = load_blosum62()
     n = len(records)
     identities = []
     for start in range(0, length, 3):
@@ -257,7 +267,8 @@ def main():
         print(f"GFF3 annotations written to {args.gff_out}")
     if args.o:
         masked = mask_alignment(recs, regions)
-        SeqIO.write(masked, args.o, 'fasta')
+        with open_text(args.o, 'w') as out:
+            SeqIO.write(masked, out, 'fasta')
         print(f"Masked FASTA written to {args.o}")
 
 if __name__ == '__main__':
@@ -2,52 +2,80 @@
 
 import argparse
 from Bio import SeqIO
+from Bio.Seq import Seq
 import sys
 
+from compressed_io import open_text
+from recomb_mask import IntervalIndex, read_mask
+
 def parse_mask_file(mask_file):
-    """Parse tab-delimited recombination regions: header \t start \t end."""
-    mask_regions = {}
-    with open(mask_file) as f:
-        for line in f:
-            parts = line.strip().split('\t')
-            if len(parts) != 3:
-                continue
-            seq_id, start, end = parts
-            start, end = int(start), int(end)
-            if seq_id not in mask_regions:
-                mask_regions[seq_id] = []
-            mask_regions[seq_id].append((start, end))
-    return mask_regions
+    """Parse tab-delimited recombination regions (header \t start \t end) into merged intervals per sequence."""
+    return read_mask(mask_file)
 
 def apply_mask(seq, regions, mask_char='N'):
-    """Mask 1-based inclusive regions in sequence string."""
-    seq = list(seq)
+    """Mask 1-based inclusive regions in sequence string, one slice fill per merged region."""
+    if not isinstance(regions, IntervalIndex):
+        regions = IntervalIndex(regions)
+    pieces = []
+    pos = 0  ## 0-based end of the part already copied
     for start, end in regions:
-        for i in range(start - 1, end):
-            if 0 <= i < len(seq):
-                seq[i] = mask_char
-    return ''.join(seq)
+        start, end = max(start - 1, pos), min(end, len(seq))
+        if start >= end:
+            continue
+        pieces.append(seq[pos:start])
+        pieces.append(mask_char * (end - start))
+        pos = end
+    pieces.append(seq[pos:])
+    return ''.join(pieces)
+
+def write_coverage_report(rows, path):
+    """Per-sequence merged mask coverage: regions, masked columns and the masked share of the sequence's residues."""
+    with open(path, "w") as out:
+        out.write("seq_id\tregions\tmasked_columns\talignment_length\tmasked_residues\tresidues\tmasked_fraction\n")
+        for row in rows:
+            out.write("\t".join(str(v) for v in row) + "\n")
 
 def main():
     parser = argparse.ArgumentParser(description="Mask recombination regions in FASTA")
     parser.add_argument("fasta", help="Input FASTA alignment file")
     parser.add_argument("mask_file", help="TSV file with: header TAB start TAB end")
-    parser.add_argument("output", help="Masked FASTA output path")
+    parser.add_argument("output", help="Masked FASTA output path (.gz/.zst to compress)")
     parser.add_argument("--mask-char", default='N', help="Character to use for masking (default: N)")
+    parser.add_argument("--report", help="Write the merged mask coverage of every sequence to this TSV")
+    parser.add_argument("--warn-fraction", type=float, default=0.25,
+                        help="Flag sequences with more than this share of their residues masked (default: 0.25)")
 
     args = parser.parse_args()
 
     mask_regions = parse_mask_file(args.mask_file)
     masked_records = []
+    coverage = []
+
+    with open_text(args.fasta) as f:
+        for record in SeqIO.parse(f, "fasta"):
+            regions = mask_regions.get(record.id, IntervalIndex())
+            seq = str(record.seq)
+            if regions:
+                print(f"Masking {len(regions)} region(s) in {record.id}")
+                masked_seq = apply_mask(seq, regions, args.mask_char)
+                record.seq = Seq(masked_seq)
+            else:
+                masked_seq = seq
+            residues = sum(seq.count(c) for c in "ACGTacgt")
+            masked_residues = residues - sum(masked_seq.count(c) for c in "ACGTacgt")
+            fraction = masked_residues / residues if residues else 0.0
+            coverage.append((record.id, len(regions), regions.covered(len(seq)), len(seq),
+                             masked_residues, residues, f"{fraction:.4f}"))
+            if fraction > args.warn_fraction:
+                print(f"!!! {record.id}: {fraction:.0%} of its residues are in recombinant regions")
+            masked_records.append(record)
 
-    for record in SeqIO.parse(args.fasta, "fasta"):
-        regions = mask_regions.get(record.id, [])
-        if regions:
-            print(f"Masking {len(regions)} region(s) in {record.id}")
-            record.seq = apply_mask(str(record.seq), regions, args.mask_char)
-        masked_records.append(record)
+    if args.report:
+        write_coverage_report(coverage, args.report)
+        print(f"Mask coverage report saved to: {args.report}")
 
-    SeqIO.write(masked_records, args.output, "fasta")
+    with open_text(args.output, "w") as out:
+        SeqIO.write(masked_records, out, "fasta")
     print(f"Masked alignment saved to: {args.output}")
 
 if __name__ == "__main__":
@@ -12,14 +12,7 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
 GLOBALS="$1"
 source "$GLOBALS"
-
-for f in \
-  "$SCRIPT_DIR/find_top_virus.sh" \
-  "$SCRIPT_DIR/find_orthologs.sh"
-do
-  sed -i 's/\r$//' "$f"
-  chmod +x "$f"
-done
+source "$SCRIPT_DIR/../helpers.sh"
 
 
 print_box() {
@@ -108,14 +101,23 @@ for tgt in "${TARGETS[@]}"; do
   fi
 done
 TARGETS=("${filtered_targets[@]}")
-${SCRIPT_DIR}/find_orthologs.sh "$REF_ACC" "$REF_CDS_ID" "$ORTHOLOGS_RESULTS_DIR" "$PREFETCH_DIR" "${TARGETS[@]}"
+ORTHOLOG_CACHE_DIR="$ORTHOLOG_CACHE_DIR" COMPRESSION="$COMPRESSION" ${SCRIPT_DIR}/find_orthologs.sh "$REF_ACC" "$REF_CDS_ID" "$ORTHOLOGS_RESULTS_DIR" "$PREFETCH_DIR" "${TARGETS[@]}"
 
 echo "[Stage 3] Processing each ref CDS..."
 
-for global in "${ORTHOLOGS_RESULTS_DIR}/globals/"*.fasta; do
-  awk '/^>/ {sub(/\|.*/, "", $0)} {print}' "$global" > tmp && mv tmp "$global"
+## per-CDS FASTAs are stored as <name>.fasta$SUFFIX (COMPRESSION); the Python helpers read either form
+SUFFIX="$(compress_suffix)"
+for global in "${ORTHOLOGS_RESULTS_DIR}/globals/"*.fasta{,.gz,.zst}; do
+  [[ -f "$global" ]] || continue
+  ## rewrite under the name matching COMPRESSION, so the suffix always tells the stored form
+  base="$(fasta_base "$global")"
+  stored="$(dirname "$global")/${base}.fasta${SUFFIX}"
+  tmp_global=$(mktemp -p "$(dirname "$global")")
+  chmod --reference="$global" "$tmp_global"  ## mktemp creates it 0600
+  read_any "$global" | awk '/^>/ {sub(/\|.*/, "", $0)} {print}' | compress_stream > "$tmp_global" && mv "$tmp_global" "$stored"
+  [[ "$global" != "$stored" ]] && rm -f "$global"
+  global="$stored"
 
-  base="$(basename "$global" .fasta)"
   workg="${ORTHOLOGS_RESULTS_DIR}/globals/${base}"
   mkdir -p "$workg"
   IFS="_" read -r param1 CDS <<< "$base"
@@ -123,40 +125,45 @@ for global in "${ORTHOLOGS_RESULTS_DIR}/globals/"*.fasta; do
 
   echo -e "\n\n--------------[3.1] Codon alignment\n\n"
   if [ "$ALIGN_CODONS_WITH" = "prank" ]; then
-    time prank -d="$global" -o="${workg}/aligned_temp" -t="$FINAL_TREE_FILE_TEMPLATE" -once -f=fasta +F -codon
-    mv "${workg}/aligned_temp.best.fas" "${workg}/aligned_codons.fasta"
+    read_any "$global" > "${workg}/prank_input.fasta"  ## prank reads plain FASTA only
+    time prank -d="${workg}/prank_input.fasta" -o="${workg}/aligned_temp" -t="$FINAL_TREE_FILE_TEMPLATE" -once -f=fasta +F -codon
+    compress_stream < "${workg}/aligned_temp.best.fas" > "${workg}/aligned_codons.fasta${SUFFIX}"
+    rm -f "${workg}/aligned_temp.best.fas" "${workg}/prank_input.fasta"
   else
-    python3 "$SCRIPT_DIR/align_codons.py" "$global" "${workg}/aligned_codons.fasta"
+    ALIGN_ARGS=()
+    [[ "${ALIGN_DEDUP:-false}" == "true" ]] && ALIGN_ARGS+=(--dedup)
+    pyhelper align-codons "$global" "${workg}/aligned_codons.fasta${SUFFIX}" "${ALIGN_ARGS[@]}"
   fi
-  echo "Initial aligned FASTA file created at: ${workg}/aligned_codons.fasta"
+  echo "Initial aligned FASTA file created at: ${workg}/aligned_codons.fasta${SUFFIX}"
 
 
   echo -e "\n\n--------------[3.2] Masking poorly aligned regions\n\n"
-  python3 ${SCRIPT_DIR}/mask_alignment.py -i "${workg}/aligned_codons.fasta" \
+  pyhelper mask-alignment -i "${workg}/aligned_codons.fasta${SUFFIX}" \
 	--aa-threshold 0.85 \
 	--blosum62-threshold 0.2 \
-	--o "${workg}/aligned_codons_masked_poor.fasta"
+	--o "${workg}/aligned_codons_masked_poor.fasta${SUFFIX}"
 
   echo -e "\n\n--------------[3.3] Recombination filtering report\n\n"
 
-  FASTA_INPUT="${workg}/aligned_codons_masked_poor.fasta"
-  RECOMB_OUTPUT_DIR="${RECOMB_OUTPUT_DIR//<CDS>/$CDS}"
+  FASTA_INPUT="${workg}/aligned_codons_masked_poor.fasta${SUFFIX}"
+  RECOMB_OUT="${RECOMB_OUTPUT_DIR//<CDS>/$CDS}"  ## per CDS; the template itself is kept for the next one
   BASE_NAME="${base}"
-  f=$SCRIPT_DIR/recombination_filtering.sh && sed -i 's/\r$//' "$f" && chmod +x "$f" && "$f" "$GLOBALS" "$FASTA_INPUT" "$RECOMB_OUTPUT_DIR" "$BASE_NAME"
+  "$SCRIPT_DIR/recombination_filtering.sh" "$GLOBALS" "$FASTA_INPUT" "$RECOMB_OUT" "$BASE_NAME"
 
 
   echo -e "\n\n--------------[3.4] Masking recombination regions\n\n"
 
   MASK_FILE="${RECOMB_OUT}/recombination_regions.mask.tsv"
   if [[ -f "$MASK_FILE" ]]; then
-    python3 ${SCRIPT_DIR}/mask_recomb_regions.py \
-      "${workg}/aligned_codons_masked_poor.fasta" \
+    pyhelper mask-recomb-regions \
+      "${workg}/aligned_codons_masked_poor.fasta${SUFFIX}" \
       "$MASK_FILE" \
-      "${workg}/aligned_codons_masked.fasta" \
-      --mask-char N
+      "${workg}/aligned_codons_masked.fasta${SUFFIX}" \
+      --mask-char N \
+      --report "${RECOMB_OUT}/recombination_mask_coverage.tsv"
   else
-      echo "No mask file for $BASE — skipping masking recom regions"
-      cp "${workg}/aligned_codons_masked_poor.fasta" "${workg}/aligned_codons_masked.fasta"
+      echo "No mask file for $base — skipping masking recom regions"
+      cp "${workg}/aligned_codons_masked_poor.fasta${SUFFIX}" "${workg}/aligned_codons_masked.fasta${SUFFIX}"
   fi
 
 
@@ -169,7 +176,10 @@ for global in "${ORTHOLOGS_RESULTS_DIR}/globals/"*.fasta; do
   # PHY_BASE="${PHY_FILE_TEMPLATE%.*}"
   # PHY_OUT="${PHY_BASE}_${base}.${PHY_EXT}"
   touch $PHY_OUT
-  python3 "${SCRIPT_DIR}/fasta_to_phylip.py" "${workg}/aligned_codons_masked.fasta" "$PHY_OUT"
+  ## <CDS>.codons.tsv maps codeml sites back to alignment and reference CDS codons (read by the summary)
+  PHY_ARGS=(--codon-map "${PHY_OUT%.phy}.codons.tsv" --ref "$REF_ACC")
+  [[ "${DROP_MASKED_CODONS:-true}" == "true" ]] && PHY_ARGS+=(--drop-masked-codons)
+  pyhelper fasta-to-phylip "${workg}/aligned_codons_masked.fasta${SUFFIX}" "$PHY_OUT" "${PHY_ARGS[@]}"
   echo "Phylip file created at: $PHY_OUT"
 
 echo "=== Pipeline complete ==="
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+recomb_mask.py
+
+Builds the recombination mask of one CDS from the 3SEQ results of all its
+windows (``3s-<BASE>[_window_<start>-<end>].{longRec,rec.csv}`` in the 3SEQ
+report folder) as a per-sequence interval index.
+
+For every recombinant listed in a ``.longRec`` the breakpoints of its
+``.rec.csv`` rows are turned into the recombinant segment: the shorter side of
+the two breakpoints (between them, or the two flanks). The sides are compared
+at the narrowest breakpoints, as 3SEQ does for ``min_rec_length``; only the
+chosen side is then widened to the full breakpoint ranges. Every alternative
+breakpoint pair is included. Positions are window-relative
+and are shifted by the window start, so the mask is in alignment columns.
+Overlapping and adjacent regions, e.g. the same stretch found in several
+overlapping windows, are merged into one row.
+
+With ``--span window`` a recombinant's whole window is masked instead (the
+pipeline's earlier behaviour); the whole window is also used when a
+recombinant has no breakpoints in ``.rec.csv``.
+
+Output: ``seq_id <TAB> start <TAB> end`` (1-based, inclusive), sorted.
+
+Usage examples:
+  python3 recomb_mask.py 3seq_report_KY581700.1_ASU45872.1 KY581700.1_ASU45872.1 recombination_regions.mask.tsv --length 4404
+"""
+import argparse
+import bisect
+import csv
+import glob
+import os
+import re
+import sys
+
+from compressed_io import open_text, stored_path
+
+## "<BASE>_window_3801-4200" -> window start/end in alignment columns
+_WINDOW_LABEL = re.compile(r"_window_(\d+)-(\d+)$")
+## one breakpoint pair of rec.csv: "220-225 & 400-400" (between-site positions, 0 = before the first site)
+_BREAKPOINTS = re.compile(r"^\s*(\d+)-(\d+)\s*&\s*(\d+)-(\d+)\s*$")
+
+
+class IntervalIndex:
+    """Disjoint, sorted 1-based inclusive intervals; added intervals are merged on insert."""
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in intervals:
+            self.add(start, end)
+
+    def add(self, start, end):
+        if end < start:
+            return
+        ## first interval that could touch [start, end] (ends at start - 1 or later)
+        i = bisect.bisect_left(self.ends, start - 1)
+        j = i
+        while j < len(self.starts) and self.starts[j] <= end + 1:
+            start = min(start, self.starts[j])
+            end = max(end, self.ends[j])
+            j += 1
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def __iter__(self):
+        return iter(zip(self.starts, self.ends))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def covered(self, length=None):
+        """Number of positions covered (within 1..length if given)."""
+        total = 0
+        for start, end in self:
+            if length is not None:
+                end = min(end, length)
+            total += max(end - start + 1, 0)
+        return total
+
+
+def read_mask(path):
+    """``seq_id -> IntervalIndex`` from a mask TSV (header, start, end); malformed lines are skipped."""
+    index = {}
+    with open_text(path) as f:
+        for line in f:
+            parts = line.strip().split("\t")
+            if len(parts) != 3:
+                continue
+            try:
+                start, end = int(parts[1]), int(parts[2])
+            except ValueError:
+                continue
+            index.setdefault(parts[0], IntervalIndex()).add(start, end)
+    return index
+
+
+def write_mask(index, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as out:
+        for seq_id in sorted(index):
+            for start, end in index[seq_id]:
+                out.write(f"{seq_id}\t{start}\t{end}\n")
+    os.replace(tmp_path, path)
+
+
+def sequence_id(name):
+    """3SEQ repeats the whole FASTA header ("JQ993308.1 Codon alignment [3801-4200]"); keep the id."""
+    return name.split()[0] if name.strip() else ""
+
+
+def recombinant_segments(pair, window_length):
+    """
+    Window-relative 1-based segments of one breakpoint pair: the sites between the
+    breakpoints, or the two flanks when those are shorter. Both sides are measured
+    with the breakpoints at their narrowest; the chosen side is returned at its widest.
+    """
+    m = _BREAKPOINTS.match(pair)
+    if not m:
+        return None
+    (a, b), (c, d) = sorted([(int(m.group(1)), int(m.group(2))), (int(m.group(3)), int(m.group(4)))])
+    if c - b <= a + window_length - d:
+        return [(a + 1, d)]
+    return [(1, b), (c + 1, window_length)]
+
+
+def read_breakpoints(rec_csv, window_length):
+    """child id -> window-relative segments from all its rec.csv rows."""
+    segments = {}
+    with open_text(rec_csv) as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if not header or "breakpoints" not in header:
+            return segments
+        child_col = header.index("C_ACCNUM")
+        first_pair_col = header.index("breakpoints")
+        for row in rows:
+            if len(row) <= first_pair_col:
+                continue
+            child = sequence_id(row[child_col])
+            for pair in row[first_pair_col:]:  ## alternative breakpoint pairs spill into extra columns
+                found = recombinant_segments(pair, window_length)
+                if found:
+                    segments.setdefault(child, []).extend(found)
+    return segments
+
+
+def read_long_recombinants(long_rec):
+    with open_text(long_rec) as f:
+        return {sequence_id(line) for line in f if sequence_id(line)}
+
+
+def build_mask(report_dir, base, length, span="breakpoints"):
+    """``seq_id -> IntervalIndex`` in alignment columns from every 3SEQ run of ``base``."""
+    index = {}
+    prefix = os.path.join(report_dir, f"3s-{base}")
+    labels = set()
+    for path in glob.glob(glob.escape(prefix) + "*.longRec*"):
+        name = os.path.basename(path)[len("3s-"):]
+        label = name[:name.index(".longRec")]
+        if label == base or label.startswith(base + "_window_"):
+            labels.add(label)
+
+    for label in sorted(labels):
+        m = _WINDOW_LABEL.search(label)
+        offset, window_length = (int(m.group(1)) - 1, int(m.group(2)) - int(m.group(1)) + 1) if m else (0, length)
+        recombinants = read_long_recombinants(stored_path(os.path.join(report_dir, f"3s-{label}.longRec")))
+        rec_csv = stored_path(os.path.join(report_dir, f"3s-{label}.rec.csv"))
+        breakpoints = read_breakpoints(rec_csv, window_length) if rec_csv and span == "breakpoints" else {}
+        for seq_id in recombinants:
+            for start, end in breakpoints.get(seq_id) or [(1, window_length)]:
+                index.setdefault(seq_id, IntervalIndex()).add(offset + start, offset + end)
+    return index
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Merge 3SEQ recombinant regions of one CDS into a mask TSV")
+    parser.add_argument("report_dir", help="3SEQ report folder of the CDS")
+    parser.add_argument("base", help="Label of the CDS runs (3s-<base>[_window_<start>-<end>].longRec)")
+    parser.add_argument("output", help="Mask TSV: seq_id, start, end (alignment columns, 1-based)")
+    parser.add_argument("--length", type=int, required=True, help="Alignment length (for runs without windows)")
+    parser.add_argument("--span", choices=["breakpoints", "window"], default="breakpoints",
+                        help="Mask the segment between the 3SEQ breakpoints (default) or the whole window")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    index = build_mask(args.report_dir, args.base, args.length, args.span)
+    write_mask(index, args.output)
+    n_regions = sum(len(intervals) for intervals in index.values())
+    print(f"Recombination mask: {n_regions} region(s) in {len(index)} sequence(s) -> {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,11 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
 GLOBALS="$1"
 source "$GLOBALS"
+source "$SCRIPT_DIR/../helpers.sh"
 FASTA="$2"
 OUTDIR="$3"
-BASE="${4:-$(basename "$FASTA" .fasta)}"
+BASE="${4:-$(fasta_base "$FASTA")}"
+SUFFIX="$(compress_suffix)"
 
 if [[ ! -f "$FASTA" ]]; then
     echo "!!! ERROR: FASTA file not found: $FASTA"
@@ -20,12 +22,11 @@ run_3seq_on_fasta() {
     local fasta_file="$1"
     local outdir="$2"
     local base_label="$3"
-    local global_mask_file="$outdir/recombination_regions.mask.tsv"
 
     # Remove identical sequences and ensure at least 3 unique sequences remain
     local dedup_fasta
     dedup_fasta=$(mktemp)
-    seqkit rmdup -s "$fasta_file" > "$dedup_fasta"
+    read_any "$fasta_file" | seqkit rmdup -s > "$dedup_fasta"
     local num_unique
     num_unique=$(grep -c '^>' "$dedup_fasta")
     if (( num_unique < 3 )); then
@@ -56,29 +57,26 @@ run_3seq_on_fasta() {
     if [[ -f 3s.longRec ]]; then
         mv "3s.longRec" "$outdir/3s-${base_label}.longRec"
         echo "✅ Recombination found in: $base_label"
-
-        # Extract recombinant regions and append to global mask file
-        awk '
-          /\[.*\]/ {
-              match($0, /\[([0-9]+)-([0-9]+)\]/, coords)
-              if (coords[1] && coords[2]) {
-                  header = $1
-                  print header "\t" coords[1] "\t" coords[2]
-              }
-          }
-        ' "$outdir/3s-${base_label}.longRec" >> "$global_mask_file"
-
     else
         echo "ℹ️ No recombination detected in: $base_label"
     fi
 
+    ## 3SEQ logs are kept for reference only; store them as configured
+    local kept
+    for kept in "$outdir/3s-${base_label}".{log,pvalHist,rec.csv,longRec}; do
+        [[ -f "$kept" ]] && compress_file "$kept" > /dev/null
+    done
+
     rm -f "$dedup_fasta"
 }
 
 mkdir -p "$OUTDIR"
+MASK_FILE="$OUTDIR/recombination_regions.mask.tsv"
+## results of an earlier run of this CDS would leak into the mask built below
+rm -f "$OUTDIR/3s-${BASE}".* "$OUTDIR/3s-${BASE}_window_"* "$MASK_FILE"
 
 # === Detect max sequence length ===
-MAX_LEN=$(seqkit fx2tab "$FASTA" | awk -F'\t' '{ print length($2) }' | sort -nr | head -n 1)
+MAX_LEN=$(read_any "$FASTA" | seqkit fx2tab | awk -F'\t' '{ print length($2) }' | sort -nr | head -n 1)
 echo "Max sequence length: $MAX_LEN nt"
 
 
@@ -86,18 +84,23 @@ echo "Max sequence length: $MAX_LEN nt"
 # If the max aligned length is < PV_DIM, run 3SEQ once on full FASTA
 if (( MAX_LEN < PV_DIM )); then
     run_3seq_on_fasta "$FASTA" "$OUTDIR" "$BASE"
-    exit 0
 else
     WINDOW_DIR="${OUTDIR}/3seq_windows_${BASE}"
     mkdir -p ${WINDOW_DIR}
+    rm -f "$WINDOW_DIR"/window_*.fasta{,.gz,.zst}  ## windows skipped by this run must not linger from an earlier one
 
-    python3 "${SCRIPT_DIR}/sliding_window.py" -s "$STEP" -W "$PV_DIM" "$WINDOW_DIR/window_{start}-{end}.fasta" "$FASTA"
+    ## windows with too little signal for 3SEQ are skipped (and logged) before any 3SEQ process starts
+    WINDOW_ARGS=(--min-informative "$RECOMB_MIN_INFORMATIVE" --min-haplotypes "$RECOMB_MIN_HAPLOTYPES"
+                 --report "$WINDOW_DIR/windows.tsv")
+    [[ "$RECOMB_MERGE_LOW_SIGNAL" == "true" ]] && WINDOW_ARGS+=(--merge-low-signal)
+    pyhelper sliding-window -s "$STEP" -W "$PV_DIM" "${WINDOW_ARGS[@]}" "$WINDOW_DIR/window_{start}-{end}.fasta${SUFFIX}" "$FASTA"
 
     # === Run 3SEQ on each window ===
-    for win_fasta in "$WINDOW_DIR"/*.fasta; do
-        base_win=$(basename "$win_fasta" .fasta)
+    for win_fasta in "$WINDOW_DIR"/window_*.fasta"$SUFFIX"; do
+        [[ -f "$win_fasta" ]] || continue
+        base_win=$(fasta_base "$win_fasta")
 
-        num_seqs=$(grep -c '^>' "$win_fasta")
+        num_seqs=$(read_any "$win_fasta" | grep -c '^>')
         if (( num_seqs < 3 )); then
             echo "Skipping $base_win — only $num_seqs sequences (need ≥ 3)"
             continue
@@ -107,4 +110,7 @@ else
         echo "Running 3SEQ on window: $base_win"
         run_3seq_on_fasta "$win_fasta" "$OUTDIR" "${BASE}_${base_win}"
     done
-fi
\ No newline at end of file
+fi
+
+# === Merge the recombinant regions of all runs into one mask (alignment columns) ===
+pyhelper recomb-mask "$OUTDIR" "$BASE" "$MASK_FILE" --length "$MAX_LEN" --span "$RECOMB_MASK_SPAN"
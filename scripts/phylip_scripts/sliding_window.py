@@ -2,20 +2,73 @@
 
 import argparse
 from Bio import SeqIO
+import numpy as np
 import os
 
+from compressed_io import open_text
+
+## nucleotide states counted for parsimony-informative sites; everything else (N, -, ?, IUPAC) is missing data
+NUCLEOTIDES = np.frombuffer(b"ACGT", dtype=np.uint8)
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Split aligned FASTA into sliding windows.")
-    parser.add_argument("output_pattern", help="Output pattern, e.g. windows/window_{start}-{end}.fasta")
+    parser.add_argument("output_pattern", help="Output pattern, e.g. windows/window_{start}-{end}.fasta (.gz/.zst to compress)")
     parser.add_argument("fasta", help="Aligned input FASTA file")
     parser.add_argument("-W", "--window", type=int, default=700, help="Window size (default: 700)")
     parser.add_argument("-s", "--step", type=int, default=500, help="Step size (default: 500)")
+    parser.add_argument("--min-informative", type=int, default=0,
+                        help="Skip windows with fewer parsimony-informative sites (default: 0, keep all)")
+    parser.add_argument("--min-haplotypes", type=int, default=0,
+                        help="Skip windows with fewer unique sequences (default: 0, keep all)")
+    parser.add_argument("--merge-low-signal", action="store_true",
+                        help="Merge runs of adjacent skipped windows and keep the merged window if it passes")
+    parser.add_argument("--report", help="Write a TSV with the signal of every window and what was done with it")
     return parser.parse_args()
 
+def alignment_matrix(records):
+    """Upper-case alignment as an (n_seqs, length) uint8 matrix."""
+    return np.frombuffer(b"".join(bytes(str(r.seq).upper(), "ascii") for r in records),
+                         dtype=np.uint8).reshape(len(records), -1)
+
+def site_signal(matrix):
+    """
+    Per column: True if parsimony-informative (two or more nucleotides each seen in
+    two or more sequences), and True if polymorphic (two or more nucleotides).
+    """
+    counts = (matrix[:, :, None] == NUCLEOTIDES).sum(axis=0)  ## (length, 4)
+    informative = (counts >= 2).sum(axis=1) >= 2
+    polymorphic = (counts >= 1).sum(axis=1) >= 2
+    return informative, polymorphic
+
+def count_haplotypes(matrix, start, end):
+    """Number of distinct sequences in columns [start, end)."""
+    window = np.ascontiguousarray(matrix[:, start:end])
+    return len(np.unique(window.view(np.dtype((np.void, window.shape[1])))))
+
+def window_signal(matrix, cum_informative, cum_polymorphic, start, end):
+    return (int(cum_informative[end] - cum_informative[start]),
+            int(cum_polymorphic[end] - cum_polymorphic[start]),
+            count_haplotypes(matrix, start, end))
+
+def write_window(records, start, end, output_pattern):
+    sliced_records = []
+    for rec in records:
+        new_rec = rec[start:end]
+        new_rec.id = rec.id
+        new_rec.description = f"{rec.description} [{start+1}-{end}]"
+        sliced_records.append(new_rec)
+
+    out_path = output_pattern.replace("{start}", str(start + 1)).replace("{end}", str(end))
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open_text(out_path, "w") as out:
+        SeqIO.write(sliced_records, out, "fasta")
+    print(f"Wrote: {out_path}")
+
 def main():
     args = parse_args()
 
-    records = list(SeqIO.parse(args.fasta, "fasta"))
+    with open_text(args.fasta) as f:
+        records = list(SeqIO.parse(f, "fasta"))
     if not records:
         raise ValueError("No sequences found.")
 
@@ -24,22 +77,72 @@ def main():
         if len(r.seq) != aln_len:
             raise ValueError(f"All sequences must be aligned to the same length (got {len(r.seq)} vs {aln_len})")
 
+    windows = []
     for start in range(0, aln_len, args.step):
         end = start + args.window
         if end > aln_len:
             break  # Skip incomplete window
+        windows.append((start, end))
+
+    filtering = args.min_informative > 0 or args.min_haplotypes > 0
+    if filtering or args.report:
+        matrix = alignment_matrix(records)
+        informative, polymorphic = site_signal(matrix)
+        ## prefix sums give the count of any window in O(1)
+        cum_informative = np.concatenate(([0], np.cumsum(informative)))
+        cum_polymorphic = np.concatenate(([0], np.cumsum(polymorphic)))
+
+    def passes(signal):
+        return signal[0] >= args.min_informative and signal[2] >= args.min_haplotypes
+
+    report = []
+    low_run = []  ## adjacent skipped windows waiting to be merged
+
+    def flush_low_run():
+        if len(low_run) < 2:
+            low_run.clear()
+            return
+        start, end = low_run[0][0], low_run[-1][1]
+        signal = window_signal(matrix, cum_informative, cum_polymorphic, start, end)
+        if passes(signal):
+            write_window(records, start, end, args.output_pattern)
+            report.append((start, end) + signal + ("merged",))
+        else:
+            report.append((start, end) + signal + ("merged-skipped",))
+        low_run.clear()
+
+    for start, end in windows:
+        if not filtering:
+            write_window(records, start, end, args.output_pattern)
+            if args.report:
+                report.append((start, end) + window_signal(matrix, cum_informative, cum_polymorphic, start, end) + ("written",))
+            continue
+
+        signal = window_signal(matrix, cum_informative, cum_polymorphic, start, end)
+        if passes(signal):
+            flush_low_run()
+            write_window(records, start, end, args.output_pattern)
+            report.append((start, end) + signal + ("written",))
+            continue
 
-        sliced_records = []
-        for rec in records:
-            new_rec = rec[start:end]
-            new_rec.id = rec.id
-            new_rec.description = f"{rec.description} [{start+1}-{end}]"
-            sliced_records.append(new_rec)
+        print(f"Skipping window_{start+1}-{end} — {signal[0]} informative sites, {signal[2]} unique sequences")
+        report.append((start, end) + signal + ("skipped",))
+        if args.merge_low_signal:
+            ## 3SEQ's p-value table is sized for PV_DIM (= window) polymorphic sites; stay within it
+            if low_run and cum_polymorphic[end] - cum_polymorphic[low_run[0][0]] > args.window:
+                flush_low_run()
+            low_run.append((start, end))
+    if args.merge_low_signal:
+        flush_low_run()
 
-        out_path = args.output_pattern.replace("{start}", str(start + 1)).replace("{end}", str(end))
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        SeqIO.write(sliced_records, out_path, "fasta")
-        print(f"Wrote: {out_path}")
+    if args.report:
+        with open(args.report, "w") as out:
+            out.write("start\tend\tinformative_sites\tpolymorphic_sites\thaplotypes\tstatus\n")
+            for start, end, n_inf, n_poly, n_hap, status in report:
+                out.write(f"{start+1}\t{end}\t{n_inf}\t{n_poly}\t{n_hap}\t{status}\n")
+        skipped = sum(1 for row in report if row[-1] == "skipped")
+        merged = sum(1 for row in report if row[-1] == "merged")
+        print(f"{len(windows) - skipped} of {len(windows)} windows kept, {merged} merged window(s) added; report: {args.report}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
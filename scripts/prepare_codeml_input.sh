@@ -9,51 +9,29 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
 GLOBALS="$1"
 source "$GLOBALS"
+source "$SCRIPT_DIR/helpers.sh"
+export COMPRESSION  ## read by the prefetch and FASTA helpers in helpers.sh
 
-# f=tree_scripts/run_tree_pipeline.sh && sed -i 's/\r$//' "$f" && chmod +x "$f"
-# f=phylip_scripts/orthologs_pipeline.sh && sed -i 's/\r$//' "$f" && chmod +x "$f"
 # f=prepare_codeml_input.sh && sed -i 's/\r$//' "$f" && chmod +x "$f" && ./"$f" ./accessions.txt "Hepeviridae_6"
-
-for f in \
-  "$SCRIPT_DIR/tree_scripts/run_tree_pipeline.sh"
-do
-  sed -i 's/\r$//' "$f"
-  chmod +x "$f"
-done
+# (CRLF stripping and chmod of the helper scripts is done once by codeml_pipeline.sh)
 
 echo "########################################### PREPARING SAMPLES ###########################################"
 
-f=$SCRIPT_DIR/remove_no_cds_samples.sh && \
-  sed -i 's/\r$//' "$f" && \
-  chmod +x "$f" && \
-  "$f" "$ACCESSIONS_FILE" "$PREFETCH_DIR"
-
-TREE_TMP=$(mktemp)
-ACCESSIONS_TMP=$(mktemp)
-MISSING_TMP=$(mktemp)
-grep -oE '[^(),:;|]+' "$ROOTED_TREE_PATH" | grep -E '^[A-Z]{2}[0-9]+\.[0-9]+$' | sort -u > "$TREE_TMP"
-#tail -n +2 "$ACCESSIONS_FILE" | sort -u > "$ACCESSIONS_TMP"
-tail -n +2 "$ACCESSIONS_FILE" | cut -f2 | sort -u > "$ACCESSIONS_TMP"
-
+"$SCRIPT_DIR/remove_no_cds_samples.sh" "$ACCESSIONS_FILE" "$PREFETCH_DIR"
 
-comm -23 "$TREE_TMP" "$ACCESSIONS_TMP" > "$MISSING_TMP"
-
-
-if [[ -s "$MISSING_TMP" ]]; then
-  MISSING=$(paste -sd, "$MISSING_TMP")
-  echo "Missing samples at $ROOTED_TREE_PATH:\n${MISSING}"
+## tree leaves without a row in ACCESSIONS_FILE (comma separated), pruned by the tree pipeline
+MISSING=$(pyhelper reconcile-samples missing "$ACCESSIONS_FILE" "$ROOTED_TREE_PATH")
+if [[ -n "$MISSING" ]]; then
+  echo -e "Missing samples at $ROOTED_TREE_PATH:\n${MISSING}"
 else
   echo "All tree accessions are present in ${ACCESSIONS_FILE}."
 fi
-MISSING=$(echo "$MISSING" | tr -d '\r')
-
-rm -f "$TREE_TMP" "$ACCESSIONS_TMP" "$MISSING_TMP"
 
 
 
 # ================ PIPELINE WORKFLOW =================
 echo "########################################### TREE PIPELINE ###########################################"
-f=$SCRIPT_DIR/tree_scripts/run_tree_pipeline.sh && sed -i 's/\r$//' "$f" && chmod +x "$f" && "$f" "$GLOBALS" "$MISSING"
+"$SCRIPT_DIR/tree_scripts/run_tree_pipeline.sh" "$GLOBALS" "$MISSING"
 
 HEADER_LINE=$(head -n 1 "$ACCESSIONS_FILE")
 IFS=$'\t' read -ra HEADERS <<< "$HEADER_LINE"
@@ -77,35 +55,8 @@ if [[ -z "$ACCESSION_COL_INDEX" || -z "$HOST_COL_INDEX" ]]; then
 	exit 1
 fi
 
-# Step 1: Create set of accessions in reduced tree
-mapfile -t KEPT_LEAVES < <(python3 -c "
-from ete3 import Tree
-t = Tree('$FINAL_TREE_FILE_PATH', format=1)
-print('\n'.join(leaf.name for leaf in t.get_leaves()))
-")
-declare -A LEAF_SET
-for acc in "${KEPT_LEAVES[@]}"; do
-	cleaned_acc=$(echo "$acc" | sed 's/#\([1-9]\+\)//g')
-	LEAF_SET["$cleaned_acc"]=1
-done
-
-# Print the number of leaves
-echo "Number of leaves in the reduced tree: ${#LEAF_SET[@]}"
-
-# Step 2: Filter ACCESSIONS_FILE by these accessions
-HEADER=$(head -n 1 "$ACCESSIONS_FILE")
-echo "$HEADER" > "${ACCESSIONS_FILE}.filtered"
-
-tail -n +2 "$ACCESSIONS_FILE" | while IFS=$'\t' read -ra FIELDS; do
-        ACCESSION="${FIELDS[$ACCESSION_COL_INDEX]}"
-        echo "Comparing: '$ACCESSION' vs '${cleaned_acc}'"
-        if [[ -n "${LEAF_SET[$ACCESSION]}" ]]; then
-                (IFS=$'\t'; echo -e "${FIELDS[*]}") >> "${ACCESSIONS_FILE}.filtered"
-        fi
-done
-
-#Replace original
-mv "${ACCESSIONS_FILE}.filtered" "$ACCESSIONS_FILE"
+# Keep only the accessions that are leaves of the reduced tree (file replaced atomically)
+pyhelper reconcile-samples filter "$ACCESSIONS_FILE" "$FINAL_TREE_FILE_PATH"
 
 # After pruning, determine a valid REF_ACC and update globals
 if ! awk -v col="$((ACCESSION_COL_INDEX + 1))" -F'\t' 'NR > 1 { print $col }' "$ACCESSIONS_FILE" | grep -qxF "$REF_ACC"; then
@@ -135,8 +86,5 @@ export REF_ACC RESULTS_DIR RECOMB_OUTPUT_DIR PHY_FILE_TEMPLATE
 
 echo "########################################### PHYLIP PIPELINE ###########################################"
 
-f=$SCRIPT_DIR/phylip_scripts/orthologs_pipeline.sh && \
- sed -i 's/\r$//' "$f" && \
- chmod +x "$f" && \
- "$f" "$GLOBALS"
+"$SCRIPT_DIR/phylip_scripts/orthologs_pipeline.sh" "$GLOBALS"
 
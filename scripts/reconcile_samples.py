@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+reconcile_samples.py
+
+Reconciles the accessions file with the rooted tree and the prefetch cache.
+Every command reads the tree, the accession table and the prefetch folder once
+and works on sets, so a clique with thousands of rows takes milliseconds.
+Rewritten accession files are replaced atomically.
+
+Commands:
+  missing   tree accessions that are not in the accessions file (comma separated)
+  uncached  accessions without a cached CDS/protein/genome FASTA in PREFETCH_DIR
+  no-cds    drop the rows whose prefetched CDS FASTA holds no record
+  filter    keep only the rows whose accession is a leaf of the (pruned) tree
+
+Prefetched FASTAs may be plain or gzip/zstd compressed (see compressed_io.py).
+
+Usage examples:
+  python3 reconcile_samples.py missing input/accessions_h6.txt input/rooted_trees/Hepeviridae_6.rooted.anc_recon.tree
+  python3 reconcile_samples.py no-cds input/accessions_h6.txt output/prefetch
+  python3 reconcile_samples.py filter input/accessions_h6.txt output/codeml/input/Hepeviridae_6.tree
+"""
+import argparse
+import os
+import re
+import sys
+
+import pandas as pd
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, "phylip_scripts"))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, "tree_scripts"))
+from compressed_io import open_text, stored_path  # noqa: E402
+from newick_prune import read_newick  # noqa: E402
+
+ACCESSION_COLUMNS = ("ACCESSION", "Accession")
+## prefetched files per accession, as written by prefetch_fasta in helpers.sh
+PREFETCH_FILES = ("{acc}_cds_na.fasta", "{acc}_cds_aa.fasta", "{acc}.fasta")
+_FOREGROUND_MARK = re.compile(r"#\d+")
+
+
+def read_accessions(path):
+    """The accession table as strings, and the name of its accession column."""
+    table = pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False)
+    for column in ACCESSION_COLUMNS:
+        if column in table.columns:
+            return table, column
+    sys.exit(f"ERROR: no ACCESSION column in {path}")
+
+
+def write_accessions(table, path):
+    """Write the table next to ``path`` and rename it over, so readers never see half a file."""
+    tmp_path = path + ".tmp"
+    table.to_csv(tmp_path, sep="\t", index=False)
+    os.replace(tmp_path, path)
+
+
+def tree_accessions(tree_path):
+    """Leaf accessions of a Newick tree, without "|..." suffixes and "#1" foreground marks."""
+    tree = read_newick(tree_path)
+    return {_FOREGROUND_MARK.sub("", tree.names[leaf].split("|")[0]) for leaf in tree.leaves()}
+
+
+def prefetch_index(prefetch_dir):
+    """File name -> size for everything in PREFETCH_DIR, from one directory scan."""
+    if not os.path.isdir(prefetch_dir):
+        return {}
+    with os.scandir(prefetch_dir) as entries:
+        return {entry.name: entry.stat().st_size for entry in entries if entry.is_file()}
+
+
+def has_records(path):
+    with open_text(path) as f:
+        return any(line.startswith(">") for line in f)
+
+
+def missing_from_table(accessions_path, tree_path):
+    table, column = read_accessions(accessions_path)
+    return sorted(tree_accessions(tree_path) - set(table[column]))
+
+
+def uncached(accessions_path, prefetch_dir):
+    table, column = read_accessions(accessions_path)
+    index = prefetch_index(prefetch_dir)
+    return [acc for acc in table[column].drop_duplicates()
+            if any(stored_path(pattern.format(acc=acc), index.get) is None for pattern in PREFETCH_FILES)]
+
+
+def drop_no_cds(accessions_path, prefetch_dir):
+    """Remove rows whose cached CDS FASTA is missing or empty. Returns the dropped accessions."""
+    table, column = read_accessions(accessions_path)
+    index = prefetch_index(prefetch_dir)
+    with_cds = set()
+    for acc in table[column].drop_duplicates():
+        name = stored_path(PREFETCH_FILES[0].format(acc=acc), index.get)  ## index.get: size, 0 when empty
+        if name and has_records(os.path.join(prefetch_dir, name)):
+            with_cds.add(acc)
+    keep = table[column].isin(with_cds)
+    dropped = table.loc[~keep, column].drop_duplicates().tolist()
+    if dropped:
+        write_accessions(table[keep], accessions_path)
+    return dropped
+
+
+def filter_to_tree(accessions_path, tree_path):
+    """Keep the rows whose accession is a leaf of the tree. Returns (leaves, rows kept, rows dropped)."""
+    leaves = tree_accessions(tree_path)
+    table, column = read_accessions(accessions_path)
+    keep = table[column].isin(leaves)
+    write_accessions(table[keep], accessions_path)
+    return len(leaves), int(keep.sum()), int((~keep).sum())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Reconcile the accessions file with the tree and the prefetch cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_missing = sub.add_parser("missing", help="Print tree accessions missing from the accessions file")
+    p_missing.add_argument("accessions", help="Accessions TSV")
+    p_missing.add_argument("tree", help="Newick tree")
+
+    p_uncached = sub.add_parser("uncached", help="Print accessions that still need to be fetched")
+    p_uncached.add_argument("accessions", help="Accessions TSV")
+    p_uncached.add_argument("prefetch_dir", help="PREFETCH_DIR")
+
+    p_no_cds = sub.add_parser("no-cds", help="Drop accessions whose prefetched CDS FASTA is empty (in place)")
+    p_no_cds.add_argument("accessions", help="Accessions TSV, rewritten in place")
+    p_no_cds.add_argument("prefetch_dir", help="PREFETCH_DIR")
+
+    p_filter = sub.add_parser("filter", help="Keep only accessions that are leaves of the tree (in place)")
+    p_filter.add_argument("accessions", help="Accessions TSV, rewritten in place")
+    p_filter.add_argument("tree", help="Newick tree (foreground marks are ignored)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "missing":
+        print(",".join(missing_from_table(args.accessions, args.tree)))
+    elif args.command == "uncached":
+        for acc in uncached(args.accessions, args.prefetch_dir):
+            print(acc)
+    elif args.command == "no-cds":
+        for acc in drop_no_cds(args.accessions, args.prefetch_dir):
+            print(f"Removing {acc} - no CDS found", file=sys.stderr)
+    elif args.command == "filter":
+        n_leaves, kept, dropped = filter_to_tree(args.accessions, args.tree)
+        print(f"Number of leaves in the reduced tree: {n_leaves}")
+        print(f"Kept {kept} accession row(s), removed {dropped} not in the tree")
+
+
+if __name__ == "__main__":
+    main()
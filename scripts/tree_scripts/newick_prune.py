@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+newick_prune.py
+
+Fast leaf pruning for large Newick trees, used by prune_leaves_by_name.py and
+prune_random_leaves.py instead of ete3's ``Tree.prune``.
+
+The tree is held as flat lists (name, branch length, parent, children) and pruned
+in one post-order pass: tips that are not kept are dropped, nodes left with a
+single child are collapsed into it (branch lengths summed), and branching nodes
+keep their labels, including ``#1`` foreground markings. The result is written
+exactly as ete3 writes ``prune(keep, preserve_branch_length=True)`` followed by
+``write(format=1)``: same node order, same ``%0.6g`` branch lengths, no root label.
+
+``check`` compares the output with ete3 on random keep sets and times both.
+
+Usage examples:
+  python3 newick_prune.py check input/rooted_trees/Flaviviridae_13.rooted.anc_recon.tree --trials 20
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+DEFAULT_DIST = 1.0  ## ete3's branch length for nodes written without one
+_TOKEN = re.compile(r"[(),;]|:[^(),;:]*|[^(),;:]+")
+_ILLEGAL_NAME_CHARS = re.compile(r"[:;(),\[\]\t\n\r=]")  ## replaced by "_" on write, as ete3 does
+
+
+class CompactTree:
+    """Node 0 is the root; nodes are numbered in pre-order."""
+
+    def __init__(self):
+        self.names = []
+        self.dists = []
+        self.parents = []
+        self.children = []
+
+    def add_node(self, parent):
+        node = len(self.names)
+        self.names.append("")
+        self.dists.append(DEFAULT_DIST)
+        self.parents.append(parent)
+        self.children.append([])
+        if parent >= 0:
+            self.children[parent].append(node)
+        return node
+
+    def leaves(self):
+        """Leaf ids in Newick (left to right) order."""
+        return [n for n in self.preorder() if not self.children[n]]
+
+    def preorder(self):
+        order, stack = [], [0]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(reversed(self.children[node]))
+        return order
+
+    def postorder(self):
+        order, stack = [], [(0, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded or not self.children[node]:
+                order.append(node)
+                continue
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(self.children[node]))
+        return order
+
+
+def parse_newick(text):
+    """Parse a Newick string (ete3 format 1: leaf and internal names, branch lengths)."""
+    tree = CompactTree()
+    node = tree.add_node(-1)
+    for token in _TOKEN.findall(text):
+        if token == "(":
+            node = tree.add_node(node)
+        elif token == ",":
+            node = tree.add_node(tree.parents[node])
+        elif token == ")":
+            node = tree.parents[node]
+        elif token == ";":
+            break
+        elif token[0] == ":":
+            tree.dists[node] = float(token[1:])
+        else:
+            name = token.strip()
+            if name:
+                tree.names[node] = name
+    return tree
+
+
+def read_newick(path):
+    with open(path) as f:
+        return parse_newick(f.read())
+
+
+def prune(tree, keep):
+    """
+    Keep only the leaves in ``keep`` (node ids). Follows ete3's rules: the root,
+    the kept leaves and the nodes where kept lineages branch below their common
+    ancestor survive; a removed node's children move to the end of its parent's
+    child list and a removed unary node adds its branch length to its child.
+    """
+    keep = set(keep)
+    n_nodes = len(tree.names)
+    kept_below = [0] * n_nodes
+    kept_children = [0] * n_nodes
+    for node in range(n_nodes - 1, -1, -1):  ## pre-order ids: children come after parents
+        if node in keep:
+            kept_below[node] += 1
+        parent = tree.parents[node]
+        if parent >= 0 and kept_below[node]:
+            kept_below[parent] += kept_below[node]
+            kept_children[parent] += 1
+
+    ## common ancestor of the kept leaves: deepest node holding all of them
+    start = 0
+    while True:
+        inner = [c for c in tree.children[start] if kept_below[c] == len(keep)]
+        if not inner or start in keep:
+            break
+        start = inner[0]
+
+    for node in tree.postorder():
+        if node == 0 or node in keep or (kept_children[node] >= 2 and node != start):
+            continue
+        children = tree.children[node]
+        parent = tree.parents[node]
+        if len(children) == 1:
+            tree.dists[children[0]] += tree.dists[node]
+        elif children:
+            tree.dists[parent] += tree.dists[node]
+        for child in children:
+            tree.children[parent].append(child)
+            tree.parents[child] = parent
+        tree.children[parent].remove(node)
+        tree.children[node] = []
+    return tree
+
+
+def prune_to_names(tree, names):
+    """Keep the leaves whose name is in ``names``."""
+    names = set(names)
+    return prune(tree, [leaf for leaf in tree.leaves() if tree.names[leaf] in names])
+
+
+def to_newick(tree):
+    """Newick text as written by ete3 ``write(format=1)``."""
+    def label(node):
+        return f"{_ILLEGAL_NAME_CHARS.sub('_', tree.names[node])}:{'%0.6g' % tree.dists[node]}"
+
+    if not tree.children[0]:
+        return ";"
+    parts = []
+    stack = [0]  ## node ids still to write, or literal text
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+            continue
+        children = tree.children[item]
+        if not children:
+            parts.append(label(item))
+            continue
+        parts.append("(")
+        stack.append(")" if item == 0 else ")" + label(item))
+        for i, child in enumerate(reversed(children)):
+            if i:
+                stack.append(",")
+            stack.append(child)
+    return "".join(parts) + ";"
+
+
+def write_newick(tree, path):
+    with open(path, "w") as f:
+        f.write(to_newick(tree))  ## ete3 writes no trailing newline either
+
+
+def check_against_ete3(tree_path, trials=10, seed=1):
+    """Prune random keep sets with both engines; returns (mismatches, ete3 seconds, own seconds)."""
+    from ete3 import Tree
+
+    base = read_newick(tree_path)
+    leaf_names = [base.names[leaf] for leaf in base.leaves()]
+    rng = random.Random(seed)
+    mismatches, ete3_time, own_time = 0, 0.0, 0.0
+    for _ in range(trials):
+        keep = rng.sample(leaf_names, rng.randint(1, len(leaf_names)))
+
+        t0 = time.perf_counter()
+        ete_tree = Tree(tree_path, format=1)
+        ete_tree.prune(keep, preserve_branch_length=True)
+        expected = ete_tree.write(format=1)
+        t1 = time.perf_counter()
+        got = to_newick(prune_to_names(read_newick(tree_path), keep))
+        t2 = time.perf_counter()
+
+        ete3_time += t1 - t0
+        own_time += t2 - t1
+        if got != expected:
+            mismatches += 1
+    return mismatches, ete3_time, own_time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fast Newick leaf pruning (ete3 compatible)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_check = sub.add_parser("check", help="Compare with ete3 prune on random keep sets and time both")
+    p_check.add_argument("trees", nargs="+", help="Newick files")
+    p_check.add_argument("--trials", type=int, default=10, help="Random keep sets per tree (default: 10)")
+    p_check.add_argument("--seed", type=int, default=1, help="Random seed")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "check":
+        failed = False
+        print("tree\tleaves\ttrials\tmismatches\tete3_s\tfast_s\tspeedup")
+        for path in args.trees:
+            n_leaves = len(read_newick(path).leaves())
+            mismatches, ete3_time, own_time = check_against_ete3(path, args.trials, args.seed)
+            failed |= mismatches > 0
+            print(f"{path}\t{n_leaves}\t{args.trials}\t{mismatches}\t{ete3_time:.3f}\t{own_time:.3f}\t"
+                  f"{ete3_time / own_time if own_time else float('inf'):.1f}x")
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
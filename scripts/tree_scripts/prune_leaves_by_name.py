@@ -1,8 +1,9 @@
 import sys
-from ete3 import Tree
 import os
 import re
 
+from newick_prune import prune, read_newick, write_newick
+
 
 ## strip a trailing "#<digits>" from a leaf name
 _HASH_SUFFIX = re.compile(r"#\d+$")
@@ -10,27 +11,24 @@ def strip_marking(name: str) -> str:
     return _HASH_SUFFIX.sub("", name)
 
 def prune_tree(tree_file, taxa_to_remove):
-    tree = Tree(tree_file, format=1)
+    tree = read_newick(tree_file)
+    taxa_to_remove = set(taxa_to_remove)
 
     ## anything that is not found in the taxa to remove - keep
+    ## (only names carrying a marking need the regex)
     taxa_to_keep = [
-        leaf.name
-        for leaf in tree.get_leaves()
-        if strip_marking(leaf.name) not in taxa_to_remove
+        leaf
+        for leaf in tree.leaves()
+        if (strip_marking(tree.names[leaf]) if "#" in tree.names[leaf] else tree.names[leaf]) not in taxa_to_remove
     ]
     if not taxa_to_keep:
         print("Warning: pruning removed all taxa; writing an empty/degenerate tree.")
 
-    # all_taxa = set(tree.get_leaf_names())
-    # print("num of taxa, before and after:", len(all_taxa), len(taxa_to_keep))
-    # print("all taxa:", repr(list(all_taxa)))
-    # print("to remove:", repr(taxa_to_remove))
-
-    tree.prune(taxa_to_keep, preserve_branch_length=True)
+    prune(tree, taxa_to_keep)
 
     base_name, ext = os.path.splitext(tree_file)
     output_file = f"{base_name}_pruned{ext}"
-    tree.write(outfile=output_file, format=1)
+    write_newick(tree, output_file)
     print(f"Pruned tree saved as '{output_file}'")
 
 def main():
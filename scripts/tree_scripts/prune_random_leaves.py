@@ -1,21 +1,21 @@
 import argparse
 import random
-from ete3 import Tree
+
+from newick_prune import prune, read_newick, write_newick
 
 
 def prune_random_leaves(treefile: str, outfile: str, max_leaves: int, seed: int = 42) -> None:
     """Prune random leaves from the tree until at most ``max_leaves`` remain."""
-    tree = Tree(treefile, format=1)
-    leaves = tree.get_leaves()
+    tree = read_newick(treefile)
+    leaves = tree.leaves()
     if len(leaves) <= max_leaves:
-        tree.write(outfile=outfile, format=1)
+        write_newick(tree, outfile)
         return
 
     random.seed(seed)
     keep = random.sample(leaves, max_leaves)
-    keep_names = [leaf.name for leaf in keep]
-    tree.prune(keep_names, preserve_branch_length=True)
-    tree.write(outfile=outfile, format=1)
+    prune(tree, keep)
+    write_newick(tree, outfile)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,7 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
 GLOBALS="$1"
 source "$GLOBALS"
+source "$SCRIPT_DIR/../helpers.sh"
 
 ## [Constants] ##
 OUTPUT_INTR_DIR="${PROCESSED_DIR}/trees_output"
@@ -25,7 +26,7 @@ TREE_INTERMIDIATE="${BASE}_clean.${EXT}"
 BASE="${BASE}_clean"
 
 if [[ -z "${TARGET_LABEL:-}" ]]; then
-  TARGET_LABEL=$(python3 "${SCRIPT_DIR}/find_latest_diverged_group.py" "$TREE_INTERMIDIATE" "$ACCESSIONS_FILE")
+  TARGET_LABEL=$(pyhelper latest-diverged-group "$TREE_INTERMIDIATE" "$ACCESSIONS_FILE")
   echo "Auto-selected TARGET_LABEL=$TARGET_LABEL"
   if [[ -n "$TARGET_LABEL" ]]; then
     sed -i "s/^TARGET_LABEL=.*/TARGET_LABEL=\"$TARGET_LABEL\"/" "$GLOBALS"
@@ -34,7 +35,7 @@ fi
 
 if [[ -n "${TARGET_LABEL:-}" ]]; then
   echo "=== Step 2: Mark tree ==="
-  python3 "${SCRIPT_DIR}/mark_foreground.py" "$TREE_INTERMIDIATE" "$ACCESSIONS_FILE" "$TARGET_LABEL" > "${BASE}_marked.${EXT}"
+  pyhelper mark-foreground "$TREE_INTERMIDIATE" "$ACCESSIONS_FILE" "$TARGET_LABEL" > "${BASE}_marked.${EXT}"
   TREE_INTERMIDIATE="${BASE}_marked.${EXT}"
   BASE="${TREE_INTERMIDIATE%.*}"
   echo "Marked tree saved as $TREE_INTERMIDIATE"
@@ -52,13 +53,13 @@ echo "leaf only tree saved in ${BASE}_leaf_only.${EXT}"
 
 echo "=== Step 4: Removing leaves that are not found in ACCESSIONS.txt ==="
 if [ ${#REMOVE_SAMPLES[@]} -ne 0 ]; then
-    python3 "${SCRIPT_DIR}/prune_leaves_by_name.py" "$TREE_INTERMIDIATE" "${REMOVE_SAMPLES[@]}"
+    pyhelper prune-leaves-by-name "$TREE_INTERMIDIATE" "${REMOVE_SAMPLES[@]}"
     TREE_INTERMIDIATE="${BASE}_pruned.${EXT}"
     BASE="${BASE}_pruned"
 fi
 
 echo "=== Step 5: Limiting tree to ${MAX_TREE_LEAVES} leaves ==="
-python3 "$SCRIPT_DIR/prune_random_leaves.py" "$TREE_INTERMIDIATE" "${BASE}_limited.${EXT}" --max-leaves "$MAX_TREE_LEAVES"
+pyhelper prune-random-leaves "$TREE_INTERMIDIATE" "${BASE}_limited.${EXT}" --max-leaves "$MAX_TREE_LEAVES"
 TREE_INTERMIDIATE="${BASE}_limited.${EXT}"
 BASE="${TREE_INTERMIDIATE%.*}"
 
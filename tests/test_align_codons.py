@@ -0,0 +1,58 @@
+"""
+align_codons.py --dedup on a fixture with identical proteins.
+"""
+import os
+import sys
+
+from Bio import SeqIO
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+PHYLIP_SCRIPTS = os.path.join(os.path.dirname(__file__), "..", "scripts", "phylip_scripts")
+sys.path.insert(0, PHYLIP_SCRIPTS)
+import align_codons  # noqa: E402
+
+## a and c encode the same protein (MKLV) with a synonymous difference, d is a copy of b (MKV)
+CDS = {
+    "a": "ATGAAACTGGTT",
+    "b": "ATGAAAGTT",
+    "c": "ATGAAGCTGGTC",
+    "d": "ATGAAAGTT",
+}
+
+
+def records():
+    return [SeqRecord(Seq(seq), id=name, description="") for name, seq in CDS.items()]
+
+
+def test_dedup_gives_copies_the_row_of_their_representative():
+    nuc_records = records()
+    prot_records = align_codons.translate_sequences(nuc_records)
+    unique, rep_of = align_codons.collapse_identical_proteins(prot_records)
+    assert [record.id for record in unique] == ["a", "b"]
+    assert rep_of == {"a": "a", "b": "b", "c": "a", "d": "b"}
+
+    ## what MAFFT returns for the two distinct proteins
+    aligned_unique = [SeqRecord(Seq("MKLV"), id="a"), SeqRecord(Seq("MK-V"), id="b")]
+    expanded = align_codons.expand_alignment(aligned_unique, prot_records, rep_of)
+    assert [(record.id, str(record.seq)) for record in expanded] == [
+        ("a", "MKLV"), ("b", "MK-V"), ("c", "MKLV"), ("d", "MK-V"),
+    ]
+
+    ## every copy keeps its own codons
+    codons = align_codons.back_translate(expanded, {record.id: record for record in nuc_records})
+    assert [str(record.seq) for record in codons] == [
+        "ATGAAACTGGTT", "ATGAAA---GTT", "ATGAAGCTGGTC", "ATGAAA---GTT",
+    ]
+
+
+def test_dedup_of_identical_proteins_needs_no_mafft(tmp_path, monkeypatch):
+    in_fasta = tmp_path / "in.fasta"
+    out_fasta = tmp_path / "out.fasta"
+    SeqIO.write([record for record in records() if record.id in ("a", "c")], in_fasta, "fasta")
+    monkeypatch.setattr(sys, "argv", ["align_codons.py", str(in_fasta), str(out_fasta), "--dedup"])
+    monkeypatch.setenv("PATH", "")  ## fails if MAFFT were started
+    align_codons.main()
+    assert [(record.id, str(record.seq)) for record in SeqIO.parse(out_fasta, "fasta")] == [
+        ("a", CDS["a"]), ("c", CDS["c"]),
+    ]
@@ -0,0 +1,62 @@
+"""
+Job states and job discovery of codeml_monitor.py on hand-made job folders.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts", "codeml_scripts"))
+import codeml_monitor  # noqa: E402
+
+## rub iteration lines: iteration, step, -lnL, "x:" and the parameter values
+RUB = "".join(f"{i:5d} 0.0500 {1000 - i}.000000 x:  0.10000  0.20000  2.00000\n" for i in range(1, 6))
+
+
+def make_job(folder, mlc=None, rub=None, age=0):
+    """A job folder with codeml.ctl and optional mlc/rub last written ``age`` seconds ago."""
+    os.makedirs(folder)
+    with open(os.path.join(folder, "codeml.ctl"), "w") as f:
+        f.write("outfile = mlc_link\n")
+    for name, text in (("mlc", mlc), ("rub", rub)):
+        if text is not None:
+            path = os.path.join(folder, name)
+            with open(path, "w") as f:
+                f.write(text)
+            then = time.time() - age
+            os.utime(path, (then, then))
+    return folder
+
+
+def states(root):
+    monitor = codeml_monitor.Monitor([str(root)], stall_seconds=900)
+    return {job["name"]: (job["state"], job["iteration"]) for job in monitor.snapshot()["jobs"]}
+
+
+def test_states(tmp_path):
+    make_job(tmp_path / "CDS1" / "M1a")
+    make_job(tmp_path / "CDS1" / "M2a", mlc="CODONML (in paml)\n", rub=RUB)
+    make_job(tmp_path / "CDS2" / "M1a", mlc="CODONML (in paml)\n", age=3600)  ## died before iterating
+    make_job(tmp_path / "CDS2" / "M2a", mlc="CODONML (in paml)\n", rub=RUB, age=3600)
+    make_job(tmp_path / "CDS3" / "M1a", mlc="CODONML (in paml)\nTime used:  0:05\n", rub=RUB, age=3600)
+
+    assert states(tmp_path) == {
+        "CDS1/M1a": ("queued", None),
+        "CDS1/M2a": ("running", 5),
+        "CDS2/M1a": ("failed", None),
+        "CDS2/M2a": ("failed", 5),
+        "CDS3/M1a": ("done", 5),
+    }
+
+
+def test_multistart_job_is_followed_through_its_starts(tmp_path):
+    job = make_job(tmp_path / "CDS1" / "M2a")
+    make_job(tmp_path / "CDS1" / "M2a" / "starts" / "w1_k2", mlc="CODONML (in paml)\n", rub=RUB)
+    make_job(tmp_path / "CDS1" / "M2a" / "starts" / "w3_k2", mlc="CODONML (in paml)\n", rub=RUB)
+    assert states(tmp_path) == {"CDS1/M2a/w1_k2": ("running", 5), "CDS1/M2a/w3_k2": ("running", 5)}
+
+    ## finished, starts kept (--keep-starts): only the job folder is listed
+    with open(job / "mlc", "w") as f:
+        f.write("CODONML (in paml)\nTime used:  0:05\n")
+    with open(job / "multistart.tsv", "w") as f:
+        f.write("start\n")
+    assert states(tmp_path) == {"CDS1/M2a": ("done", None)}
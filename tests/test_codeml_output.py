@@ -0,0 +1,126 @@
+"""
+codeml_output.py parsers on mlc excerpts and on an mlc of the test run.
+"""
+import os
+import sys
+
+import pytest
+
+REPO = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(REPO, "scripts", "codeml_scripts"))
+import codeml_output  # noqa: E402
+
+REAL_M2A_MLC = os.path.join(REPO, "output_test", "codeml", "output", "Astroviridae_43_test_20250810_162455",
+                            "Astroviridae_43_OQ198042.1_WDW25706.1", "M2a", "mlc")
+
+PREAMBLE = """CODONML (in paml version 4.10.7, June 2023)  aln.phy
+Model: One dN/dS ratio,  Global clock
+Codon frequency model: F3x4
+ns =   3  ls = 1304
+
+Codon usage in sequences
+"""
+
+## NSsites = 1 2 7 8; each model repeats its own NEB/BEB output
+MULTI_MODEL = PREAMBLE + """
+Model 1: NearlyNeutral (2 categories)
+
+lnL(ntime:  2  np:  9):  -7800.100000      +0.000000
+
+Model 2: PositiveSelection (3 categories)
+
+lnL(ntime:  2  np: 11):  -7794.208066      +0.000000
+
+Naive Empirical Bayes (NEB) analysis
+    18 T      0.999**       2.000 +- 0.100
+
+Bayes Empirical Bayes (BEB) analysis (Yang, Wong & Nielsen 2005. Mol. Biol. Evol. 22:1107-1118)
+Positively selected sites (*: P>95%; **: P>99%)
+(amino acids refer to 1st sequence: OQ198042.1)
+
+            Pr(w>1)     post mean +- SE for w
+
+    18 T      0.573         1.354 +- 0.780
+    78 T      0.967*        2.476 +- 0.829
+
+
+The grid (see ternary graph for p0-p1)
+
+Model 7: beta (10 categories)
+
+lnL(ntime:  2  np:  9):  -7799.000000      +0.000000
+
+Model 8: beta&w>1 (11 categories)
+
+lnL(ntime:  2  np: 11):  -7794.000000      +0.000000
+
+Bayes Empirical Bayes (BEB) analysis (Yang, Wong & Nielsen 2005. Mol. Biol. Evol. 22:1107-1118)
+
+            Pr(w>1)     post mean +- SE for w
+
+    78 T      0.991**       2.900 +- 0.400
+
+Time used:  1:02:03
+"""
+
+BRANCH_SITE = """lnL(ntime: 11  np: 16):  -27305.983689      +0.000000
+
+Bayes Empirical Bayes (BEB) analysis (Yang, Wong & Nielsen 2005. Mol. Biol. Evol. 22:1107-1118)
+Positive sites for foreground lineages Prob(w>1):
+    12 K 0.612
+  1062 I 0.969*
+  1100 S 0.996**
+
+The grid (see ternary graph for p0-p1)
+Time used: 52:30
+"""
+
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def test_split_nssites_mlc(tmp_path):
+    mlc = write(tmp_path / "combined.mlc", MULTI_MODEL)
+    written = codeml_output.split_nssites_mlc(mlc, str(tmp_path / "CDS1"))
+    assert sorted(written) == ["M1a", "M2a", "M7", "M8"]
+    for model, path in written.items():
+        assert path == str(tmp_path / "CDS1" / model / "mlc")
+        with open(path) as f:
+            text = f.read()
+        assert text.startswith(PREAMBLE)  ## "Model: One dN/dS ratio" is preamble, not a section
+        assert codeml_output.read_data_size(path) == (3, 1304)
+
+    lnls = {model: codeml_output.read_lnl(path) for model, path in written.items()}
+    assert lnls == {"M1a": (-7800.1, 9), "M2a": (-7794.208066, 11), "M7": (-7799.0, 9), "M8": (-7794.0, 11)}
+
+    ## NEB rows are skipped, every model keeps only its own BEB rows
+    assert codeml_output.read_beb_sites(written["M2a"]) == [(18, "T", 0.573, ""), (78, "T", 0.967, "*")]
+    assert codeml_output.read_beb_sites(written["M8"]) == [(78, "T", 0.991, "**")]
+    assert codeml_output.read_beb_sites(written["M1a"]) == []
+    assert codeml_output.read_time_used(written["M8"]) == 3723
+    assert codeml_output.read_time_used(written["M1a"]) is None
+
+
+def test_split_needs_model_sections(tmp_path):
+    mlc = write(tmp_path / "mlc", PREAMBLE + "lnL(ntime:  2  np:  9):  -7800.100000      +0.000000\n")
+    with pytest.raises(ValueError):
+        codeml_output.split_nssites_mlc(mlc, str(tmp_path / "CDS1"))
+
+
+def test_branch_site_beb_rows(tmp_path):
+    mlc = write(tmp_path / "mlc", BRANCH_SITE)
+    assert codeml_output.read_lnl(mlc) == (-27305.983689, 16)
+    assert codeml_output.read_beb_sites(mlc) == [(12, "K", 0.612, ""), (1062, "I", 0.969, "*"), (1100, "S", 0.996, "**")]
+    assert codeml_output.read_time_used(mlc) == 3150
+    mapped = codeml_output.map_sites(codeml_output.read_beb_sites(mlc), {1062: (1070, 355), 1100: (1108, None)})
+    assert codeml_output.format_sites(mapped, 0.8) == "1070(I,0.969);1108(S,0.996);"
+    assert codeml_output.format_sites(mapped, 0.8, reference=True) == "355(I,0.969);-(S,0.996);"
+
+
+def test_site_model_mlc_of_the_test_run():
+    assert codeml_output.read_lnl(REAL_M2A_MLC) == (-7794.208066, 10)
+    assert codeml_output.read_data_size(REAL_M2A_MLC) == (3, 1304)
+    assert codeml_output.read_beb_sites(REAL_M2A_MLC)[:2] == [(18, "T", 0.573, ""), (78, "T", 0.667, "")]
+    assert codeml_output.read_time_used(REAL_M2A_MLC) == 4
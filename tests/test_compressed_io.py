@@ -0,0 +1,96 @@
+"""
+compressed_io.py: round trips, format sniffing on files and pipes, stored copies.
+"""
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+PHYLIP_SCRIPTS = os.path.join(os.path.dirname(__file__), "..", "scripts", "phylip_scripts")
+sys.path.insert(0, PHYLIP_SCRIPTS)
+import compressed_io  # noqa: E402
+
+FASTA = "".join(f">seq{i} Codon alignment\nATGAAACTGGTT---NNNAAA\n" for i in range(2000))
+
+
+def has_zstd():
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return shutil.which("zstd") is not None
+    return True
+
+
+needs_zstd = pytest.mark.skipif(not has_zstd(), reason="needs the zstandard package or the zstd command")
+CODECS = ["none", "gzip", pytest.param("zstd", marks=needs_zstd)]
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_round_trip(tmp_path, compression):
+    path = str(tmp_path / f"globals.fasta{compressed_io.SUFFIXES[compression]}")
+    with compressed_io.open_text(path, "w") as f:
+        f.write(FASTA)
+    assert compressed_io.detect_compression(path) == compression
+    with compressed_io.open_text(path) as f:
+        assert f.read() == FASTA
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_format_comes_from_the_bytes_not_the_name(tmp_path, compression):
+    written = str(tmp_path / f"data{compressed_io.SUFFIXES[compression]}")
+    with compressed_io.open_text(written, "w") as f:
+        f.write(FASTA)
+    renamed = str(tmp_path / "renamed.fasta")
+    os.rename(written, renamed)
+    with compressed_io.open_text(renamed) as f:
+        assert f.read() == FASTA
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_compressed_input_on_a_pipe(tmp_path, compression):
+    path = str(tmp_path / f"in.fasta{compressed_io.SUFFIXES[compression]}")
+    with compressed_io.open_text(path, "w") as f:
+        f.write(FASTA)
+    with open(path, "rb") as f:
+        data = f.read()
+    ## /dev/stdin is a pipe here: it cannot be reopened or seeked after the format is sniffed
+    reader = ("import sys; sys.path.insert(0, sys.argv[1]); from compressed_io import open_text\n"
+              "with open_text('/dev/stdin') as f: sys.stdout.write(f.read())")
+    result = subprocess.run([sys.executable, "-c", reader, PHYLIP_SCRIPTS], input=data,
+                            stdout=subprocess.PIPE, check=True, timeout=60)
+    assert result.stdout.decode() == FASTA
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_reader_closed_early(tmp_path, compression):
+    path = str(tmp_path / f"in.fasta{compressed_io.SUFFIXES[compression]}")
+    with compressed_io.open_text(path, "w") as f:
+        f.write(FASTA * 20)
+    with compressed_io.open_text(path) as f:
+        assert f.readline() == ">seq0 Codon alignment\n"
+
+
+def test_plain_write_for_unknown_suffix(tmp_path):
+    path = str(tmp_path / "aln.phy")
+    with compressed_io.open_text(path, "w") as f:
+        f.write("2 3\n")
+    with open(path) as f:
+        assert f.read() == "2 3\n"
+
+
+def test_stored_path(tmp_path):
+    base = str(tmp_path / "A1_cds_na.fasta")
+    assert compressed_io.stored_path(base) is None
+    with gzip.open(base + ".gz", "wt") as f:
+        f.write(">a\nATG\n")
+    assert compressed_io.stored_path(base) == base + ".gz"
+    open(base, "w").close()
+    assert compressed_io.stored_path(base) == base  ## plain copy first
+
+    ## with a directory index: empty files do not count
+    index = {"A1.fasta": 0, "A1.fasta.zst": 120}
+    assert compressed_io.stored_path("A1.fasta", index.get) == "A1.fasta.zst"
+    assert compressed_io.stored_path("B2.fasta", index.get) is None
@@ -0,0 +1,116 @@
+"""
+multistart.py against a stub codeml whose optimum depends on the initial omega.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts", "codeml_scripts"))
+import multistart  # noqa: E402
+
+## stub codeml: omega 1 converges to -1000, omega 0.5 to -1001 and omega 3 to -1100, the
+## last one slowly; it writes rub line by line, then mlc and rst
+STUB_CODEML = """#!/usr/bin/env python3
+import re
+import time
+ctl = open("codeml.ctl").read()
+omega = re.search(r"^omega = (\\S+)", ctl, re.M).group(1)
+optimum, iterations = {"1": (-1000.0, 20), "0.5": (-1001.0, 20), "3": (-1100.0, 400)}[omega]
+with open("rub", "w") as rub:
+    for i in range(1, iterations + 1):
+        lnl = optimum - 50.0 / i
+        rub.write(f"{i:5d} 0.0500 {-lnl:.6f} x:  {omega}  2.00000\\n")
+        rub.flush()
+        time.sleep(0.01)
+with open("mlc", "w") as mlc:
+    mlc.write(f"lnL(ntime:  3  np:  5):  {optimum:.6f}  +0.000000\\n\\nTime used:  0:01\\n")
+with open("rst", "w") as rst:
+    rst.write(f"omega {omega}\\n")
+"""
+
+
+def rub_line(iteration, lnl):
+    return f"{iteration:5d} 0.0500 {-lnl:.6f} x:  1.00000  2.00000\n"
+
+
+def make_job(folder, ctl="seqfile = aln.phy\ntreefile = tree.tre\noutfile = mlc_link\nNSsites = 2\nomega = 1\n"):
+    """A job folder as codeml_pipeline.sh prepares it."""
+    folder.mkdir(parents=True)
+    (folder / "codeml.ctl").write_text(ctl)
+    (folder / "aln.phy").write_text("3 3\n")
+    (folder / "tree.tre").write_text("(a,b,c);\n")
+    os.symlink(folder / "mlc", folder / "mlc_link")
+    return folder
+
+
+@pytest.fixture
+def stub_codeml(tmp_path):
+    path = tmp_path / "codeml"
+    path.write_text(STUB_CODEML)
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_start_grid(tmp_path):
+    ctl = tmp_path / "codeml.ctl"
+    ctl.write_text("NSsites = 2\nfix_omega = 0\nomega = 1\n")
+    assert multistart.start_grid(str(ctl), ["1", "3"], ["2"]) == [
+        {"omega": "1", "kappa": "2"}, {"omega": "3", "kappa": "2"},
+    ]
+    ctl.write_text("model = 2\nNSsites = 2\nfix_omega = 1 * fixed for the null\nfix_kappa = 1\nomega = 1\n")
+    assert multistart.start_grid(str(ctl), ["1", "3"], ["2", "4"]) == [{}]
+    ctl.write_text("NSsites = 0 1 2 7 8\nomega = 1\n")
+    assert multistart.start_grid(str(ctl), ["1", "3"], ["2"]) == [{}]
+
+
+def test_rounds_and_trailing(tmp_path):
+    def start(name, lines):
+        folder = tmp_path / name
+        folder.mkdir()
+        (folder / "rub").write_text("".join(rub_line(it, lnl) for it, lnl in lines))
+        s = multistart.Start(str(folder), {})
+        s.update()
+        return s
+
+    ## codeml restarts the count in a second round
+    a = start("a", [(1, -1050), (2, -1020), (3, -1010), (1, -1008), (2, -1005)])
+    b = start("b", [(1, -1100), (2, -1090), (3, -1080), (4, -1070)])
+    assert a.rounds == [[(1, -1050), (2, -1020), (3, -1010)], [(1, -1008), (2, -1005)]]
+    assert a.position == (1, 2, -1005)
+    assert a.lnl_at(0, 2) == -1020
+    assert a.lnl_at(0, 10) == -1010  ## round 0 is over: its final lnL counts
+    assert a.lnl_at(1, 3) is None  ## still running, not there yet
+    assert b.lnl_at(1, 1) is None
+
+    ## b at iteration 4 of round 0 against a's final round 0 lnL
+    assert multistart.trailing_by(b, [a, b]) == pytest.approx(60)
+    ## b has not reached a's round 1
+    assert multistart.trailing_by(a, [a, b]) is None
+
+
+def test_trailing_start_is_stopped_and_best_kept(tmp_path, stub_codeml):
+    job = make_job(tmp_path / "CDS1" / "M2a")
+    best = multistart.run_job(str(job), ["0.5", "1", "3"], ["2"], codeml=stub_codeml,
+                              margin=5.0, min_iterations=5, poll=0.05)
+    assert best.label == "w1_k2"
+    assert best.lnl == -1000.0
+
+    rows = [line.split("\t") for line in (job / "multistart.tsv").read_text().splitlines()]
+    assert rows[0][:4] == ["start", "omega", "kappa", "state"]
+    by_label = {row[0]: row for row in rows[1:]}
+    assert sorted(by_label) == ["w0.5_k2", "w1_k2", "w3_k2"]
+    assert by_label["w1_k2"][3] == "finished" and by_label["w1_k2"][8] == "yes"
+    assert by_label["w0.5_k2"][3] == "finished"  ## within the margin: runs to the end
+    assert by_label["w3_k2"][3] == "stopped"
+    assert int(by_label["w3_k2"][5]) >= 5  ## never before --min-iterations
+
+    ## the best start's output lands in the job folder; the pipeline's mlc_link now points at it
+    assert not os.path.islink(job / "mlc")
+    assert (job / "mlc").read_text().startswith("lnL(ntime:  3  np:  5):  -1000.000000")
+    assert (job / "rst").read_text() == "omega 1\n"
+    assert (job / "rub").is_file()
+    assert "omega = 1\n" in (job / "codeml.ctl").read_text()
+    assert "outfile = mlc\n" in (job / "codeml.ctl").read_text()
+    assert (job / "mlc_link").read_text() == (job / "mlc").read_text()
+    assert not (job / "starts").exists()
@@ -0,0 +1,43 @@
+"""
+newick_prune.py must write the same Newick as ete3's prune(preserve_branch_length=True).
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("ete3")
+
+REPO = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(REPO, "scripts", "tree_scripts"))
+import newick_prune  # noqa: E402
+
+TREES = [
+    "Smacoviridae_3.rooted.anc_recon.tree",
+    "Parvoviridae_205.rooted.anc_recon.tree",
+    "Papillomaviridae_67.rooted.anc_recon.tree",
+    "Adenoviridae_14.rooted.anc_recon.tree",
+    "Picornaviridae_12.rooted.anc_recon.tree",
+]
+
+## foreground marks, missing branch lengths, a unary node and quoted-unsafe characters in labels
+SMALL_TREE = "((A:0.1,B:0.2)n1 #1:0.05,((C,D:0.4)n2:0.3)n3:0.01,(E:1e-07,F|x|2001:0.5)#1:0.2)root;\n"
+
+
+@pytest.mark.parametrize("tree", TREES)
+def test_matches_ete3_on_repo_trees(tree):
+    mismatches, _, _ = newick_prune.check_against_ete3(os.path.join(REPO, "input", "rooted_trees", tree), trials=5)
+    assert mismatches == 0
+
+
+def test_matches_ete3_on_labelled_tree(tmp_path):
+    path = tmp_path / "small.tree"
+    path.write_text(SMALL_TREE)
+    mismatches, _, _ = newick_prune.check_against_ete3(str(path), trials=30, seed=7)
+    assert mismatches == 0
+
+
+def test_single_child_nodes_are_collapsed():
+    tree = newick_prune.parse_newick(SMALL_TREE)
+    pruned = newick_prune.prune_to_names(tree, ["A", "B", "C"])
+    assert newick_prune.to_newick(pruned) == "((A:0.1,B:0.2)n1 #1:0.05,C:1.31);"
@@ -0,0 +1,101 @@
+"""
+Interval merging and 3SEQ breakpoint handling of recomb_mask.py.
+"""
+import os
+import random
+import sys
+
+REPO = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(REPO, "scripts", "phylip_scripts"))
+import recomb_mask  # noqa: E402
+
+## 3SEQ output of the test run, window 401-800 of WDW25708.1
+REAL_REC_CSV = os.path.join(REPO, "output_test", "processed", "results_OQ198042.1_Astroviridae_43",
+                            "3seq_report_OQ198042.1_WDW25706.1", "3s-OQ198042.1_WDW25708.1_window_401-800.rec.csv")
+
+REC_CSV_HEADER = "P_ACCNUM,Q_ACCNUM,C_ACCNUM,m,n,k,p,HS?,log(p),DS(p),DS(p),min_rec_length,breakpoints\n"
+
+
+def test_interval_index_merges_overlapping_and_adjacent():
+    index = recomb_mask.IntervalIndex([(50, 60), (10, 20), (21, 25), (40, 45), (100, 110)])
+    assert list(index) == [(10, 25), (40, 45), (50, 60), (100, 110)]
+    index.add(44, 52)  ## bridges two intervals
+    assert list(index) == [(10, 25), (40, 60), (100, 110)]
+    index.add(1, 200)  ## swallows everything
+    assert list(index) == [(1, 200)]
+    index.add(5, 4)  ## empty
+    assert list(index) == [(1, 200)]
+    assert index.covered() == 200
+    assert index.covered(length=150) == 150
+
+
+def test_interval_index_matches_a_set_of_positions():
+    rng = random.Random(3)
+    for _ in range(200):
+        index = recomb_mask.IntervalIndex()
+        positions = set()
+        for _ in range(rng.randint(0, 12)):
+            start = rng.randint(1, 80)
+            end = start + rng.randint(-2, 15)
+            index.add(start, end)
+            positions.update(range(start, end + 1))
+        intervals = list(index)
+        covered = {pos for start, end in intervals for pos in range(start, end + 1)}
+        assert covered == positions
+        ## disjoint, sorted and never touching
+        assert all(prev[1] + 1 < nxt[0] for prev, nxt in zip(intervals, intervals[1:]))
+        assert index.covered() == len(positions)
+
+
+def test_recombinant_segments():
+    ## segment between the breakpoints is the shorter side
+    assert recomb_mask.recombinant_segments("220-225 & 400-400", 400) == [(221, 400)]
+    ## pair order does not matter; sides are compared at the narrowest breakpoints (180 vs 190 sites)
+    ## and the chosen side is returned at its widest
+    assert recomb_mask.recombinant_segments("300-310 & 100-120", 400) == [(101, 310)]
+    ## the flanks are shorter than the middle
+    assert recomb_mask.recombinant_segments("10-10 & 390-390", 400) == [(1, 10), (391, 400)]
+    assert recomb_mask.recombinant_segments("", 400) is None
+
+
+def test_real_rec_csv_row_masks_the_middle():
+    ## "20-43 & 227-235": 184 sites between the breakpoints against 185 in the flanks
+    assert recomb_mask.recombinant_segments("20-43 & 227-235", 400) == [(21, 235)]
+    ## "20-26 & 385-397", min_rec_length 22: the flanks
+    assert recomb_mask.recombinant_segments("20-26 & 385-397", 400) == [(1, 26), (386, 400)]
+
+    segments = recomb_mask.read_breakpoints(REAL_REC_CSV, 400)
+    assert segments["OQ198050.1"][0] == (21, 235)
+    assert segments["LC047788.1"] == [(1, 26), (386, 400)]
+
+
+def test_build_mask_merges_windows(tmp_path):
+    base = "KY581700.1_ASU45872.1"
+    report = tmp_path / "report"
+    report.mkdir()
+    ## window 1-400: S1 with two alternative breakpoint pairs, S2 without breakpoints in rec.csv
+    (report / f"3s-{base}_window_1-400.longRec").write_text("S1 Codon alignment\nS2\n")
+    (report / f"3s-{base}_window_1-400.rec.csv").write_text(
+        REC_CSV_HEADER + "P1,Q1,S1 Codon alignment,1,1,1,0.001,0,-3,0.01,0.01,100,200-210 & 300-300,250-250 & 320-320\n")
+    ## window 201-600 finds the same stretch of S1 again
+    (report / f"3s-{base}_window_201-600.longRec").write_text("S1\n")
+    (report / f"3s-{base}_window_201-600.rec.csv").write_text(
+        REC_CSV_HEADER + "P1,Q1,S1,1,1,1,0.001,0,-3,0.01,0.01,100,100-100 & 150-150\n")
+    ## another CDS sharing the prefix is ignored
+    (report / f"3s-{base}0_window_1-400.longRec").write_text("S3\n")
+
+    mask = recomb_mask.build_mask(str(report), base, length=600)
+    assert {seq_id: list(index) for seq_id, index in mask.items()} == {
+        "S1": [(201, 350)],
+        "S2": [(1, 400)],
+    }
+    window_mask = recomb_mask.build_mask(str(report), base, length=600, span="window")
+    assert list(window_mask["S1"]) == [(1, 600)]
+
+    out = tmp_path / "mask.tsv"
+    recomb_mask.write_mask(mask, str(out))
+    assert out.read_text() == "S1\t201\t350\nS2\t1\t400\n"
+    assert {seq_id: list(index) for seq_id, index in recomb_mask.read_mask(str(out)).items()} == {
+        "S1": [(201, 350)],
+        "S2": [(1, 400)],
+    }
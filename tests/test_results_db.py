@@ -0,0 +1,113 @@
+"""
+results_db.py on a small hand-made results folder.
+"""
+import math
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts", "codeml_scripts"))
+import results_db  # noqa: E402
+
+GROUP = "Astroviridae_43"
+CDS1 = f"{GROUP}_OQ198042.1_WDW25706.1"
+CDS2 = f"{GROUP}_OQ198042.1_WDW25708.1"
+
+BEB = """
+Bayes Empirical Bayes (BEB) analysis (Yang, Wong & Nielsen 2005. Mol. Biol. Evol. 22:1107-1118)
+Positively selected sites (*: P>95%; **: P>99%)
+(amino acids refer to 1st sequence: OQ198042.1)
+
+            Pr(w>1)     post mean +- SE for w
+
+    18 T      0.973*        2.954 +- 0.512
+    40 K      0.612         1.702 +- 0.880
+
+
+The grid (see ternary graph for p0-p1)
+"""
+
+
+def mlc(lnl, np, beb=""):
+    return (f"ns =   6  ls = 120\n\nlnL(ntime:  9  np: {np}):  {lnl:.6f}  +0.000000\n"
+            f"{beb}\nTime used:  0:42\n")
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def results_dir(tmp_path):
+    root = tmp_path / "output" / GROUP
+    write(root / f"summary_site-model_{GROUP}.tsv", "CDS\tLRT\tp-value\n")
+    write(root / CDS1 / "M1a" / "mlc", mlc(-1010.5, 12))
+    write(root / CDS1 / "M2a" / "mlc", mlc(-1000.25, 14, BEB))
+    write(root / CDS1 / "M7" / "mlc", mlc(-1005.0, 12))
+    write(root / CDS1 / "M8" / "mlc", mlc(-1005.5, 14))  ## worse fit than its null
+    write(root / CDS2 / "M1a" / "mlc", mlc(-800.0, 12))  ## M2a missing: no test
+    maps = tmp_path / "input"
+    write(maps / f"{CDS1}.codons.tsv", "site\talignment_codon\tref_codon\n18\t20\t7\n40\t45\t\n")
+    return str(root), str(maps)
+
+
+def count(conn, table):
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_load_twice_replaces_the_run(tmp_path, results_dir):
+    root, maps = results_dir
+    conn = results_db.connect(str(tmp_path / "results.sqlite"))
+    assert results_db.load_run(conn, root, codon_maps_dir=maps) == 2
+    assert results_db.load_run(conn, root, codon_maps_dir=maps) == 2
+    assert [count(conn, table) for table in ("runs", "models", "tests", "sites")] == [1, 5, 2, 2]
+
+    group, analysis = conn.execute("SELECT group_name, analysis FROM runs").fetchone()
+    assert (group, analysis) == (GROUP, "site-model")
+    assert conn.execute("SELECT ref_acc, cds_id, tree_size, codons, seconds FROM models "
+                        "WHERE cds = ? AND model = 'M2a'", (CDS1,)).fetchone() == ("OQ198042.1", "WDW25706.1", 6, 120, 42)
+
+    columns, rows = results_db.query(conn, test="M1a_M2a")
+    row = dict(zip(columns, rows[0]))
+    assert row["lrt"] == pytest.approx(20.5)
+    assert row["pvalue"] == pytest.approx(math.exp(-20.5 / 2))
+    assert row["selected_sites"] == "20(T,0.973);"  ## alignment codons, above 0.8
+
+    ## the summary TSV's 2 * (lnL1 - lnL0), not clamped; p = 1
+    columns, rows = results_db.query(conn, test="M7_M8")
+    row = dict(zip(columns, rows[0]))
+    assert row["lrt"] == pytest.approx(-1.0)
+    assert row["pvalue"] == 1.0
+    assert row["selected_sites"] == ""
+
+    assert conn.execute("SELECT aln_position, ref_position FROM sites ORDER BY position").fetchall() == [(20, 7), (45, None)]
+
+
+def test_query_filters(tmp_path, results_dir):
+    root, maps = results_dir
+    conn = results_db.connect(str(tmp_path / "results.sqlite"))
+    results_db.load_run(conn, root, codon_maps_dir=maps)
+    assert len(results_db.query(conn)[1]) == 2
+    assert len(results_db.query(conn, max_p=0.05)[1]) == 1
+    assert len(results_db.query(conn, cds="WDW25706.1")[1]) == 2
+    assert len(results_db.query(conn, cds=CDS1, test="M7_M8")[1]) == 1
+    assert results_db.query(conn, group="Other_1")[1] == []
+
+
+def test_connect_adds_codon_columns_to_old_databases(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE sites (run_id INTEGER NOT NULL, cds TEXT NOT NULL, model TEXT NOT NULL, "
+                "position INTEGER NOT NULL, aa TEXT, probability REAL, signif TEXT)")
+    old.execute("INSERT INTO sites VALUES (1, 'c', 'M2a', 18, 'T', 0.97, '*')")
+    old.commit()
+    old.close()
+
+    conn = results_db.connect(path)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sites)")]
+    assert columns[-2:] == ["aln_position", "ref_position"]
+    assert conn.execute("SELECT position, aln_position FROM sites").fetchall() == [(18, None)]
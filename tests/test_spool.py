@@ -0,0 +1,138 @@
+"""
+Spool queue with several local workers, run against a stub codeml.
+"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+CODEML_SCRIPTS = os.path.join(os.path.dirname(__file__), "..", "scripts", "codeml_scripts")
+sys.path.insert(0, CODEML_SCRIPTS)
+import spool  # noqa: E402
+
+SPOOL_PY = os.path.join(CODEML_SCRIPTS, "spool.py")
+
+## stub codeml: logs which job it ran (aln.phy holds the job name) and writes an mlc
+STUB_CODEML = """#!/bin/sh
+cat aln.phy >> "$SPOOL_TEST_LOG"
+sleep 0.2
+[ -n "$SPOOL_TEST_FAIL" ] && exit 1
+echo "lnL(ntime:  2  np: 5):  -1000.000000  +0.000000" > mlc
+echo "Time used:  0:01" >> mlc
+"""
+
+
+@pytest.fixture
+def stub_codeml(tmp_path, monkeypatch):
+    path = tmp_path / "codeml"
+    path.write_text(STUB_CODEML)
+    path.chmod(0o755)
+    log = tmp_path / "runs.log"
+    monkeypatch.setenv("SPOOL_TEST_LOG", str(log))
+    return path, log
+
+
+def make_job(root, name):
+    """A prepared job folder as codeml_pipeline.sh leaves it (ctl plus aln.phy/tree.tre)."""
+    out_dir = root / "results" / name / "M2a"
+    out_dir.mkdir(parents=True)
+    (out_dir / "codeml.ctl").write_text("seqfile = aln.phy\ntreefile = tree.tre\noutfile = mlc_link\n")
+    (out_dir / "aln.phy").write_text(f"{name}\n")
+    (out_dir / "tree.tre").write_text("(a,b,c);\n")
+    return out_dir
+
+
+def start_worker(spool_dir, codeml):
+    return subprocess.Popen([sys.executable, SPOOL_PY, "worker", str(spool_dir), "--codeml", str(codeml),
+                             "--exit-when-empty", "--poll", "0.1", "--heartbeat", "0.1"])
+
+
+def test_each_job_runs_once_with_three_workers(tmp_path, stub_codeml):
+    codeml, log = stub_codeml
+    spool_dir = tmp_path / "spool"
+    names = [f"CDS{i}" for i in range(8)]
+    job_ids = [spool.submit(str(spool_dir), str(make_job(tmp_path, name))) for name in names]
+
+    workers = [start_worker(spool_dir, codeml) for _ in range(3)]
+    for proc in workers:
+        assert proc.wait(timeout=60) == 0
+
+    assert sorted(log.read_text().split()) == sorted(names)
+    assert spool.collect(str(spool_dir), job_ids, wait=False) == []
+    for name in names:
+        assert (tmp_path / "results" / name / "M2a" / "mlc").is_file()
+    assert os.listdir(spool_dir / "done") == []
+
+
+def test_stale_claim_is_reaped_and_old_heartbeat_stops(tmp_path):
+    spool_dir = str(tmp_path / "spool")
+    job_id = spool.submit(spool_dir, str(make_job(tmp_path, "CDS0")))
+
+    ## a worker claims the job and dies: its heartbeat goes silent
+    _, claim_dir, old_token = spool.claim_next(spool_dir, "dead-worker")
+    old = time.time() - 3600
+    os.utime(os.path.join(claim_dir, spool.HEARTBEAT_FILE), (old, old))
+    os.utime(os.path.join(claim_dir, spool.CLAIM_FILE), (old, old))
+    assert spool.reclaim_stale(spool_dir, stale_seconds=60) == [job_id]
+    assert spool.find_job(spool_dir, job_id) == "pending"
+
+    ## another worker takes it over; the old worker's heartbeat must not touch the new claim
+    _, claim_dir, new_token = spool.claim_next(spool_dir, "new-worker")
+    heartbeat_path = os.path.join(claim_dir, spool.HEARTBEAT_FILE)
+    os.utime(heartbeat_path, (old, old))
+    stale_heartbeat = spool.Heartbeat(heartbeat_path, 0.1, token=old_token)
+    stale_heartbeat.beat()
+    assert stale_heartbeat.stopped.is_set()
+    assert os.path.getmtime(heartbeat_path) == pytest.approx(old)
+
+    spool.Heartbeat(heartbeat_path, 0.1, token=new_token).beat()
+    assert os.path.getmtime(heartbeat_path) > old + 60
+
+
+def test_failed_job_can_be_resubmitted(tmp_path, stub_codeml, monkeypatch):
+    codeml, log = stub_codeml
+    spool_dir = tmp_path / "spool"
+    out_dir = make_job(tmp_path, "CDS0")
+
+    monkeypatch.setenv("SPOOL_TEST_FAIL", "1")
+    job_id = spool.submit(str(spool_dir), str(out_dir), max_attempts=1)
+    assert start_worker(spool_dir, codeml).wait(timeout=60) == 0
+    assert spool.find_job(str(spool_dir), job_id) == "failed"
+
+    monkeypatch.delenv("SPOOL_TEST_FAIL")
+    assert spool.submit(str(spool_dir), str(out_dir), max_attempts=1) == job_id
+    assert spool.find_job(str(spool_dir), job_id) == "pending"
+    assert spool.read_json(os.path.join(spool_dir, "pending", job_id, "job.json"))["attempts"] == 0
+
+    assert start_worker(spool_dir, codeml).wait(timeout=60) == 0
+    assert spool.collect(str(spool_dir), [job_id], wait=False) == []
+    assert (out_dir / "mlc").is_file()
+
+
+def test_late_heartbeat_does_not_recreate_a_published_claim(tmp_path):
+    spool_dir = str(tmp_path / "spool")
+    job_id = spool.submit(spool_dir, str(make_job(tmp_path, "CDS0")))
+    _, claim_dir, token = spool.claim_next(spool_dir, "worker")
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    (scratch / "rub").write_text("1 0.1 1000.0 x: 0.1\n")
+    heartbeat = spool.Heartbeat(os.path.join(claim_dir, spool.HEARTBEAT_FILE), 0.1, mirror_from=str(scratch))
+
+    os.rename(claim_dir, os.path.join(spool_dir, "done", job_id))
+    ## a beat that touched the heartbeat just before the job was published, now mirroring
+    with pytest.raises(OSError):
+        heartbeat.mirror()
+    heartbeat.beat()
+    assert os.listdir(os.path.join(spool_dir, "running")) == []
+
+
+def test_leftover_running_folder_is_removed_not_requeued(tmp_path):
+    spool_dir = str(tmp_path / "spool")
+    spool.init_spool(spool_dir)
+    leftover = os.path.join(spool_dir, "running", "CDS0_M2a", spool.PROGRESS_DIR)
+    os.makedirs(leftover)
+    assert spool.reclaim_stale(spool_dir, stale_seconds=0) == []
+    assert os.listdir(os.path.join(spool_dir, "running")) == []
+    assert os.listdir(os.path.join(spool_dir, "pending")) == []